@@ -0,0 +1,7 @@
+"""Gunicorn settings; picked up automatically from the working directory"""
+
+
+def worker_exit(server, worker):
+    # Write buffered last_viewed_at updates before the worker goes away
+    from wedding import tracking
+    tracking.view_buffer.shutdown()
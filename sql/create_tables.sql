@@ -66,9 +66,53 @@ CREATE TABLE IF NOT EXISTS wedding_guest (
 
 -- Create indexes for faster queries
 CREATE INDEX IF NOT EXISTS idx_guest_rsvp_code ON wedding_guest(rsvp_code);
-CREATE INDEX IF NOT EXISTS idx_guest_name ON wedding_guest(name);
-CREATE INDEX IF NOT EXISTS idx_guest_email ON wedding_guest(email);
-CREATE INDEX IF NOT EXISTS idx_guest_has_responded ON wedding_guest(has_responded);
+-- Same names and definitions as the Django migrations
+CREATE INDEX IF NOT EXISTS guest_name_id_idx ON wedding_guest(name, id);
+CREATE INDEX IF NOT EXISTS guest_email_lower_idx ON wedding_guest(LOWER(email));
+CREATE INDEX IF NOT EXISTS guest_name_lower_idx ON wedding_guest(LOWER(name));
+CREATE INDEX IF NOT EXISTS guest_responded_at_idx ON wedding_guest(rsvp_submitted_at) WHERE has_responded;
+
+-- =====================================================
+-- FAMILY MEMBERS TABLE - One row per person in a family
+-- =====================================================
+CREATE TABLE IF NOT EXISTS wedding_familymember (
+    id BIGSERIAL PRIMARY KEY,
+    family_id UUID NOT NULL REFERENCES wedding_guest(id) ON DELETE CASCADE,
+    name VARCHAR(200) NOT NULL,
+    relation VARCHAR(20) DEFAULT 'other',
+    
+    -- Event invitations and responses (mirrored in wedding_invitation)
+    invited_mendhi BOOLEAN DEFAULT FALSE,
+    invited_vidhi BOOLEAN DEFAULT FALSE,
+    invited_wedding BOOLEAN DEFAULT FALSE,
+    invited_reception BOOLEAN DEFAULT FALSE,
+    rsvp_mendhi VARCHAR(20) DEFAULT 'pending',
+    rsvp_vidhi VARCHAR(20) DEFAULT 'pending',
+    rsvp_wedding VARCHAR(20) DEFAULT 'pending',
+    rsvp_reception VARCHAR(20) DEFAULT 'pending',
+    
+    dietary_requirements TEXT DEFAULT '',
+    "order" INTEGER DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS member_family_order_idx ON wedding_familymember(family_id, "order", name);
+
+-- =====================================================
+-- INVITATIONS TABLE - One row per member per invited event
+-- =====================================================
+CREATE TABLE IF NOT EXISTS wedding_invitation (
+    id BIGSERIAL PRIMARY KEY,
+    member_id BIGINT NOT NULL REFERENCES wedding_familymember(id) ON DELETE CASCADE,
+    event VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    headcount INTEGER NOT NULL DEFAULT 0,
+    
+    CONSTRAINT invitation_member_event_uniq UNIQUE (member_id, event),
+    CONSTRAINT invitation_status_check CHECK (status IN ('pending', 'attending', 'not_attending'))
+);
+
+-- Per-event counts and filters are range scans on this index
+CREATE INDEX IF NOT EXISTS invitation_event_status_idx ON wedding_invitation(event, status);
 
 -- =====================================================
 -- EVENTS TABLE
@@ -153,43 +197,21 @@ $$ LANGUAGE plpgsql;
 -- VIEWS FOR REPORTING
 -- =====================================================
 
--- View: RSVP Summary by Event
-CREATE OR REPLACE VIEW rsvp_summary AS
-SELECT 
-    'Mendhi' as event_name,
-    COUNT(*) FILTER (WHERE invited_mendhi = TRUE) as total_invited,
-    COUNT(*) FILTER (WHERE invited_mendhi = TRUE AND rsvp_mendhi = 'attending') as attending,
-    COUNT(*) FILTER (WHERE invited_mendhi = TRUE AND rsvp_mendhi = 'not_attending') as declined,
-    COUNT(*) FILTER (WHERE invited_mendhi = TRUE AND rsvp_mendhi = 'pending') as pending,
-    COALESCE(SUM(guests_mendhi) FILTER (WHERE rsvp_mendhi = 'attending'), 0) as total_guests
-FROM wedding_guest
-UNION ALL
-SELECT 
-    'Vidhi',
-    COUNT(*) FILTER (WHERE invited_vidhi = TRUE),
-    COUNT(*) FILTER (WHERE invited_vidhi = TRUE AND rsvp_vidhi = 'attending'),
-    COUNT(*) FILTER (WHERE invited_vidhi = TRUE AND rsvp_vidhi = 'not_attending'),
-    COUNT(*) FILTER (WHERE invited_vidhi = TRUE AND rsvp_vidhi = 'pending'),
-    COALESCE(SUM(guests_vidhi) FILTER (WHERE rsvp_vidhi = 'attending'), 0)
-FROM wedding_guest
-UNION ALL
-SELECT 
-    'Wedding',
-    COUNT(*) FILTER (WHERE invited_wedding = TRUE),
-    COUNT(*) FILTER (WHERE invited_wedding = TRUE AND rsvp_wedding = 'attending'),
-    COUNT(*) FILTER (WHERE invited_wedding = TRUE AND rsvp_wedding = 'not_attending'),
-    COUNT(*) FILTER (WHERE invited_wedding = TRUE AND rsvp_wedding = 'pending'),
-    COALESCE(SUM(guests_wedding) FILTER (WHERE rsvp_wedding = 'attending'), 0)
-FROM wedding_guest
-UNION ALL
+-- View: RSVP Summary by Event (member-level, from wedding_invitation;
+-- events added to wedding_event appear without changing this view)
+DROP VIEW IF EXISTS rsvp_summary;
+CREATE VIEW rsvp_summary AS
 SELECT 
-    'Reception',
-    COUNT(*) FILTER (WHERE invited_reception = TRUE),
-    COUNT(*) FILTER (WHERE invited_reception = TRUE AND rsvp_reception = 'attending'),
-    COUNT(*) FILTER (WHERE invited_reception = TRUE AND rsvp_reception = 'not_attending'),
-    COUNT(*) FILTER (WHERE invited_reception = TRUE AND rsvp_reception = 'pending'),
-    COALESCE(SUM(guests_reception) FILTER (WHERE rsvp_reception = 'attending'), 0)
-FROM wedding_guest;
+    e.name as event_name,
+    COUNT(i.id) as total_invited,
+    COUNT(i.id) FILTER (WHERE i.status = 'attending') as attending,
+    COUNT(i.id) FILTER (WHERE i.status = 'not_attending') as declined,
+    COUNT(i.id) FILTER (WHERE i.status = 'pending') as pending,
+    COALESCE(SUM(i.headcount), 0) as total_guests
+FROM wedding_event e
+LEFT JOIN wedding_invitation i ON i.event = e.slug
+GROUP BY e.id, e.name, e."order"
+ORDER BY e."order";
 
 -- View: Pending RSVPs
 CREATE OR REPLACE VIEW pending_rsvps AS
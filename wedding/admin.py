@@ -1,8 +1,145 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.utils import unquote
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from django.urls import reverse
-from django.db.models import Sum
-from .models import Event, StoryMilestone, RSVP, WeddingInfo, Guest, FamilyMember
+from django.urls import path, reverse
+from django.db import transaction
+from django.db.models import Case, Count, Max, Q, Sum, When
+from django.utils import timezone
+from .models import Event, StoryMilestone, RSVP, WeddingInfo, Guest, FamilyMember, Invitation, RsvpCounters, OutboundEmail
+from . import cohorts, counters, exports, invitations, lookup, member_grid, search
+from .codes import allocate_codes, bulk_update
+from .paging import ApproximatePaginator
+
+
+class SharedFacetBooleanFilter(admin.BooleanFieldListFilter):
+    """
+    Boolean filter whose facet counts are taken together with its siblings'.
+
+    Every boolean filter of a changelist counting over the same filtered
+    rows (all of them, unless one is active) shares one aggregate query,
+    instead of each running its own scan of the table.
+    """
+    
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        counts = {
+            'true__c': Count(pk_attname, filter=Q(**{self.field_path: True})),
+            'false__c': Count(pk_attname, filter=Q(**{self.field_path: False})),
+        }
+        if self.field.null:
+            counts['null__c'] = Count(pk_attname, filter=Q(**{self.lookup_kwarg2: True}))
+        return counts
+    
+    def get_facet_queryset(self, changelist):
+        shared = changelist.__dict__.setdefault('_shared_facet_counts', {})
+        if self not in shared:
+            groups = {}
+            for spec in changelist.filter_specs:
+                if isinstance(spec, SharedFacetBooleanFilter):
+                    queryset = changelist.get_queryset(self.request, exclude_parameters=spec.expected_parameters())
+                    groups.setdefault(str(queryset.query), (queryset, []))[1].append(spec)
+            for queryset, specs in groups.values():
+                aggregates = {}
+                for number, spec in enumerate(specs):
+                    for name, count in spec.get_facet_counts(changelist.pk_attname, queryset).items():
+                        aggregates[f'f{number}_{name}'] = count
+                row = queryset.aggregate(**aggregates)
+                for number, spec in enumerate(specs):
+                    prefix = f'f{number}_'
+                    shared[spec] = {key[len(prefix):]: value for key, value in row.items() if key.startswith(prefix)}
+        return shared[self]
+
+
+class EventResponseFilter(admin.SimpleListFilter):
+    """Invited to / responded to an event, from the indexed Invitation table"""
+    title = 'event response'
+    parameter_name = 'event_response'
+    
+    def lookups(self, request, model_admin):
+        choices = []
+        for slug, name in Event.EVENT_CHOICES:
+            choices.append((slug, f'{name}: invited'))
+            for status, label in FamilyMember.RSVP_STATUS_CHOICES:
+                choices.append((f'{slug}:{status}', f'{name}: {label.lower()}'))
+        return choices
+    
+    def invitations(self):
+        event, _, status = self.value().partition(':')
+        invitations = Invitation.objects.for_event(event)
+        if status:
+            invitations = invitations.with_status(status)
+        return invitations
+    
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        return queryset.filter(pk__in=self.invitations().order_by().values('member_id'))
+    
+    def facet_counts(self, filtered_qs):
+        """{choice: rows} for the changelist's rows, from one GROUP BY over their invitations"""
+        invitations = Invitation.objects.order_by()
+        if filtered_qs.query.where:
+            invitations = invitations.filter(member__in=filtered_qs.order_by().values('pk'))
+        counts = {}
+        for event, status, members in invitations.values_list('event', 'status').annotate(members=Count('*')):
+            counts[f'{event}:{status}'] = members
+            counts[event] = counts.get(event, 0) + members
+        return counts
+    
+    def get_facet_queryset(self, changelist):
+        # Instead of one subquery count per choice
+        filtered_qs = changelist.get_queryset(self.request, exclude_parameters=self.expected_parameters())
+        counts = self.facet_counts(filtered_qs)
+        return {f'{number}__c': counts.get(value, 0) for number, (value, _) in enumerate(self.lookup_choices)}
+
+
+class FamilyEventResponseFilter(EventResponseFilter):
+    """Families with a member invited to / responding to an event"""
+    
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        return queryset.filter(pk__in=self.invitations().family_ids())
+    
+    def facet_counts(self, filtered_qs):
+        # Per family, a flag for each choice any member matches, then the
+        # flags summed: one pass over the members, no DISTINCT over a join
+        flags = {}
+        for slug, _ in Event.EVENT_CHOICES:
+            invited = Q(**{f'invited_{slug}': True})
+            flags[slug] = Max(Case(When(invited, then=1), default=0))
+            for status, _ in FamilyMember.RSVP_STATUS_CHOICES:
+                status_flag = invited & Q(**{f'rsvp_{slug}': status})
+                flags[f'{slug}_{status}'] = Max(Case(When(status_flag, then=1), default=0))
+        members = FamilyMember.objects.order_by()
+        if filtered_qs.query.where:
+            members = members.filter(family__in=filtered_qs.order_by().values('pk'))
+        totals = members.values('family').annotate(**flags).aggregate(
+            **{f'families_{name}': Sum(name) for name in flags}
+        )
+        return {
+            name.replace('_', ':', 1): totals[f'families_{name}'] or 0
+            for name in flags
+        }
+
+
+class GuestChangeList(ChangeList):
+    """Guest changelist that counts the members of the rows shown in one query"""
+    
+    def get_results(self, request):
+        super().get_results(request)
+        # Counted for this page only: an annotation would also be evaluated
+        # for every row an OFFSET skips
+        guests = list(self.result_list)
+        counts = dict(
+            FamilyMember.objects.filter(family__in=[guest.pk for guest in guests]).order_by()
+            .values_list('family').annotate(members=Count('*'))
+        )
+        for guest in guests:
+            guest.member_count = counts.get(guest.pk, 0)
 
 
 class FamilyMemberInline(admin.TabularInline):
@@ -14,12 +151,39 @@ class FamilyMemberInline(admin.TabularInline):
 @admin.register(FamilyMember)
 class FamilyMemberAdmin(admin.ModelAdmin):
     list_display = ['name', 'relation', 'family_name', 'events_invited', 'rsvp_status_display']
-    list_filter = ['relation', 'invited_mendhi', 'invited_vidhi', 'invited_wedding', 'invited_reception']
+    list_filter = ['relation', EventResponseFilter]
     search_fields = ['name', 'family__party_name']
+    # family_name and __str__ read the family of every row
+    list_select_related = ['family']
+    # Families by name, walking guest_name_id_idx and each family's members
+    # in order, so a page is read off the indexes rather than sorted in full
+    ordering = ['family__name', 'family_id', 'order', 'name', 'id']
+    paginator = ApproximatePaginator
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the trigram/FTS indexes instead of icontains across the join
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search.member_filter(search_term)), False
+    
+    def save_model(self, request, obj, form, change):
+        # A member may have been moved between families
+        with counters.tracking({obj.family_id, form.initial.get('family')}):
+            super().save_model(request, obj, form, change)
+    
+    def delete_model(self, request, obj):
+        with counters.tracking({obj.family_id}):
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with counters.tracking(set(queryset.values_list('family_id', flat=True))):
+            super().delete_queryset(request, queryset)
     
     def family_name(self, obj):
         return obj.family.party_name
     family_name.short_description = 'Family'
+    family_name.admin_order_field = 'family__party_name'
     
     def events_invited(self, obj):
         events = []
@@ -71,13 +235,16 @@ class GuestAdmin(admin.ModelAdmin):
     ]
     inlines = [FamilyMemberInline]
     list_filter = [
-        'has_responded', 
-        'invited_mendhi', 'invited_vidhi', 'invited_wedding', 'invited_reception',
-        'rsvp_mendhi', 'rsvp_vidhi', 'rsvp_wedding', 'rsvp_reception'
+        ('has_responded', SharedFacetBooleanFilter), FamilyEventResponseFilter,
+        ('invited_mendhi', SharedFacetBooleanFilter), ('invited_vidhi', SharedFacetBooleanFilter),
+        ('invited_wedding', SharedFacetBooleanFilter), ('invited_reception', SharedFacetBooleanFilter),
     ]
     search_fields = ['name', 'email', 'rsvp_code', 'party_name']
     readonly_fields = ['id', 'rsvp_code', 'created_at', 'updated_at', 'rsvp_submitted_at', 'last_viewed_at']
-    ordering = ['name']
+    # A total order along guest_name_id_idx
+    ordering = ['name', 'id']
+    paginator = ApproximatePaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Guest Information', {
@@ -111,6 +278,134 @@ class GuestAdmin(admin.ModelAdmin):
     
     actions = ['mark_invited_all_events', 'mark_invited_wedding_only', 'regenerate_rsvp_codes', 'export_selected_csv']
     
+    def get_changelist(self, request, **kwargs):
+        return GuestChangeList
+    
+    def get_urls(self):
+        urls = [
+            path(
+                '<path:object_id>/members/',
+                self.admin_site.admin_view(self.member_grid_view),
+                name='wedding_guest_member_grid',
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def uses_member_grid(self, obj):
+        if obj is None or obj.pk is None:
+            return False
+        if not hasattr(obj, '_grid_member_count'):
+            obj._grid_member_count = obj.members.count()
+        return obj._grid_member_count > member_grid.GRID_THRESHOLD
+    
+    def get_inlines(self, request, obj):
+        # Big families are edited in the member grid, not a form per member
+        if self.uses_member_grid(obj):
+            return []
+        return super().get_inlines(request, obj)
+    
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = {
+            **(extra_context or {}),
+            'member_grid_url': reverse('admin:wedding_guest_member_grid', args=[object_id]),
+        }
+        return super().change_view(request, object_id, form_url, extra_context)
+    
+    def render_change_form(self, request, context, add=False, change=False, form_url='', obj=None):
+        context['member_grid_only'] = self.uses_member_grid(obj)
+        context['member_grid_threshold'] = member_grid.GRID_THRESHOLD
+        return super().render_change_form(request, context, add, change, form_url, obj)
+    
+    def member_grid_view(self, request, object_id):
+        family = self.get_object(request, unquote(object_id))
+        if family is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        if not self.has_change_permission(request, family) or not request.user.has_perm('wedding.change_familymember'):
+            raise PermissionDenied
+        
+        errors = []
+        if request.method == 'POST':
+            rows = []
+            try:
+                rows = member_grid.load_payload(request.POST.get('payload'))
+                family, changes = member_grid.save_grid(
+                    family.pk, rows,
+                    can_add=request.user.has_perm('wedding.add_familymember'),
+                    can_delete=request.user.has_perm('wedding.delete_familymember'),
+                )
+            except member_grid.GridError as exc:
+                errors = exc.errors
+            else:
+                self.log_change(request, family, self.grid_change_message(changes))
+                self.message_user(
+                    request,
+                    f'Saved the members of {family.party_name}: {len(changes.updated)} changed, '
+                    f'{len(changes.created)} added, {len(changes.deleted)} removed.',
+                    messages.SUCCESS,
+                )
+                if '_continue' in request.POST:
+                    return redirect(request.path)
+                return redirect('admin:wedding_guest_change', family.pk)
+        else:
+            rows = [member_grid.member_row(member) for member in family.members.order_by('order', 'name')]
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f'Members of {family.party_name}',
+            'opts': self.opts,
+            'original': family,
+            'has_view_permission': True,
+            'has_add_permission': request.user.has_perm('wedding.add_familymember'),
+            'has_delete_permission': request.user.has_perm('wedding.delete_familymember'),
+            'rows': member_grid.display_rows(rows),
+            'errors': errors,
+            'events': Event.EVENT_CHOICES,
+            'relations': FamilyMember.RELATION_CHOICES,
+            'statuses': FamilyMember.RSVP_STATUS_CHOICES,
+        }
+        return TemplateResponse(request, 'admin/wedding/guest/member_grid.html', context)
+    
+    def grid_change_message(self, changes):
+        message = [
+            {'changed': {
+                'name': 'family member',
+                'object': member.name,
+                'fields': [FamilyMember._meta.get_field(field).verbose_name for field in changes.fields[member.pk]],
+            }}
+            for member in changes.updated
+        ]
+        message += [{'added': {'name': 'family member', 'object': member.name}} for member in changes.created]
+        message += [{'deleted': {'name': 'family member', 'object': member.name}} for member in changes.deleted]
+        return message
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Indexed substring search, uncapped; also finds families by their members' names
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(search.family_filter(search_term)), False
+    
+    def save_model(self, request, obj, form, change):
+        # Counters are reconciled in save_related, once inline members are saved
+        before = counters.empty_rows()
+        if change:
+            before = counters.snapshot(Guest.objects.filter(pk=obj.pk))
+        obj._counters_before = before
+        super().save_model(request, obj, form, change)
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        after = counters.snapshot(Guest.objects.filter(pk=obj.pk))
+        counters.apply_difference(obj._counters_before, after)
+    
+    def delete_model(self, request, obj):
+        with counters.tracking({obj.pk}):
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with counters.tracking(set(queryset.values_list('pk', flat=True))):
+            super().delete_queryset(request, queryset)
+    
     def rsvp_code_display(self, obj):
         return format_html(
             '<code style="background: linear-gradient(135deg, #b8860b, #d4a853); color: white; padding: 8px 14px; border-radius: 6px; font-size: 14px; font-weight: bold; letter-spacing: 2px; display: inline-block;">{}</code>',
@@ -120,7 +415,7 @@ class GuestAdmin(admin.ModelAdmin):
     rsvp_code_display.admin_order_field = 'rsvp_code'
     
     def member_count(self, obj):
-        return obj.members.count()
+        return obj.member_count
     member_count.short_description = 'Members'
     
     def party_size(self, obj):
@@ -189,14 +484,31 @@ class GuestAdmin(admin.ModelAdmin):
     
     @admin.action(description='Regenerate RSVP codes for selected')
     def regenerate_rsvp_codes(self, request, queryset):
-        from .models import generate_rsvp_code
-        for guest in queryset:
-            new_code = generate_rsvp_code()
-            while Guest.objects.filter(rsvp_code=new_code).exclude(pk=guest.pk).exists():
-                new_code = generate_rsvp_code()
-            guest.rsvp_code = new_code
-            guest.save(update_fields=['rsvp_code'])
-        self.message_user(request, f'Regenerated RSVP codes for {queryset.count()} guests.')
+        guests = list(queryset.only('pk', 'rsvp_code'))
+        old_codes = [guest.rsvp_code for guest in guests]
+        with transaction.atomic():
+            now = timezone.now()
+            for guest, code in zip(guests, allocate_codes(len(guests))):
+                guest.rsvp_code = code
+                guest.updated_at = now
+            bulk_update(guests, ['rsvp_code', 'updated_at'])
+            # Queued invitations carry the old code: they must not go out
+            dropped = invitations.drop_superseded(Guest.objects.filter(cohorts.id_filter(guest.pk for guest in guests)))
+        # bulk_update sends no signals: retire the old codes by hand
+        lookup.invalidate_guests([guest.pk for guest in guests])
+        lookup.invalidate_codes(old_codes + [guest.rsvp_code for guest in guests])
+        self.message_user(request, f'Regenerated RSVP codes for {len(guests)} guests.')
+        if dropped:
+            self.message_user(
+                request,
+                f'{dropped} queued invitation(s) with an old code were dropped; '
+                f'run send_invitations again to send the new codes.',
+                messages.WARNING,
+            )
+    
+    @admin.action(description='Export selected families to CSV')
+    def export_selected_csv(self, request, queryset):
+        return exports.csv_response(exports.guest_rows(queryset), 'selected_guests.csv')
 
 
 @admin.register(RSVP)
@@ -208,6 +520,47 @@ class RSVPAdmin(admin.ModelAdmin):
     date_hierarchy = 'submitted_at'
 
 
+@admin.register(RsvpCounters)
+class RsvpCountersAdmin(admin.ModelAdmin):
+    list_display = ['scope', 'invited', 'attending', 'declined', 'pending', 'updated_at']
+    readonly_fields = ['scope', 'invited', 'attending', 'declined', 'pending', 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'template', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'template']
+    search_fields = ['to_email', 'last_error']
+    readonly_fields = ['template', 'to_email', 'guest', 'context', 'attempts', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry_now']
+    
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        unsent = queryset.exclude(status=OutboundEmail.SENT)
+        # A failed message's context is cleared, so there is nothing left to send
+        cleared = unsent.filter(context={}).count()
+        updated = unsent.exclude(context={}).update(
+            status=OutboundEmail.PENDING, attempts=0, next_attempt_at=timezone.now(), last_error='',
+        )
+        self.message_user(request, f"{updated} email(s) queued for another attempt.")
+        if cleared:
+            self.message_user(
+                request,
+                f"{cleared} failed email(s) have no content left to send. Re-send invitations with "
+                f"'send_invitations --retry-failed'; guests can request their code again.",
+                messages.WARNING,
+            )
+    
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(WeddingInfo)
 class WeddingInfoAdmin(admin.ModelAdmin):
     list_display = ['partner1_name', 'partner2_name', 'wedding_date', 'location']
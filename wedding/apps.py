@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WeddingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wedding'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        from .search import install_sqlite_search
+        post_migrate.connect(install_sqlite_search, sender=self)
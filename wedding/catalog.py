@@ -0,0 +1,115 @@
+"""
+Process-wide event catalog.
+
+The four events change a handful of times before the wedding, yet the
+home page, the RSVP form and the form labels all need them. ``get_catalog()``
+returns an immutable snapshot built once per process, including the
+fallback events used while the table is empty.
+
+Invalidation is versioned: ``Event`` saves and deletes (see ``signals``)
+drop this process's snapshot and bump a version number in the
+``EVENT_CATALOG_CACHE`` cache. Other processes compare versions every
+``EVENT_CATALOG_TTL`` seconds and only re-query when it changed; with a
+shared cache backend, edits reach every worker within one TTL. The default
+cache is per-process, so other workers never see the bump: a snapshot
+older than ``EVENT_CATALOG_MAX_AGE`` seconds is reloaded regardless.
+"""
+
+import threading
+import time
+from types import MappingProxyType
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.formats import date_format
+from .models import Event
+
+
+# Seconds between version checks against the shared cache
+CATALOG_TTL = getattr(settings, 'EVENT_CATALOG_TTL', 300)
+
+# Seconds before the snapshot is reloaded even if no change was announced
+CATALOG_MAX_AGE = getattr(settings, 'EVENT_CATALOG_MAX_AGE', 600)
+
+CATALOG_CACHE = getattr(settings, 'EVENT_CATALOG_CACHE', 'default')
+
+VERSION_KEY = 'wedding:event-catalog-version'
+
+EVENT_FIELDS = [
+    'slug', 'name', 'icon', 'date', 'time', 'venue_name', 'venue_address',
+    'description', 'dress_code', 'is_featured',
+]
+
+DEFAULT_EVENTS = [
+    {'slug': 'mendhi', 'name': 'Mendhi', 'icon': '✿', 'date': 'December 25, 2025', 'time': '4:00 PM onwards', 'venue_name': 'The Garden Pavilion', 'venue_address': '123 Celebration Lane, Mumbai', 'description': 'Join us for an evening of beautiful henna designs, music, and dance.', 'dress_code': 'Colorful Indian Attire', 'is_featured': False},
+    {'slug': 'vidhi', 'name': 'Vidhi', 'icon': '🪔', 'date': 'December 26, 2025', 'time': '10:00 AM - 2:00 PM', 'venue_name': 'Family Residence', 'venue_address': '456 Heritage Road, Mumbai', 'description': 'A sacred ceremony filled with traditional rituals and blessings.', 'dress_code': 'Traditional Indian Wear', 'is_featured': False},
+    {'slug': 'wedding', 'name': 'Wedding', 'icon': '💒', 'date': 'December 27, 2025', 'time': '6:00 PM onwards', 'venue_name': 'The Grand Ballroom', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'description': 'The main event! Watch us exchange vows and become partners for life.', 'dress_code': 'Formal Indian / Western', 'is_featured': True},
+    {'slug': 'reception', 'name': 'Reception', 'icon': '🎉', 'date': 'December 28, 2025', 'time': '7:00 PM onwards', 'venue_name': 'Starlight Terrace', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'description': 'Let\'s dance the night away!', 'dress_code': 'Glamorous Evening Wear', 'is_featured': False},
+]
+
+
+class EventCatalog:
+    """Immutable snapshot of the events, in display order"""
+
+    def __init__(self, events, version=None):
+        self.events = tuple(MappingProxyType(dict(event)) for event in events)
+        self.by_slug = MappingProxyType({event['slug']: event for event in self.events})
+        self.version = version
+        self.built_at = self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, version=None):
+        events = list(Event.objects.values(*EVENT_FIELDS)) or DEFAULT_EVENTS
+        return cls(events, version)
+
+    def details(self, slug):
+        return self.by_slug.get(slug, MappingProxyType({}))
+
+    def label(self, slug, fallback=''):
+        """'Mendhi - December 25, 2025' style label for form fields"""
+        event = self.by_slug.get(slug)
+        if event is None:
+            return fallback
+        event_date = event['date']
+        if not isinstance(event_date, str):
+            event_date = date_format(event_date, 'F j, Y')
+        return f"{event['name']} - {event_date}"
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def _shared_version():
+    return caches[CATALOG_CACHE].get(VERSION_KEY, 0)
+
+
+def get_catalog():
+    """The current catalog; queries the database only after an invalidation"""
+    global _catalog
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - catalog.loaded_at < CATALOG_TTL and now - catalog.built_at < CATALOG_MAX_AGE:
+        return catalog
+
+    with _lock:
+        version = _shared_version()
+        if _catalog is not None and _catalog.version == version and now - _catalog.built_at < CATALOG_MAX_AGE:
+            # Nothing changed elsewhere: keep the snapshot, restart the TTL
+            _catalog.loaded_at = time.monotonic()
+        else:
+            _catalog = EventCatalog.load(version)
+        return _catalog
+
+
+def invalidate():
+    """Drop the snapshot here and tell other processes to rebuild theirs"""
+    global _catalog
+    cache = caches[CATALOG_CACHE]
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key evicted between add() and incr(); any new value works
+        cache.set(VERSION_KEY, int(time.time()), None)
+    with _lock:
+        _catalog = None
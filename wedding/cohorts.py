@@ -0,0 +1,624 @@
+"""
+In-memory bitmap index for guest cohort queries.
+
+Every family member gets a bit position, and the index keeps one bitset
+(a Python int) per term:
+
+* ``mendhi``, ``vidhi``, ... - invited to the event
+* ``mendhi:attending``, ``mendhi:declined``, ``mendhi:pending`` - invited
+  and with that response
+* ``father``, ``grandmother``, ... - the member's relation
+* ``responded`` - the member's family has submitted its RSVP
+* ``all`` - every member
+
+Cohorts are written as expressions over those terms with ``&`` (and),
+``|`` (or), ``!`` (not), parentheses, and ``family(...)``, which widens a
+set of members to everyone in their families::
+
+    mendhi & !vidhi & wedding:pending & family(grandfather | grandmother)
+
+Evaluating one is a handful of bitwise operations on ints, a few
+microseconds per operator even for hundreds of thousands of members.
+
+The index is built from one query on first use. Member and family saves
+and deletes in this process update it when they commit (see ``signals``)
+and bump a version in the ``COHORT_INDEX_CACHE`` cache; other processes check
+that version every ``COHORT_INDEX_TTL`` seconds and rebuild when it moved.
+Bulk writes call ``members_changed`` or ``invalidate``. As a backstop, an
+index older than ``COHORT_INDEX_MAX_AGE`` seconds is rebuilt on next use.
+"""
+
+import json
+import re
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Event, FamilyMember, Guest
+
+
+# Seconds between version checks against the shared cache
+INDEX_TTL = getattr(settings, 'COHORT_INDEX_TTL', 30)
+
+# Seconds before the index is rebuilt even if no change was announced
+INDEX_MAX_AGE = getattr(settings, 'COHORT_INDEX_MAX_AGE', 600)
+
+INDEX_CACHE = getattr(settings, 'COHORT_INDEX_CACHE', 'default')
+
+VERSION_KEY = 'wedding:cohort-index-version'
+
+EVENT_SLUGS = [slug for slug, _ in Event.EVENT_CHOICES]
+
+RELATIONS = [relation for relation, _ in FamilyMember.RELATION_CHOICES]
+
+# FamilyMember.rsvp_* value -> term suffix
+STATUS_TERMS = {
+    'attending': 'attending',
+    'not_attending': 'declined',
+    'pending': 'pending',
+}
+
+TERMS = (
+    ['all', 'responded'] + RELATIONS + EVENT_SLUGS
+    + [f'{slug}:{status}' for slug in EVENT_SLUGS for status in STATUS_TERMS.values()]
+)
+
+MEMBER_FIELDS = (
+    ['id', 'family_id', 'relation', 'family__has_responded']
+    + [f'invited_{slug}' for slug in EVENT_SLUGS]
+    + [f'rsvp_{slug}' for slug in EVENT_SLUGS]
+)
+
+
+class CohortError(ValueError):
+    """A cohort expression that doesn't parse or names an unknown term"""
+
+
+def member_terms(relation, responded, invited, statuses):
+    """Terms a member belongs to, given per-event ``invited``/``statuses`` dicts"""
+    terms = ['all', relation]
+    if responded:
+        terms.append('responded')
+    for slug in EVENT_SLUGS:
+        if invited[slug]:
+            terms.append(slug)
+            if statuses[slug] in STATUS_TERMS:
+                terms.append(f'{slug}:{STATUS_TERMS[statuses[slug]]}')
+    return terms
+
+
+def terms_of(member, responded):
+    return member_terms(
+        member.relation,
+        responded,
+        {slug: getattr(member, f'invited_{slug}') for slug in EVENT_SLUGS},
+        {slug: getattr(member, f'rsvp_{slug}') for slug in EVENT_SLUGS},
+    )
+
+
+def iter_bits(bits):
+    """Positions of the set bits, lowest first"""
+    # bin() and str.find run in C: far faster than shifting a huge int
+    digits = bin(bits)[:1:-1]
+    find = digits.find
+    position = find('1')
+    while position != -1:
+        yield position
+        position = find('1', position + 1)
+
+
+TOKEN_RE = re.compile(r'\s*(?:([()&|!])|([a-z_]+(?::[a-z_]+)?))')
+
+KEYWORDS = {'and': '&', 'or': '|', 'not': '!'}
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.lower().strip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if match is None:
+            raise CohortError(f"Unexpected '{expression[position:].strip()[:20]}'")
+        operator, name = match.groups()
+        tokens.append(operator or KEYWORDS.get(name, name))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent over ``or := and ('|' and)*``,
+    ``and := unary ('&' unary)*``, ``unary := '!' unary | atom`` and
+    ``atom := '(' or ')' | 'family' '(' or ')' | term``.
+
+    Produces nested tuples: ``('term', name)``, ``('not', node)``,
+    ``('and', left, right)``, ``('or', left, right)``, ``('family', node)``.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None:
+            raise CohortError('Unexpected end of expression')
+        if expected is not None and token != expected:
+            raise CohortError(f"Expected '{expected}' but found '{token}'")
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise CohortError('Empty cohort expression')
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise CohortError(f"Unexpected '{self.peek()}'")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == '|':
+            self.take()
+            node = ('or', node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_unary()
+        while self.peek() == '&':
+            self.take()
+            node = ('and', node, self.parse_unary())
+        return node
+
+    def parse_unary(self):
+        if self.peek() == '!':
+            self.take()
+            return ('not', self.parse_unary())
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.take()
+        if token == '(':
+            node = self.parse_or()
+            self.take(')')
+            return node
+        if token == 'family':
+            self.take('(')
+            node = self.parse_or()
+            self.take(')')
+            return ('family', node)
+        if token in '()&|!':
+            raise CohortError(f"Unexpected '{token}'")
+        event, _, status = token.partition(':')
+        if status in STATUS_TERMS:
+            # The rsvp value works as well: mendhi:not_attending == mendhi:declined
+            token = f'{event}:{STATUS_TERMS[status]}'
+        if token not in TERMS:
+            raise CohortError(f"Unknown term '{token}'")
+        return ('term', token)
+
+
+def parse(expression):
+    return Parser(tokenize(expression)).parse()
+
+
+def _set_bit(buffer, position):
+    byte = position >> 3
+    if len(buffer) <= byte:
+        buffer.extend(bytes(byte + 1 - len(buffer)))
+    buffer[byte] |= 1 << (position & 7)
+
+
+def _ones(start, count):
+    return ((1 << count) - 1) << start
+
+
+class CohortIndex:
+    """
+    Bitsets over member positions, plus the maps back to members and families.
+
+    Each family's members occupy a contiguous block of slots followed by a
+    guard bit that is never a member. That layout makes ``family(...)``
+    arithmetic too: adding ``slots`` to a member set carries into the guard
+    of exactly the families it touches, and a few shift-and-mask steps
+    spread each guard back over its block.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.bitsets = {}
+        self.slots = 0          # every member slot, including freed ones
+        self.guards = 0         # the bit after each block
+        self.size = 0           # positions used (slots and guards)
+        self.member_ids = []    # position -> member id (None: guard or free)
+        self.family_of = []     # position -> family id
+        self.positions = {}     # member id -> position
+        self.blocks = {}        # family id -> (start, end) of its slots
+        self._fill_masks = None
+        self.built_at = self.checked_at = time.monotonic()
+
+    @classmethod
+    def build(cls, version=None):
+        index = cls(version)
+        buffers = {}
+        slots, guards = bytearray(), bytearray()
+        member_ids, family_of, positions = index.member_ids, index.family_of, index.positions
+        rows = FamilyMember.objects.order_by('family_id', 'id').values_list(*MEMBER_FIELDS)
+        events = len(EVENT_SLUGS)
+        current, start = None, 0
+        for row in rows.iterator(chunk_size=5000):
+            member_id, family_id, relation, responded = row[:4]
+            if family_id != current:
+                if current is not None:
+                    index.blocks[current] = (start, len(member_ids))
+                    _set_bit(guards, len(member_ids))
+                    member_ids.append(None)
+                    family_of.append(current)
+                current, start = family_id, len(member_ids)
+            position = len(member_ids)
+            member_ids.append(member_id)
+            family_of.append(family_id)
+            positions[member_id] = position
+            _set_bit(slots, position)
+            invited = dict(zip(EVENT_SLUGS, row[4:4 + events]))
+            statuses = dict(zip(EVENT_SLUGS, row[4 + events:]))
+            for term in member_terms(relation, responded, invited, statuses):
+                buffer = buffers.get(term)
+                if buffer is None:
+                    buffer = buffers[term] = bytearray()
+                _set_bit(buffer, position)
+        if current is not None:
+            index.blocks[current] = (start, len(member_ids))
+            _set_bit(guards, len(member_ids))
+            member_ids.append(None)
+            family_of.append(current)
+        # Bits are set in bytearrays and converted once: setting them on an
+        # int one at a time would copy the whole int for every member
+        index.bitsets = {term: int.from_bytes(buffer, 'little') for term, buffer in buffers.items()}
+        index.slots = int.from_bytes(slots, 'little')
+        index.guards = int.from_bytes(guards, 'little')
+        index.size = len(member_ids)
+        return index
+
+    def bits(self, term):
+        return self.bitsets.get(term, 0)
+
+    # Incremental upkeep (idempotent: the member's current state wins)
+
+    def _new_block(self, family_id, count):
+        start = self.size
+        self.member_ids.extend([None] * (count + 1))
+        self.family_of.extend([family_id] * (count + 1))
+        self.slots |= _ones(start, count)
+        self.guards |= 1 << (start + count)
+        self.size += count + 1
+        self.blocks[family_id] = (start, start + count)
+        self._fill_masks = None
+        return start
+
+    def _free_slot(self, family_id):
+        """A free slot in the family's block, moving the block if it is full"""
+        start, end = self.blocks.get(family_id) or (0, 0)
+        for position in range(start, end):
+            if self.member_ids[position] is None:
+                return position
+        # Full (or new): move the live members to a block twice the size
+        members = [(position, self.member_ids[position]) for position in range(start, end)]
+        new_start = self._new_block(family_id, max(2 * len(members), 1))
+        for offset, (old, member_id) in enumerate(members):
+            new = new_start + offset
+            for term, bits in self.bitsets.items():
+                if bits >> old & 1:
+                    self.bitsets[term] = (bits & ~(1 << old)) | (1 << new)
+            self.member_ids[old] = None
+            self.member_ids[new] = member_id
+            self.positions[member_id] = new
+        return new_start + len(members)
+
+    def set_member(self, member_id, family_id, terms):
+        position = self.positions.get(member_id)
+        if position is not None and self.family_of[position] != family_id:
+            # Moved to another family
+            self.remove_member(member_id)
+            position = None
+        if position is None:
+            position = self._free_slot(family_id)
+            self.member_ids[position] = member_id
+            self.positions[member_id] = position
+        mask = 1 << position
+        wanted = set(terms)
+        for term in wanted | set(self.bitsets):
+            bits = self.bitsets.get(term, 0)
+            self.bitsets[term] = bits | mask if term in wanted else bits & ~mask
+
+    def remove_member(self, member_id):
+        position = self.positions.pop(member_id, None)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        for term, bits in self.bitsets.items():
+            self.bitsets[term] = bits & mask
+        self.member_ids[position] = None
+
+    def family_responded(self, family_id):
+        """Whether the family has responded, or None if none of its members are indexed"""
+        start, end = self.blocks.get(family_id, (0, 0))
+        members = _ones(start, end - start) & self.bitsets.get('all', 0)
+        if not members:
+            return None
+        return bool(members & self.bitsets.get('responded', 0))
+
+    def set_family_responded(self, family_id, responded):
+        start, end = self.blocks.get(family_id, (0, 0))
+        mask = _ones(start, end - start) & self.bitsets.get('all', 0)
+        bits = self.bitsets.get('responded', 0)
+        self.bitsets['responded'] = bits | mask if responded else bits & ~mask
+
+    # Evaluation
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind == 'term':
+            return self.bits(node[1])
+        if kind == 'not':
+            return self.bitsets.get('all', 0) & ~self.evaluate(node[1])
+        if kind == 'and':
+            return self.evaluate(node[1]) & self.evaluate(node[2])
+        if kind == 'or':
+            return self.evaluate(node[1]) | self.evaluate(node[2])
+        if kind == 'family':
+            return self.widen_to_families(self.evaluate(node[1]))
+        raise CohortError(f'Unknown operation {kind!r}')
+
+    def hit_guards(self, bits):
+        """Guard bits of the families with a member in ``bits``"""
+        # Each block's slots are all ones, so adding any member bit of the
+        # block carries out of it, into its guard and no further
+        return (bits + self.slots) & self.guards
+
+    def fill_masks(self):
+        """
+        ``(k, mask)`` steps spreading a guard bit down over its block:
+        ``mask`` has a bit where the k positions from it up are all slots.
+        """
+        if self._fill_masks is None:
+            longest = max((end - start for start, end in self.blocks.values()), default=0)
+            masks, step, mask = [], 1, self.slots
+            while step <= longest:
+                masks.append((step, mask))
+                mask &= mask >> step
+                step *= 2
+            self._fill_masks = masks
+        return self._fill_masks
+
+    def widen_to_families(self, bits):
+        """Every member of each family with a member in ``bits``"""
+        filled = self.hit_guards(bits)
+        for step, mask in self.fill_masks():
+            filled |= (filled >> step) & mask
+        return filled & self.bitsets.get('all', 0)
+
+    def families(self, bits):
+        family_of = self.family_of
+        return [family_of[position] for position in iter_bits(self.hit_guards(bits))]
+
+    def query(self, expression):
+        return Cohort(self, expression, self.evaluate(parse(expression)))
+
+
+class Cohort:
+    """The members matching an expression, as a bitset over an index"""
+
+    def __init__(self, index, expression, bits):
+        self.index = index
+        self.expression = expression
+        self.bits = bits
+
+    @property
+    def member_count(self):
+        return self.bits.bit_count()
+
+    def member_ids(self, limit=None):
+        ids = []
+        for position in iter_bits(self.bits):
+            if limit is not None and len(ids) >= limit:
+                break
+            ids.append(self.index.member_ids[position])
+        return ids
+
+    def family_ids(self):
+        return self.index.families(self.bits)
+
+
+_index = None
+_lock = threading.Lock()
+
+# Held by the one thread building a new index, outside _lock
+_build_lock = threading.Lock()
+
+# (version, change) applied here while a build runs, replayed onto the new
+# index before it is swapped in; None when no build is running
+_journal = None
+
+
+def _shared_version():
+    return caches[INDEX_CACHE].get(VERSION_KEY, 0)
+
+
+def _bump_version():
+    cache = caches[INDEX_CACHE]
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key evicted between add() and incr(); any new value works
+        version = int(time.time())
+        cache.set(VERSION_KEY, version, None)
+        return version
+
+
+def _is_fresh(index, now):
+    return index is not None and now - index.checked_at < INDEX_TTL and now - index.built_at < INDEX_MAX_AGE
+
+
+def get_index():
+    """
+    This process's index; rebuilt when stale, changed elsewhere or missing.
+
+    The build runs outside ``_lock``, so committed changes are applied
+    (and journalled) meanwhile, and other threads keep using the old index
+    rather than waiting; only a process with no index at all waits.
+    """
+    index = _index
+    if _is_fresh(index, time.monotonic()):
+        return index
+
+    if not _build_lock.acquire(blocking=False):
+        current = _index
+        if current is not None:
+            # Another thread is building; use the old index until it is done
+            return current
+        _build_lock.acquire()
+    try:
+        return _rebuild()
+    finally:
+        _build_lock.release()
+
+
+def _rebuild():
+    """Check the version and build a new index if needed; caller holds _build_lock"""
+    global _index, _journal
+    with _lock:
+        now = time.monotonic()
+        if _is_fresh(_index, now):
+            # Built by the thread this one waited for
+            return _index
+        version = _shared_version()
+        if _index is not None and _index.version == version and now - _index.built_at < INDEX_MAX_AGE:
+            _index.checked_at = now
+            return _index
+        journal = _journal = []
+    try:
+        index = CohortIndex.build(version)
+    except BaseException:
+        with _lock:
+            _journal = None
+        raise
+    with _lock:
+        _journal = None
+        for change_version, change in journal:
+            if change is None or change_version != index.version + 1:
+                # Invalidated, or a change from another process was missed
+                index.version = None
+                index.checked_at = float('-inf')
+                break
+            change(index)
+            index.version = change_version
+        _index = index
+    return index
+
+
+def query(expression):
+    """Evaluate a cohort expression; raises CohortError if it is invalid"""
+    return get_index().query(expression)
+
+
+def _update(change):
+    """Apply ``change(index)`` here and announce it, once the write commits"""
+    def apply():
+        with _lock:
+            version = _bump_version()
+            if _journal is not None:
+                _journal.append((version, change))
+            if _index is None:
+                return
+            if _index.version is not None and version == _index.version + 1:
+                change(_index)
+                _index.version = version
+                if _index.size > 2 * len(_index.positions) + 1024:
+                    # Mostly abandoned slots after many moves: compact on next use
+                    _index.checked_at = float('-inf')
+                    _index.version = None
+            else:
+                # Missed a change from another process: rebuild on next use
+                _index.version = None
+                _index.checked_at = float('-inf')
+    transaction.on_commit(apply)
+
+
+def member_saved(member, responded=None):
+    """
+    Record a member's state as of now. ``responded`` is their family's;
+    when not given it is read from the index (other members of the family),
+    and only from the database for a family the index has no members of.
+    """
+    member_id, family_id = member.pk, member.family_id
+    terms = terms_of(member, False)
+
+    def change(index):
+        family_responded = responded
+        if family_responded is None:
+            family_responded = index.family_responded(family_id)
+        if family_responded is None:
+            family_responded = bool(
+                Guest.objects.filter(pk=family_id).values_list('has_responded', flat=True).first()
+            )
+        index.set_member(member_id, family_id, terms + ['responded'] if family_responded else terms)
+    _update(change)
+
+
+def members_changed(members, responded):
+    """``member_saved`` for a batch of members whose families share ``responded``"""
+    states = [(member.pk, member.family_id, terms_of(member, responded)) for member in members]
+
+    def change(index):
+        for state in states:
+            index.set_member(*state)
+    _update(change)
+
+
+def member_deleted(member_id):
+    _update(lambda index: index.remove_member(member_id))
+
+
+def family_responded(family_id, responded):
+    _update(lambda index: index.set_family_responded(family_id, responded))
+
+
+def invalidate():
+    """Rebuild on next use, here and in every process sharing the cache"""
+    global _index
+    with _lock:
+        _bump_version()
+        _index = None
+        if _journal is not None:
+            _journal.append((None, None))
+
+
+def id_filter(ids):
+    """
+    ``pk__in`` for a Guest id set of any size, sent as one parameter
+    (PostgreSQL array / SQLite JSON) instead of one placeholder per id.
+    """
+    ids = list(ids)
+    if not ids:
+        return Q(pk__in=[])
+    if connection.vendor == 'postgresql':
+        return Q(pk__in=RawSQL('SELECT unnest(%s::uuid[])', [ids]))
+    if connection.vendor == 'sqlite':
+        # UUIDs are stored as 32 hex digits on SQLite
+        return Q(pk__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps([pk.hex for pk in ids])]))
+    return Q(pk__in=ids)
+
+
+def guests_in(cohort, queryset=None):
+    """Families with at least one member in the cohort"""
+    queryset = queryset if queryset is not None else Guest.objects.all()
+    return queryset.filter(id_filter(cohort.family_ids()))
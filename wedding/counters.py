@@ -0,0 +1,222 @@
+"""
+Incrementally maintained RSVP counters.
+
+``RsvpCounters`` holds one row per event plus ``families``/``members``
+summary rows. Write paths apply deltas as one UPDATE of ``F()`` increments inside
+their own transaction, so reads are a single six-row query instead of a
+rescan of ``wedding_guest``/``wedding_familymember``.
+
+Two ways to produce a delta:
+
+* ``CounterDelta`` - built in Python from model instances already in
+  memory (used by the RSVP form, where members are loaded anyway).
+* ``snapshot()`` before and after a write, then ``apply_difference()`` -
+  used by admin saves/deletes where the change set is arbitrary.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .models import Guest, RsvpCounters
+from .stats import EVENT_SLUGS, compute_rsvp_stats
+
+
+COUNTER_FIELDS = ('invited', 'attending', 'declined', 'pending')
+
+# FamilyMember.rsvp_* value -> counter column
+STATUS_FIELDS = {
+    'attending': 'attending',
+    'not_attending': 'declined',
+    'pending': 'pending',
+}
+
+SCOPES = EVENT_SLUGS + [RsvpCounters.FAMILIES, RsvpCounters.MEMBERS]
+
+
+def empty_rows():
+    """Counter rows with every value set to zero"""
+    return {scope: dict.fromkeys(COUNTER_FIELDS, 0) for scope in SCOPES}
+
+
+def stats_to_rows(stats):
+    """Convert a ``compute_rsvp_stats()`` result into counter rows"""
+    rows = empty_rows()
+    rows[RsvpCounters.FAMILIES].update(
+        invited=stats['total_families'],
+        attending=stats['responded'],
+        pending=stats['pending'],
+    )
+    rows[RsvpCounters.MEMBERS]['invited'] = stats['total_members']
+    for slug in EVENT_SLUGS:
+        event = stats['events'][slug]
+        rows[slug].update(
+            invited=event['invited'],
+            attending=event['attending'],
+            declined=event['not_attending'],
+            pending=event['pending'],
+        )
+    return rows
+
+
+def rows_to_stats(rows):
+    """Convert counter rows back into the ``compute_rsvp_stats()`` shape"""
+    families = rows[RsvpCounters.FAMILIES]
+    events = {}
+    for slug in EVENT_SLUGS:
+        row = rows[slug]
+        events[slug] = {
+            'invited': row['invited'],
+            'attending': row['attending'],
+            'not_attending': row['declined'],
+            'pending': row['pending'],
+            'total_guests': row['attending'],
+        }
+    return {
+        'total_families': families['invited'],
+        'responded': families['attending'],
+        'pending': families['pending'],
+        'total_members': rows[RsvpCounters.MEMBERS]['invited'],
+        'events': events,
+    }
+
+
+class CounterDelta:
+    """Accumulates counter changes in memory and applies them in one go"""
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: defaultdict(int))
+
+    def add_family(self, guest, sign=1):
+        """Count (sign=1) or uncount (sign=-1) a family's summary row"""
+        family = self.changes[RsvpCounters.FAMILIES]
+        family['invited'] += sign
+        family['attending' if guest.has_responded else 'pending'] += sign
+
+    def add_member(self, member, sign=1):
+        """Count (sign=1) or uncount (sign=-1) a member's per-event state"""
+        self.changes[RsvpCounters.MEMBERS]['invited'] += sign
+        for slug in EVENT_SLUGS:
+            if getattr(member, f'invited_{slug}'):
+                row = self.changes[slug]
+                row['invited'] += sign
+                status = getattr(member, f'rsvp_{slug}')
+                if status in STATUS_FIELDS:
+                    row[STATUS_FIELDS[status]] += sign
+
+    def add_rows(self, rows, sign=1):
+        """Merge a full set of counter rows (e.g. a snapshot)"""
+        for scope, values in rows.items():
+            for field, value in values.items():
+                self.changes[scope][field] += sign * value
+
+    def apply(self):
+        """Write the accumulated changes; call inside the write's transaction"""
+        apply_delta(self.changes)
+
+
+def apply_delta(changes):
+    """Apply ``{scope: {field: delta}}`` as one UPDATE of atomic ``F()`` increments"""
+    changes = {
+        scope: {field: delta for field, delta in values.items() if delta}
+        for scope, values in changes.items()
+    }
+    changes = {scope: values for scope, values in changes.items() if values}
+    if not changes:
+        return
+
+    updates = {}
+    for field in COUNTER_FIELDS:
+        whens = [
+            When(scope=scope, then=Value(values[field]))
+            for scope, values in changes.items() if field in values
+        ]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0))
+    RsvpCounters.objects.filter(scope__in=list(changes)).update(updated_at=timezone.now(), **updates)
+
+
+def snapshot(queryset):
+    """Counter rows contributed by the given families and their members"""
+    return stats_to_rows(compute_rsvp_stats(queryset))
+
+
+def apply_difference(before, after):
+    """Apply the change between two ``snapshot()`` results"""
+    delta = CounterDelta()
+    delta.add_rows(after)
+    delta.add_rows(before, sign=-1)
+    delta.apply()
+
+
+@contextmanager
+def tracking(family_ids):
+    """
+    Keep counters in step with an arbitrary write to the given families.
+
+    Snapshots the families before and after the block and applies the
+    difference, all in one transaction. Ids are materialized up front so
+    deleted families are still found afterwards (and count as zero).
+    """
+    families = Guest.objects.filter(pk__in=[pk for pk in family_ids if pk])
+    with transaction.atomic():
+        before = snapshot(families)
+        yield
+        apply_difference(before, snapshot(families))
+
+
+def family_added(count=1):
+    """Record newly created families that have not responded yet"""
+    if count:
+        apply_delta({RsvpCounters.FAMILIES: {'invited': count, 'pending': count}})
+
+
+def _store(rows):
+    RsvpCounters.objects.bulk_create(
+        [RsvpCounters(scope=scope, **values) for scope, values in rows.items()],
+        update_conflicts=True,
+        unique_fields=['scope'],
+        update_fields=[*COUNTER_FIELDS, 'updated_at'],
+    )
+
+
+def read_rows():
+    """Stored counter rows; rebuilt from scratch if any row is missing"""
+    rows = {
+        row['scope']: {field: row[field] for field in COUNTER_FIELDS}
+        for row in RsvpCounters.objects.values('scope', *COUNTER_FIELDS)
+    }
+    if set(rows) != set(SCOPES):
+        rebuild()
+        return read_rows()
+    return rows
+
+
+def read_stats():
+    """Dashboard stats in the ``compute_rsvp_stats()`` shape, read in O(1)"""
+    return rows_to_stats(read_rows())
+
+
+def rebuild(dry_run=False):
+    """
+    Recompute every counter from the source tables.
+
+    Returns ``{scope: {field: (stored, actual)}}`` for each value that had
+    drifted. With ``dry_run`` the stored counters are left untouched.
+    """
+    with transaction.atomic():
+        actual = snapshot(None)
+        stored = {
+            row['scope']: row
+            for row in RsvpCounters.objects.select_for_update().values('scope', *COUNTER_FIELDS)
+        }
+        drift = {}
+        for scope, values in actual.items():
+            for field, value in values.items():
+                current = stored[scope][field] if scope in stored else None
+                if current != value:
+                    drift.setdefault(scope, {})[field] = (current, value)
+        if not dry_run and drift:
+            _store(actual)
+    return drift
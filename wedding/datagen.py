@@ -0,0 +1,312 @@
+"""
+Synthetic guest lists for tests and benchmarks.
+
+``generate(families, seed)`` adds that many families, their members and
+the members' invitations, then rebuilds the RSVP counters and drops the
+cohort index. The same seed always produces the same list: ids, RSVP
+codes, names, invitations, responses and timestamps (as offsets from
+now) all come from seeded generators.
+
+Rows are written in batches, one transaction each, without building
+model instances: families and members with one multi-row insert per
+table (COPY on PostgreSQL), invitations set-based from the new members'
+columns with INSERT ... SELECT. That keeps 100k families to well under a
+minute. Bulk writes send no signals; everything signals would maintain
+is refreshed at the end.
+
+Families look like the real list: a couple with children, sometimes
+grandparents or a joint family with uncles, aunts and cousins, and some
+single friends. Everyone is invited to the wedding and reception; the
+mendhi and vidhi mostly go to close family and the younger generation.
+"""
+
+import random
+import uuid
+from datetime import timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from . import cohorts, counters, search
+from .codes import CodeAllocator
+from .models import RSVP_CODE_ALPHABET, RSVP_CODE_LENGTH, FamilyMember, Guest, Invitation
+
+
+EVENT_SLUGS = ['mendhi', 'vidhi', 'wedding', 'reception']
+
+# Families written (with their members and invitations) per transaction
+DEFAULT_BATCH_SIZE = 5000
+
+# Share of families that have submitted their RSVP
+DEFAULT_RESPONDED = 0.6
+
+# Families were imported over this window, ending RSVP_WINDOW ago...
+IMPORT_WINDOW = timedelta(days=30)
+
+# ...and have been opening their links and answering since
+RSVP_WINDOW = timedelta(days=60)
+
+SURNAMES = [
+    'Desai', 'Patel', 'Shah', 'Mehta', 'Sharma', 'Joshi', 'Trivedi', 'Parikh', 'Gandhi', 'Modi',
+    'Amin', 'Bhatt', 'Chokshi', 'Dave', 'Kapadia', 'Mistry', 'Naik', 'Pandya', 'Raval', 'Thakkar',
+    'Vyas', 'Iyer', 'Nair', 'Reddy', 'Rao', 'Gupta', 'Agarwal', 'Kumar', 'Singh', 'Chopra',
+    'Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Wilson', 'Taylor', 'Clark', 'Lewis', 'Walker',
+]
+
+MALE_NAMES = [
+    'Rajesh', 'Suresh', 'Anil', 'Dinesh', 'Mahesh', 'Arjun', 'Vikram', 'Rohan', 'Karan', 'Amit',
+    'Nikhil', 'Kunal', 'Harsh', 'Dev', 'Yash', 'Parth', 'Jay', 'Neel', 'Aarav', 'Vihaan',
+    'James', 'Michael', 'David', 'Daniel', 'Ethan',
+]
+
+FEMALE_NAMES = [
+    'Priya', 'Meena', 'Sunita', 'Rekha', 'Geeta', 'Ananya', 'Kavya', 'Neha', 'Pooja', 'Riya',
+    'Isha', 'Diya', 'Krupa', 'Hetal', 'Nisha', 'Shreya', 'Tara', 'Anjali', 'Aditi', 'Mira',
+    'Sarah', 'Emily', 'Olivia', 'Emma', 'Grace',
+]
+
+DIETARY_NOTES = [
+    'Vegetarian', 'Vegan', 'Jain (no onion or garlic)', 'Gluten free', 'Nut allergy',
+    'No eggs', 'Diabetic', 'Lactose intolerant',
+]
+
+MESSAGES = [
+    'Congratulations! We cannot wait to celebrate with you.',
+    'So happy for you both!',
+    'Wishing you a lifetime of love and happiness.',
+    'See you on the dance floor!',
+    'Sorry we will miss the mendhi, see you at the wedding.',
+]
+
+# Share of a family's members saying yes to an event they respond to
+ATTENDING_RATE = 0.85
+
+# (relation, gender, generation); generation 0 is the couple's
+PARENTS = [('father', 'm', 0), ('mother', 'f', 0)]
+GRANDPARENTS = [('grandfather', 'm', -1), ('grandmother', 'f', -1)]
+EXTENDED = [('uncle', 'm', 0), ('aunt', 'f', 0), ('cousin', None, 1)]
+
+
+def _uuid(rng):
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _first_name(rng, gender):
+    if gender is None:
+        gender = rng.choice('mf')
+    return rng.choice(MALE_NAMES if gender == 'm' else FEMALE_NAMES)
+
+
+def _household(rng):
+    """[(relation, gender, generation)] for one family, the contact first"""
+    if rng.random() < 0.2:
+        # A friend, maybe with a partner
+        people = [('other', None, 0)]
+        if rng.random() < 0.5:
+            people.append(('spouse', None, 0))
+        return people
+
+    people = list(PARENTS) if rng.random() < 0.85 else [rng.choice(PARENTS)]
+    people += [(rng.choice(['son', 'daughter']), None, 1) for _ in range(rng.choice([0, 1, 2, 2, 3, 4]))]
+    if rng.random() < 0.25:
+        people += GRANDPARENTS[:rng.choice([1, 2, 2])]
+    if rng.random() < 0.08:
+        # Joint family
+        people += [rng.choice(EXTENDED) for _ in range(rng.randint(2, 12))]
+    return people
+
+
+def _invited(rng, relation, generation, close):
+    """{event: invited} for one member"""
+    invited = {'wedding': True, 'reception': True}
+    young = generation >= 1 or relation in ('other', 'spouse')
+    invited['mendhi'] = close and (young or rng.random() < 0.3)
+    invited['vidhi'] = close and rng.random() < 0.7
+    return invited
+
+
+def _family(rng, code, index, responded_rate, created_at, now):
+    """One family's Guest field values and its members' FamilyMember field values"""
+    surname = rng.choice(SURNAMES)
+    household = _household(rng)
+    close = rng.random() < 0.35
+    responded = rng.random() < responded_rate
+    contact = _first_name(rng, household[0][1])
+    window = int(RSVP_WINDOW.total_seconds())
+
+    guest = {
+        'id': _uuid(rng),
+        'rsvp_code': code,
+        'name': f'{surname} Family' if len(household) > 1 else f'{contact} {surname}',
+        'party_name': f'The {surname} Family' if len(household) > 1 else '',
+        'email': f'{contact}.{surname}{index}@example.com'.lower() if rng.random() < 0.85 else '',
+        'phone': f'98{rng.randrange(10 ** 8):08d}' if rng.random() < 0.6 else '',
+        'max_guests': len(household),
+        'has_responded': responded,
+        'message': '',
+        'created_at': created_at,
+        'updated_at': created_at,
+        'rsvp_submitted_at': None,
+        'last_viewed_at': None,
+    }
+    if responded:
+        guest['rsvp_submitted_at'] = now - timedelta(seconds=rng.randrange(window))
+        guest['updated_at'] = guest['last_viewed_at'] = guest['rsvp_submitted_at']
+        if rng.random() < 0.3:
+            guest['message'] = rng.choice(MESSAGES)
+    elif rng.random() < 0.3:
+        guest['last_viewed_at'] = now - timedelta(seconds=rng.randrange(window))
+
+    members = []
+    for order, (relation, gender, generation) in enumerate(household):
+        first = contact if order == 0 else _first_name(rng, gender)
+        member = {
+            'family_id': guest['id'],
+            'name': f'{first} {surname}',
+            'relation': relation,
+            'order': order,
+            'dietary_requirements': rng.choice(DIETARY_NOTES) if rng.random() < 0.12 else '',
+        }
+        for slug, invited in _invited(rng, relation, generation, close).items():
+            status = 'pending'
+            if invited and responded:
+                status = 'attending' if rng.random() < ATTENDING_RATE else 'not_attending'
+            member[f'invited_{slug}'] = invited
+            member[f'rsvp_{slug}'] = status
+        members.append(member)
+
+    # The family-level columns summarize the members
+    for slug in EVENT_SLUGS:
+        invited = [member for member in members if member[f'invited_{slug}']]
+        attending = sum(member[f'rsvp_{slug}'] == 'attending' for member in invited)
+        guest[f'invited_{slug}'] = bool(invited)
+        guest[f'guests_{slug}'] = attending
+        status = 'pending'
+        if responded and invited:
+            status = 'attending' if attending else 'not_attending'
+        guest[f'rsvp_{slug}'] = status
+    return guest, members
+
+
+# Column types whose values need no conversion before reaching the driver
+PLAIN_TYPES = {
+    'CharField', 'TextField', 'BooleanField', 'IntegerField', 'PositiveIntegerField',
+    'SmallIntegerField', 'PositiveSmallIntegerField', 'BigIntegerField',
+}
+
+
+class RowWriter:
+    """
+    Inserts rows given as {attname: value} into a model's table, without
+    model instances. Every column but an auto-increment primary key is
+    written; missing values take the field's (non-callable) default.
+    """
+
+    def __init__(self, model):
+        fields = [field for field in model._meta.concrete_fields if field is not model._meta.auto_field]
+        self.table = model._meta.db_table
+        self.columns = [field.column for field in fields]
+        # (attname, default, converter or None), in column order
+        self.plan = [
+            (
+                field.attname,
+                None if field.has_default() and callable(field.default) else field.get_default(),
+                None if field.get_internal_type() in PLAIN_TYPES else field.get_db_prep_save,
+            )
+            for field in fields
+        ]
+
+    def values(self, row, connection):
+        values = []
+        for attname, default, convert in self.plan:
+            value = row.get(attname, default)
+            if convert is not None and value is not None:
+                value = convert(value, connection)
+            values.append(value)
+        return values
+
+    def insert(self, cursor, rows):
+        # The connection itself, not the thread-local proxy: values() is per row and column
+        connection = cursor.db
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(column) for column in self.columns)
+        if connection.vendor == 'postgresql':
+            with cursor.cursor.copy(f'COPY {quote(self.table)} ({columns}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(self.values(row, connection))
+        else:
+            placeholders = ', '.join(['%s'] * len(self.columns))
+            cursor.executemany(
+                f'INSERT INTO {quote(self.table)} ({columns}) VALUES ({placeholders})',
+                [self.values(row, connection) for row in rows],
+            )
+
+
+def _insert_invitations(cursor, after_member_id):
+    """Invitation rows for every member with a higher id, from their event columns"""
+    quote = connection.ops.quote_name
+    invitation_table = quote(Invitation._meta.db_table)
+    member_table = quote(FamilyMember._meta.db_table)
+    for slug in EVENT_SLUGS:
+        cursor.execute(
+            f"""
+            INSERT INTO {invitation_table} (member_id, event, status, headcount)
+            SELECT id, %s, rsvp_{slug}, CASE WHEN rsvp_{slug} = 'attending' THEN 1 ELSE 0 END
+            FROM {member_table}
+            WHERE id > %s AND invited_{slug}
+            """,
+            [slug, after_member_id],
+        )
+
+
+def generate(families, seed=0, batch_size=DEFAULT_BATCH_SIZE, responded=DEFAULT_RESPONDED, progress=None):
+    """
+    Add ``families`` generated families; returns {'families', 'members', 'invitations'}.
+
+    ``progress(done)`` is called after each committed batch. Generating
+    the same seed twice into one database collides on primary keys.
+    """
+    rng = random.Random(seed)
+    # Codes have their own generator: a collision with an existing code
+    # redraws it without changing any other value
+    code_rng = random.Random(f'{seed}-codes')
+    allocator = CodeAllocator(
+        generate=lambda: ''.join(code_rng.choice(RSVP_CODE_ALPHABET) for _ in range(RSVP_CODE_LENGTH))
+    )
+    guest_writer = RowWriter(Guest)
+    member_writer = RowWriter(FamilyMember)
+    now = timezone.now()
+    imported_from = now - RSVP_WINDOW - IMPORT_WINDOW
+    totals = {'families': 0, 'members': 0, 'invitations': 0}
+
+    # One re-index at the end instead of search triggers firing per row
+    with search.sqlite_search_deferred():
+        for start in range(0, families, batch_size):
+            count = min(batch_size, families - start)
+            # Each batch is one import, later batches a little later
+            created_at = imported_from + IMPORT_WINDOW * start / max(families, 1)
+            guests, members = [], []
+            for index, code in enumerate(allocator.allocate(count), start):
+                guest, family_members = _family(rng, code, index, responded, created_at, now)
+                guests.append(guest)
+                members.extend(family_members)
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'SELECT MAX(id) FROM {connection.ops.quote_name(FamilyMember._meta.db_table)}')
+                last_member_id = cursor.fetchone()[0] or 0
+                guest_writer.insert(cursor, guests)
+                member_writer.insert(cursor, members)
+                _insert_invitations(cursor, last_member_id)
+
+            totals['families'] += len(guests)
+            totals['members'] += len(members)
+            totals['invitations'] += sum(member[f'invited_{slug}'] for member in members for slug in EVENT_SLUGS)
+            if progress:
+                progress(totals['families'])
+
+    # Planner statistics for the new rows before the first query uses them;
+    # without them SQLite sorts the whole member table for the changelist
+    with connection.cursor() as cursor:
+        for model in (Guest, FamilyMember, Invitation):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+    counters.rebuild()
+    cohorts.invalidate()
+    return totals
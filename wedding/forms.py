@@ -1,4 +1,6 @@
 from django import forms
+from . import lookup
+from .catalog import get_catalog
 from .models import Guest
 
 
@@ -20,10 +22,9 @@ class RSVPCodeForm(forms.Form):
     
     def clean_rsvp_code(self):
         code = self.cleaned_data['rsvp_code'].upper().strip()
-        try:
-            guest = Guest.objects.get(rsvp_code=code)
-            self.guest = guest
-        except Guest.DoesNotExist:
+        # Resolved through the lookup cache; the guest row itself isn't needed
+        self.guest_id = lookup.resolve_code(code)
+        if self.guest_id is None:
             raise forms.ValidationError(
                 'Invalid RSVP code. Please check your invitation and try again.'
             )
@@ -41,13 +42,14 @@ class GuestRSVPForm(forms.Form):
     def __init__(self, guest, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.guest = guest
+        catalog = get_catalog()
         
         # Dynamically add fields based on which events the guest is invited to
         if guest.invited_mendhi:
             self.fields['rsvp_mendhi'] = forms.ChoiceField(
                 choices=self.RSVP_CHOICES,
                 widget=forms.RadioSelect(attrs={'class': 'rsvp-radio'}),
-                label='Mendhi - December 25, 2025',
+                label=catalog.label('mendhi', 'Mendhi - December 25, 2025'),
                 required=True,
                 initial=guest.rsvp_mendhi if guest.rsvp_mendhi != 'pending' else None
             )
@@ -68,7 +70,7 @@ class GuestRSVPForm(forms.Form):
             self.fields['rsvp_vidhi'] = forms.ChoiceField(
                 choices=self.RSVP_CHOICES,
                 widget=forms.RadioSelect(attrs={'class': 'rsvp-radio'}),
-                label='Vidhi - December 26, 2025',
+                label=catalog.label('vidhi', 'Vidhi - December 26, 2025'),
                 required=True,
                 initial=guest.rsvp_vidhi if guest.rsvp_vidhi != 'pending' else None
             )
@@ -89,7 +91,7 @@ class GuestRSVPForm(forms.Form):
             self.fields['rsvp_wedding'] = forms.ChoiceField(
                 choices=self.RSVP_CHOICES,
                 widget=forms.RadioSelect(attrs={'class': 'rsvp-radio'}),
-                label='Wedding Ceremony - December 27, 2025',
+                label=catalog.label('wedding', 'Wedding Ceremony - December 27, 2025'),
                 required=True,
                 initial=guest.rsvp_wedding if guest.rsvp_wedding != 'pending' else None
             )
@@ -110,7 +112,7 @@ class GuestRSVPForm(forms.Form):
             self.fields['rsvp_reception'] = forms.ChoiceField(
                 choices=self.RSVP_CHOICES,
                 widget=forms.RadioSelect(attrs={'class': 'rsvp-radio'}),
-                label='Reception - December 28, 2025',
+                label=catalog.label('reception', 'Reception - December 28, 2025'),
                 required=True,
                 initial=guest.rsvp_reception if guest.rsvp_reception != 'pending' else None
             )
@@ -218,7 +220,7 @@ class ForgotCodeForm(forms.Form):
         email = self.cleaned_data['email'].lower().strip()
         from .models import Guest
         try:
-            guest = Guest.objects.get(email__iexact=email)
+            guest = Guest.objects.with_email(email).get()
             self.guest = guest
         except Guest.DoesNotExist:
             raise forms.ValidationError(
@@ -227,5 +229,5 @@ class ForgotCodeForm(forms.Form):
             )
         except Guest.MultipleObjectsReturned:
             # If multiple guests have same email, get the first one
-            self.guest = Guest.objects.filter(email__iexact=email).first()
+            self.guest = Guest.objects.with_email(email).first()
         return email
@@ -0,0 +1,583 @@
+"""
+Guest CSV import helpers shared by the ``import_guests`` command.
+
+The batched engine preloads a normalized email/name index of existing
+guests once, routes each row into an insert or update batch, and writes
+every batch with ``bulk_create`` and a bulk update inside its own
+transaction - a handful of queries per batch instead of three per row.
+
+The COPY engine (PostgreSQL only) streams rows into a temporary staging
+table with ``COPY ... FROM STDIN`` and merges them into ``wedding_guest``
+with set-based SQL: matching and de-duplication happen server-side, followed
+by a single ``INSERT ... ON CONFLICT`` upsert. Missing RSVP codes are drawn
+in Python by ``CodeAllocator`` (``secrets``, like every other code) and
+written back to the staging table in one statement.
+
+``ResumableCsvReader`` reads the file in binary, tracking the byte offset of
+every record, so an import can checkpoint after each commit and later seek
+straight past the rows it already wrote.
+"""
+
+import codecs
+import csv
+import json
+import os
+from django.db import connection, transaction
+from django.utils import timezone
+from . import counters
+from .codes import CodeAllocator, bulk_update
+from .models import RSVP_CODE_ALPHABET, RSVP_CODE_LENGTH, Guest
+
+
+EVENT_SLUGS = ['mendhi', 'vidhi', 'wedding', 'reception']
+
+# Guest columns written by an import (and by --update on existing guests)
+IMPORT_FIELDS = [
+    'email', 'phone', 'party_name', 'max_guests',
+    'invited_mendhi', 'invited_vidhi', 'invited_wedding', 'invited_reception',
+]
+
+# When several existing guests share an email or name, every engine
+# matches the first of them in this order
+MATCH_ORDER = ['name', 'id']
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Rows per COPY/merge round when checkpointing the COPY engine
+COPY_BATCH_SIZE = 50000
+
+
+def parse_bool(value):
+    """Parse boolean value from CSV"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('true', 'yes', '1', 'y', 't')
+
+
+def parse_row(row):
+    """
+    Normalize one CSV row into Guest field values.
+
+    Raises ValueError if the row cannot be imported.
+    """
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('Name is required')
+
+    # Parse max_guests (default to 1)
+    try:
+        max_guests = int(row.get('max_guests', 1) or 1)
+    except ValueError:
+        max_guests = 1
+
+    # Optional pre-assigned code; blank means "generate one"
+    rsvp_code = (row.get('rsvp_code') or '').strip().upper() or None
+    if rsvp_code and (
+        len(rsvp_code) != RSVP_CODE_LENGTH or set(rsvp_code) - set(RSVP_CODE_ALPHABET)
+    ):
+        raise ValueError(f'Invalid RSVP code: {rsvp_code}')
+
+    data = {
+        'name': name,
+        'email': (row.get('email') or '').strip(),
+        'phone': (row.get('phone') or '').strip(),
+        'party_name': (row.get('party_name') or '').strip(),
+        'max_guests': max_guests,
+    }
+    for slug in EVENT_SLUGS:
+        data[f'invited_{slug}'] = parse_bool(row.get(f'invited_{slug}', 'False'))
+    data['rsvp_code'] = rsvp_code
+    return data
+
+
+class OffsetLines:
+    """Decoded lines of a binary file, tracking the byte offset consumed so far"""
+
+    def __init__(self, file, offset=0, encoding='utf-8'):
+        file.seek(offset)
+        self.file = file
+        self.offset = offset
+        self.encoding = encoding
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        start = self.offset
+        self.offset += len(line)
+        if start == 0 and line.startswith(codecs.BOM_UTF8):
+            line = line[len(codecs.BOM_UTF8):]
+        try:
+            return line.decode(self.encoding)
+        except UnicodeDecodeError as e:
+            raise csv.Error(f'Invalid {self.encoding} at byte {start + e.start}') from e
+
+
+class ResumableCsvReader:
+    """
+    ``csv.DictReader`` over a file opened in binary, resumable by offset.
+
+    Yields ``(row_num, row)`` with the same numbering as the line-based
+    reader (the header is row 1). ``position`` is the offset just past the
+    last record yielded; pass a saved position back in to continue there.
+    Memory use is one record at a time, whatever the file size.
+    """
+
+    def __init__(self, path, offset=None, row_num=1):
+        self.file = open(path, 'rb')
+        header_lines = OffsetLines(self.file)
+        self.fieldnames = next(csv.reader(header_lines), None)
+        if self.fieldnames is None:
+            self.file.close()
+            raise csv.Error('CSV file is empty')
+        if offset is None:
+            offset = header_lines.offset
+        self.lines = OffsetLines(self.file, offset)
+        self.row_num = row_num
+        self._reader = csv.reader(self.lines)
+
+    @classmethod
+    def resume(cls, path, state):
+        if os.path.getsize(path) < state['offset']:
+            raise csv.Error('CSV file is shorter than the checkpoint offset')
+        reader = cls(path, state['offset'], state['row_num'])
+        if reader.fieldnames != state['fieldnames']:
+            reader.close()
+            raise csv.Error('CSV header changed since the checkpoint was written')
+        return reader
+
+    @property
+    def position(self):
+        return {'offset': self.lines.offset, 'row_num': self.row_num, 'fieldnames': self.fieldnames}
+
+    def __iter__(self):
+        for values in self._reader:
+            if not values:
+                continue  # blank line, skipped like DictReader does
+            self.row_num += 1
+            yield self.row_num, dict(zip(self.fieldnames, values))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ImportCheckpoint:
+    """JSON sidecar recording how far an import has committed"""
+
+    def __init__(self, csv_path):
+        self.path = f'{csv_path}.checkpoint'
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RejectWriter:
+    """
+    Streams rejected rows, with their row number and error, to a CSV file.
+
+    Opened lazily on the first reject. ``size`` is recorded in checkpoints;
+    resuming truncates back to it, so rows rejected after the last commit
+    are not written twice.
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = ['row', 'error'] + fieldnames
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def reset(self, resume_size=None):
+        """Drop output from an earlier run, or truncate to a checkpointed size"""
+        if not os.path.exists(self.path):
+            return
+        if resume_size is None:
+            os.remove(self.path)
+        else:
+            os.truncate(self.path, resume_size)
+
+    def write(self, row_num, row, error):
+        if self._file is None:
+            self._file = open(self.path, 'a', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, self.fieldnames, extrasaction='ignore')
+            if not self._file.tell():
+                self._writer.writeheader()
+        self._writer.writerow({**row, 'row': row_num, 'error': error})
+        self.count += 1
+
+    @property
+    def size(self):
+        if self._file is not None:
+            self._file.flush()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class GuestIndex:
+    """
+    In-memory lookup of guests by lower-cased email and name.
+
+    Mirrors the command's matching rule (email first, then name) without
+    a query per row. Newly routed guests are added as they are seen, so
+    duplicates within one file match each other too.
+    """
+
+    def __init__(self):
+        self.by_email = {}
+        self.by_name = {}
+        self.codes = set()
+        # Allocates against the preloaded codes: no queries per new guest
+        self.allocator = CodeAllocator(taken=self.codes)
+
+    @classmethod
+    def load(cls):
+        index = cls()
+        rows = Guest.objects.order_by(*MATCH_ORDER).values_list('pk', 'email', 'name', 'rsvp_code')
+        for pk, email, name, code in rows.iterator(chunk_size=5000):
+            index.add(pk, email, name)
+            index.codes.add(code)
+        return index
+
+    def add(self, pk, email, name):
+        # setdefault keeps the first match in load()'s MATCH_ORDER
+        if email:
+            self.by_email.setdefault(email.lower(), pk)
+        self.by_name.setdefault(name.lower(), pk)
+
+    def match(self, email, name):
+        pk = None
+        if email:
+            pk = self.by_email.get(email.lower())
+        if pk is None:
+            pk = self.by_name.get(name.lower())
+        return pk
+
+    def claim_code(self, code):
+        """Reserve a pre-assigned code; raises ValueError if it is taken"""
+        if code in self.codes:
+            raise ValueError(f'RSVP code already in use: {code}')
+        self.codes.add(code)
+        return code
+
+    def unused_code(self):
+        """A fresh RSVP code not held by any known guest"""
+        return self.allocator.allocate_one()
+
+
+class BatchImporter:
+    """Routes parsed rows into insert/update batches and flushes them"""
+
+    def __init__(self, update_existing=False, batch_size=DEFAULT_BATCH_SIZE, index=None):
+        self.update_existing = update_existing
+        self.batch_size = batch_size
+        self.index = index if index is not None else GuestIndex.load()
+        self.to_create = {}
+        self.to_update = {}
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+
+    @property
+    def pending(self):
+        return len(self.to_create) + len(self.to_update)
+
+    def add(self, data):
+        """
+        Route one parsed row; returns 'created', 'updated' or 'skipped'.
+
+        Raises ValueError if a pre-assigned RSVP code is already taken.
+        """
+        data = dict(data)
+        code = data.pop('rsvp_code', None)
+        pk = self.index.match(data['email'], data['name'])
+
+        if pk is None:
+            code = self.index.claim_code(code) if code else self.index.unused_code()
+            guest = Guest(rsvp_code=code, **data)
+            self.to_create[guest.pk] = guest
+            self.index.add(guest.pk, guest.email, guest.name)
+            self.created += 1
+            result = 'created'
+        elif not self.update_existing:
+            self.skipped += 1
+            result = 'skipped'
+        else:
+            # A row matching a guest still waiting in this batch updates it in place
+            guest = self.to_create.get(pk) or self.to_update.get(pk)
+            if guest is None:
+                guest = Guest(pk=pk, name=data['name'])
+                self.to_update[pk] = guest
+            for field in IMPORT_FIELDS:
+                setattr(guest, field, data[field])
+            self.updated += 1
+            result = 'updated'
+
+        if self.pending >= self.batch_size:
+            self.flush()
+        return result
+
+    def flush(self):
+        """Write the current batches in one transaction"""
+        if not self.pending:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            if self.to_create:
+                Guest.objects.bulk_create(self.to_create.values(), batch_size=self.batch_size)
+                counters.family_added(len(self.to_create))
+            if self.to_update:
+                for guest in self.to_update.values():
+                    guest.updated_at = now
+                bulk_update(self.to_update.values(), IMPORT_FIELDS + ['updated_at'])
+        self.to_create = {}
+        self.to_update = {}
+
+
+STAGING_TABLE = 'wedding_guest_import_staging'
+
+STAGING_COLUMNS = ['row_num', 'name', 'rsvp_code'] + IMPORT_FIELDS
+
+
+def copy_supported():
+    return connection.vendor == 'postgresql'
+
+
+def copy_import(rows, update_existing=False):
+    """
+    Import ``(row_num, data)`` pairs through COPY and one set-based upsert.
+
+    Follows the batched engine's rules: match existing guests by email,
+    then name (case-insensitive); later rows in the file match earlier
+    ones; matched guests are updated only with ``update_existing``.
+    Returns ``(created, updated, skipped, rejects)`` where ``rejects`` is a
+    list of ``(row_num, message)``. Runs in one transaction; PostgreSQL
+    (psycopg 3) only.
+    """
+    quote = connection.ops.quote_name
+    guest_table = quote(Guest._meta.db_table)
+    total = 0
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                row_num integer PRIMARY KEY,
+                name text NOT NULL,
+                rsvp_code text,
+                email text NOT NULL,
+                phone text NOT NULL,
+                party_name text NOT NULL,
+                max_guests integer NOT NULL,
+                invited_mendhi boolean NOT NULL,
+                invited_vidhi boolean NOT NULL,
+                invited_wedding boolean NOT NULL,
+                invited_reception boolean NOT NULL,
+                guest_id uuid,
+                is_new boolean NOT NULL DEFAULT false,
+                is_head boolean NOT NULL DEFAULT false
+            ) ON COMMIT DROP
+        """)
+
+        copy_sql = f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN"
+        with cursor.cursor.copy(copy_sql) as copy:
+            for row_num, data in rows:
+                copy.write_row([row_num] + [data[column] for column in STAGING_COLUMNS[1:]])
+                total += 1
+        cursor.execute(f"ANALYZE {STAGING_TABLE}")
+
+        # Match existing guests: email first, then name (first in MATCH_ORDER)
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET guest_id = m.id
+            FROM (
+                SELECT DISTINCT ON (lower(email)) lower(email) AS key, id
+                FROM {guest_table} WHERE email <> ''
+                ORDER BY lower(email), name, id
+            ) m
+            WHERE s.email <> '' AND lower(s.email) = m.key
+        """)
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET guest_id = m.id
+            FROM (
+                SELECT DISTINCT ON (lower(name)) lower(name) AS key, id
+                FROM {guest_table}
+                ORDER BY lower(name), name, id
+            ) m
+            WHERE s.guest_id IS NULL AND lower(s.name) = m.key
+        """)
+
+        # Unmatched rows are new guests; rows repeating an earlier new
+        # guest's email (or name) within the file collapse onto it
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} SET guest_id = gen_random_uuid(), is_new = true
+            WHERE guest_id IS NULL
+        """)
+        collapse_by_email = f"""
+            UPDATE {STAGING_TABLE} s SET guest_id = f.guest_id
+            FROM (
+                SELECT DISTINCT ON (lower(email)) lower(email) AS key, guest_id
+                FROM {STAGING_TABLE} WHERE is_new AND email <> ''
+                ORDER BY lower(email), row_num
+            ) f
+            WHERE s.is_new AND s.email <> '' AND lower(s.email) = f.key
+              AND s.guest_id <> f.guest_id
+        """
+        cursor.execute(collapse_by_email)
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET guest_id = f.guest_id
+            FROM (
+                SELECT DISTINCT ON (lower(name)) lower(name) AS key, guest_id
+                FROM {STAGING_TABLE} WHERE is_new
+                ORDER BY lower(name), row_num
+            ) f
+            WHERE s.is_new AND lower(s.name) = f.key AND s.guest_id <> f.guest_id
+        """)
+        cursor.execute(collapse_by_email)
+
+        # The first row of each new guest creates it
+        cursor.execute(f"""
+            UPDATE {STAGING_TABLE} s SET is_head = true
+            FROM (
+                SELECT DISTINCT ON (guest_id) row_num FROM {STAGING_TABLE}
+                WHERE is_new ORDER BY guest_id, row_num
+            ) h
+            WHERE s.row_num = h.row_num
+        """)
+
+        # Pre-assigned codes that are already taken are rejected
+        cursor.execute(f"""
+            DELETE FROM {STAGING_TABLE} s
+            USING (
+                SELECT row_num FROM (
+                    SELECT row_num, row_number() OVER (PARTITION BY rsvp_code ORDER BY row_num) AS n
+                    FROM {STAGING_TABLE} WHERE is_head AND rsvp_code IS NOT NULL
+                ) d WHERE d.n > 1
+                UNION
+                SELECT t.row_num FROM {STAGING_TABLE} t
+                JOIN {guest_table} g ON g.rsvp_code = t.rsvp_code
+                WHERE t.is_head
+            ) taken
+            WHERE s.row_num = taken.row_num
+            RETURNING s.row_num, s.rsvp_code
+        """)
+        rejects = [
+            (row_num, f'RSVP code already in use: {code}')
+            for row_num, code in sorted(cursor.fetchall())
+        ]
+        if rejects:
+            # Later rows of a rejected guest have nothing to update
+            cursor.execute(f"""
+                DELETE FROM {STAGING_TABLE} s
+                WHERE s.is_new AND NOT EXISTS (
+                    SELECT 1 FROM {STAGING_TABLE} h WHERE h.is_head AND h.guest_id = s.guest_id
+                )
+            """)
+
+        # Codes are bearer credentials: draw the missing ones with secrets
+        # (PostgreSQL's random() is not cryptographically secure), unique
+        # against existing guests and the codes pre-assigned in this file
+        cursor.execute(f"""
+            SELECT row_num, rsvp_code FROM {STAGING_TABLE} WHERE is_head ORDER BY row_num
+        """)
+        heads = cursor.fetchall()
+        allocator = CodeAllocator()
+        allocator.reserve(code for _, code in heads if code is not None)
+        missing = [row_num for row_num, code in heads if code is None]
+        if missing:
+            cursor.execute(f"""
+                UPDATE {STAGING_TABLE} s SET rsvp_code = c.code
+                FROM unnest(%s::integer[], %s::text[]) AS c(row_num, code)
+                WHERE s.row_num = c.row_num
+            """, [missing, allocator.allocate(len(missing))])
+
+        # Refresh planner statistics after the rewrites above so the merge
+        # hash-joins instead of nested-looping over stale estimates
+        cursor.execute(f"ANALYZE {STAGING_TABLE}")
+        created, updated, skipped = _merge_staging(cursor, guest_table, update_existing)
+        counters.family_added(created)
+
+    # Later rows of a guest rejected above count as skipped
+    skipped += total - len(rejects) - (created + updated + skipped)
+    return created, updated, skipped, rejects
+
+
+def _merge_staging(cursor, guest_table, update_existing):
+    """Upsert the staged guests; returns (created, updated, skipped) row counts"""
+    quote = connection.ops.quote_name
+    now = timezone.now()
+
+    # Name and code come from a new guest's first row; the other columns
+    # from its last row when updating (later rows win), else its first row
+    value_order = 'DESC' if update_existing else 'ASC'
+    # (existing guests keep theirs; the upsert never overwrites them)
+    staged = {
+        'id': 'v.guest_id',
+        'name': 'COALESCE(h.name, g.name)',
+        'rsvp_code': 'COALESCE(h.rsvp_code, g.rsvp_code)',
+    }
+    staged.update({field: f'v.{field}' for field in IMPORT_FIELDS})
+
+    columns, values, params = [], [], []
+    for field in Guest._meta.concrete_fields:
+        columns.append(quote(field.column))
+        if field.name in staged:
+            values.append(staged[field.name])
+        elif field.name in ('created_at', 'updated_at'):
+            values.append('%s')
+            params.append(field.get_db_prep_save(now, connection))
+        else:
+            values.append('%s')
+            params.append(field.get_db_prep_save(field.get_default(), connection))
+
+    updates = ', '.join(
+        f'{quote(field)} = EXCLUDED.{quote(field)}' for field in IMPORT_FIELDS + ['updated_at']
+    )
+    conflict = f'DO UPDATE SET {updates}' if update_existing else 'DO NOTHING'
+    applies = 'true' if update_existing else 'v.is_new'
+
+    cursor.execute(f"""
+        INSERT INTO {guest_table} ({', '.join(columns)})
+        SELECT {', '.join(values)}
+        FROM (
+            SELECT DISTINCT ON (guest_id) * FROM {STAGING_TABLE}
+            ORDER BY guest_id, row_num {value_order}
+        ) v
+        LEFT JOIN {STAGING_TABLE} h ON h.guest_id = v.guest_id AND h.is_head
+        LEFT JOIN {guest_table} g ON g.id = v.guest_id
+        WHERE {applies}
+        ON CONFLICT (id) {conflict}
+        RETURNING (xmax = 0) AS inserted
+    """, params)
+    results = [inserted for (inserted,) in cursor.fetchall()]
+    created = sum(results)
+
+    cursor.execute(f"SELECT count(*) FROM {STAGING_TABLE}")
+    (staged_rows,) = cursor.fetchone()
+    if update_existing:
+        return created, staged_rows - created, 0
+    return created, 0, staged_rows - created
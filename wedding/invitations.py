@@ -0,0 +1,221 @@
+"""
+Bulk invitation emails.
+
+``queue_invitations`` adds one ``invitation`` row per guest to the outbox,
+keyed ``invitation:<guest id>:<rsvp code>``, so running it again never
+queues a guest twice for the same code. A guest whose code is regenerated
+can be invited again, and their still-queued invitation with the old code
+is dropped. ``send_queued`` then drains the selected guests' rows, and
+only those, with several threads. Each thread holds one mail connection
+open for the whole run, and a shared token bucket caps the overall send
+rate. Send state lives in the outbox rows, so an interrupted run resumes
+with whatever is still pending, and anything left for retry is also
+picked up by ``run_mail_worker``.
+"""
+
+import queue
+import threading
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Prefetch, Q, Value
+from django.db.models.functions import Concat
+from django.urls import reverse
+from django.utils.formats import date_format
+from .catalog import get_catalog
+from .models import FamilyMember, Guest, OutboundEmail, WeddingInfo
+from .outbox import EmailTemplates, MailWorker, RateLimiter
+from .stats import EVENT_SLUGS
+
+
+TEMPLATE = 'invitation'
+
+CONCURRENCY = getattr(settings, 'INVITATION_CONCURRENCY', 4)
+
+# Messages per second across all threads (0 = unlimited)
+RATE_LIMIT = getattr(settings, 'INVITATION_RATE_LIMIT', 10)
+
+# Messages claimed per thread at a time; at most this many per thread can
+# be sent twice if the process is killed outright mid-batch
+SEND_BATCH_SIZE = 20
+
+# Outbox rows handed to a thread at a time; claims are filtered on these
+# primary keys rather than re-running the guest selection
+SEND_CHUNK_SIZE = 500
+
+QUEUE_BATCH_SIZE = 1000
+
+
+def site_url(path):
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def rsvp_link(rsvp_code):
+    """Absolute link to a guest's private RSVP page"""
+    return site_url(reverse('wedding:rsvp_form', args=[rsvp_code]))
+
+
+def dedupe_key(guest):
+    return f'{TEMPLATE}:{guest.pk}:{guest.rsvp_code}'
+
+
+# Rows keyed with the guest's current RSVP code
+CURRENT_CODE = Q(dedupe_key__endswith=Concat(Value(':'), F('guest__rsvp_code')))
+
+
+def select_guests(pending=False, event=None, codes=None):
+    """Guests with an email, optionally narrowed to pending/an event/codes"""
+    guests = Guest.objects.exclude(email='')
+    if pending:
+        guests = guests.filter(has_responded=False)
+    if event:
+        guests = guests.invited_to(event)
+    if codes:
+        guests = guests.filter(rsvp_code__in=[code.strip().upper() for code in codes])
+    return guests.order_by('name')
+
+
+def couple_names():
+    info = WeddingInfo.objects.first()
+    if info:
+        return f"{info.partner1_name} & {info.partner2_name}"
+    return "Prit & Khushboo"
+
+
+def invitation_context(guest, couple, catalog):
+    """JSON-serializable template context for one family's invitation"""
+    events = []
+    for slug in EVENT_SLUGS:
+        invited = getattr(guest, f'invited_{slug}') or any(
+            getattr(member, f'invited_{slug}') for member in guest.members.all()
+        )
+        details = catalog.details(slug)
+        if invited and details:
+            event_date = details['date']
+            if not isinstance(event_date, str):
+                event_date = date_format(event_date, 'F j, Y')
+            events.append({
+                'name': details['name'],
+                'date': event_date,
+                'time': details['time'],
+                'venue_name': details['venue_name'],
+            })
+    return {
+        'guest_name': guest.party_name or guest.name,
+        'couple_names': couple,
+        'rsvp_code': guest.rsvp_code,
+        'rsvp_link': rsvp_link(guest.rsvp_code),
+        'events': events,
+    }
+
+
+def _with_members(guests):
+    invited_fields = [f'invited_{slug}' for slug in EVENT_SLUGS]
+    members = FamilyMember.objects.only('family_id', *invited_fields)
+    return guests.prefetch_related(Prefetch('members', queryset=members))
+
+
+def build_invitations(guests):
+    """Unsaved outbox rows for these guests"""
+    couple = couple_names()
+    catalog = get_catalog()
+    return [
+        OutboundEmail(
+            template=TEMPLATE,
+            to_email=guest.email,
+            guest=guest,
+            context=invitation_context(guest, couple, catalog),
+            dedupe_key=dedupe_key(guest),
+        )
+        for guest in _with_members(guests).iterator(chunk_size=QUEUE_BATCH_SIZE)
+    ]
+
+
+def invitations_for(guests):
+    """The guests' invitation rows for their current RSVP codes"""
+    return OutboundEmail.objects.filter(
+        CURRENT_CODE, template=TEMPLATE, guest__in=guests.order_by().values('pk'),
+    )
+
+
+def drop_superseded(guests):
+    """Delete queued invitations with a superseded code; returns how many"""
+    dropped, _ = OutboundEmail.objects.filter(
+        template=TEMPLATE, status=OutboundEmail.PENDING, guest__in=guests.order_by().values('pk'),
+    ).exclude(CURRENT_CODE).delete()
+    return dropped
+
+
+def queue_invitations(guests):
+    """Queue invitations for guests not yet queued; returns the number added"""
+    drop_superseded(guests)
+    before = invitations_for(guests).count()
+    OutboundEmail.objects.bulk_create(
+        build_invitations(guests), batch_size=QUEUE_BATCH_SIZE, ignore_conflicts=True,
+    )
+    return invitations_for(guests).count() - before
+
+
+def send_queued(rows, concurrency=CONCURRENCY, rate=RATE_LIMIT, batch_size=SEND_BATCH_SIZE, progress=None):
+    """
+    Send the due invitations among outbox ``rows`` (``invitations_for``
+    the selected guests) with ``concurrency`` threads; other queued
+    invitations are left to later runs or ``run_mail_worker``.
+
+    Returns totals of sent/retried/failed/deferred messages. ``progress``
+    is called with the running totals after each batch. On Ctrl+C each
+    thread finishes its current batch, then KeyboardInterrupt is re-raised.
+    """
+    totals = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+    totals_lock = threading.Lock()
+    stop = threading.Event()
+    templates = EmailTemplates()
+    rate_limiter = RateLimiter(rate) if rate else None
+    pks = list(rows.filter(
+        status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING],
+    ).order_by('pk').values_list('pk', flat=True))
+    chunks = queue.SimpleQueue()
+    for start in range(0, len(pks), SEND_CHUNK_SIZE):
+        chunks.put(pks[start:start + SEND_CHUNK_SIZE])
+
+    def run():
+        worker = MailWorker(
+            batch_size=batch_size,
+            templates=templates,
+            rate_limiter=rate_limiter,
+            keep_alive=True,
+        )
+        try:
+            while not stop.is_set() and not worker.breaker.is_open:
+                try:
+                    chunk = chunks.get_nowait()
+                except queue.Empty:
+                    break
+                worker.queryset = OutboundEmail.objects.filter(pk__in=chunk)
+                while not stop.is_set():
+                    stats = worker.run_once()
+                    with totals_lock:
+                        for key, value in stats.items():
+                            totals[key] += value
+                        if progress is not None and any(stats.values()):
+                            progress(dict(totals))
+                    if stats['sent'] or stats['retried'] or stats['failed']:
+                        continue
+                    if worker.breaker.is_open or not stats['deferred']:
+                        # Chunk done, or the server is unreachable: what's left stays queued
+                        break
+        finally:
+            worker.close()
+            connection.close()
+
+    threads = [threading.Thread(target=run, name=f'invitations-{n}') for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        raise
+    return totals
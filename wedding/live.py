@@ -0,0 +1,172 @@
+"""
+Live RSVP change feed for the staff dashboard (Server-Sent Events).
+
+A single ``ChangeFeed`` per process fans every change out to all
+connected dashboards through a broker. The default ``LocalBroker`` is a
+purely in-process pub/sub, so no external service is needed; set
+``LIVE_FEED_BROKER`` to a dotted path to plug in something else with the
+same ``subscribe``/``unsubscribe``/``publish`` interface.
+
+Events pushed to subscribers:
+
+* ``counters`` - the RSVP counters whenever they change. One shared poller
+  reads the six ``RsvpCounters`` rows while anyone is listening, so writes
+  made by other processes (WSGI workers, admin, imports) show up too,
+  without each open dashboard querying the database.
+* ``rsvp`` - a family submitted their RSVP in this process.
+
+The stream endpoint must be served by ``wedding_project.asgi``; under WSGI
+it degrades to a single snapshot and asks the browser to reconnect later.
+"""
+
+import asyncio
+import json
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+from . import counters
+
+
+# Seconds between counter polls while at least one dashboard is connected
+POLL_INTERVAL = getattr(settings, 'LIVE_FEED_POLL_INTERVAL', 5)
+
+# Seconds of silence before a keep-alive comment is sent
+KEEPALIVE_INTERVAL = 15
+
+# Messages buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Reconnect delay (ms) suggested to browsers when streaming is unavailable
+FALLBACK_RETRY_MS = 30000
+
+
+def read_stats():
+    """
+    counters.read_stats for the event loop. A stream or the poller can run
+    for hours, so the connection is handed back after each read rather than
+    at the end of the request.
+    """
+    try:
+        return counters.read_stats()
+    finally:
+        close_old_connections()
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class LocalBroker:
+    """In-process pub/sub; publish() may be called from any thread"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a queue bound to the running event loop"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = {sub for sub in self._subscribers if sub[1] is not queue}
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, message)
+            except RuntimeError:
+                # Loop already closed; the subscriber is going away
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _put(queue, message):
+        if queue.full():
+            # Slow consumer: drop the oldest message rather than block others
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+class ChangeFeed:
+    """Shared source of dashboard events, fanned out through the broker"""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._poller = None
+        self._wakeup = None
+        self._last_stats = None
+
+    def publish(self, event, data):
+        self.broker.publish(format_sse(event, data))
+
+    def publish_rsvp(self, family):
+        """Announce a submitted RSVP; call after the transaction commits"""
+        if not self.broker.subscriber_count:
+            return
+        self.publish('rsvp', {
+            'party_name': family.party_name,
+            'name': family.name,
+            'rsvp_code': family.rsvp_code,
+            'rsvp_submitted_at': family.rsvp_submitted_at,
+        })
+        self.poke()
+
+    def poke(self):
+        """Ask the poller to re-read the counters now instead of waiting"""
+        poller, wakeup = self._poller, self._wakeup
+        if poller is not None and not poller.done():
+            poller.get_loop().call_soon_threadsafe(wakeup.set)
+
+    async def _poll(self):
+        while self.broker.subscriber_count:
+            stats = await sync_to_async(read_stats)()
+            if stats != self._last_stats:
+                self._last_stats = stats
+                self.publish('counters', stats)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        self._last_stats = None
+
+    def _ensure_poller(self, stats):
+        if self._poller is None or self._poller.done():
+            self._last_stats = stats
+            self._wakeup = asyncio.Event()
+            self._poller = asyncio.ensure_future(self._poll())
+
+    async def stream(self):
+        """Async iterator of SSE messages for one connected dashboard"""
+        queue = self.broker.subscribe()
+        try:
+            # Every new subscriber starts from the current counters
+            stats = await sync_to_async(read_stats)()
+            self._ensure_poller(stats)
+            yield format_sse('counters', stats)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.broker.unsubscribe(queue)
+
+    def snapshot(self):
+        """One-shot response body for servers that cannot stream (WSGI)"""
+        return f"retry: {FALLBACK_RETRY_MS}\n" + format_sse('counters', counters.read_stats())
+
+
+feed = ChangeFeed(import_string(getattr(settings, 'LIVE_FEED_BROKER', 'wedding.live.LocalBroker'))())
@@ -0,0 +1,320 @@
+"""
+HTTP load driver for the RSVP site.
+
+``run()`` replays a weighted mix of visitor journeys (code lookups, RSVP
+form views and submissions, dashboard polling, CSV exports) from
+``concurrency`` threads for a fixed time or number of journeys, timing
+every request by URL name. ``serve()`` runs the app in-process on a
+threaded WSGI server, so a run needs nothing but a database. That server
+shares one process (and its GIL) with the visitors, which suits
+comparing two versions of the code; point the driver at a running
+gunicorn for numbers that predict the deployment.
+
+Each journey is a new visitor with its own cookies: form pages are
+fetched before posting, so the CSRF cookie and token are real. Staff
+journeys reuse a session logged in as an existing staff user.
+"""
+
+import http.client
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.test import Client
+from django.urls import reverse
+from .models import FamilyMember, Guest
+from .stats import EVENT_SLUGS
+
+
+PERCENTILES = (50, 95, 99)
+
+# Journeys per mix: name -> weight
+MIXES = {
+    # The hour after invitations go out: guests looking up codes and answering
+    'invitations': {
+        'home': 20, 'lookup': 25, 'rsvp': 25, 'submit': 15,
+        'poll': 12, 'dashboard': 2, 'export': 1,
+    },
+    # The couple and helpers watching responses come in
+    'dashboard': {'poll': 70, 'dashboard': 25, 'export': 5},
+}
+
+# Answers picked by submitting visitors
+ANSWERS = ['attending'] * 4 + ['not_attending']
+
+# Rendered by rsvp_form.html when a submission could not be saved (status 200)
+RSVP_ERROR_MARKER = b'class="rsvp-error"'
+
+
+class Recorder:
+    """Thread-safe request log: label -> [(status, seconds, failed)]"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, label, status, seconds, failed):
+        with self._lock:
+            self.samples.setdefault(label, []).append((status, seconds, failed))
+
+
+class Visitor:
+    """One browser: a cookie jar, requests timed into the recorder"""
+
+    def __init__(self, target, recorder, cookies=None, timeout=30):
+        parts = urlsplit(target)
+        self.target = target.rstrip('/')
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.recorder = recorder
+        self.cookies = dict(cookies or {})
+        self.timeout = timeout
+
+    def request(self, label, method, path, form=None, error_marker=None):
+        """
+        Send one request (redirects are not followed); returns the status,
+        0 if there was no response. It counts as failed with no response, a
+        4xx/5xx status, or a body containing ``error_marker``.
+        """
+        headers = {}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        body = None
+        if form is not None:
+            form = dict(form, csrfmiddlewaretoken=self.cookies.get(settings.CSRF_COOKIE_NAME, ''))
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Referer'] = self.target + path
+
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        started = time.perf_counter()
+        content = b''
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+            status = response.status
+            for header in response.headers.get_all('Set-Cookie') or []:
+                for name, morsel in SimpleCookie(header).items():
+                    self.cookies[name] = morsel.value
+        except (OSError, http.client.HTTPException):
+            status = 0
+        finally:
+            connection.close()
+        elapsed = time.perf_counter() - started
+        failed = status == 0 or status >= 400 or bool(error_marker and error_marker in content)
+        self.recorder.add(f'{label} {method}', status, elapsed, failed)
+        return status
+
+
+class Workload:
+    """Families to visit, with the events each member can answer, and a staff session"""
+
+    def __init__(self, families, staff_cookies=None):
+        self.families = families  # rsvp_code -> [(member_id, [event, ...])]
+        self.codes = list(families)
+        self.staff_cookies = staff_cookies
+
+    @classmethod
+    def load(cls, sample=500, seed=0, staff=None):
+        """Sample up to ``sample`` families; ``staff`` is a staff User for dashboard journeys"""
+        codes = list(Guest.objects.order_by('rsvp_code').values_list('rsvp_code', flat=True))
+        codes = random.Random(seed).sample(codes, min(sample, len(codes)))
+        families = {code: [] for code in codes}
+        rows = FamilyMember.objects.filter(family__rsvp_code__in=codes).order_by('order', 'name').values_list(
+            'id', 'family__rsvp_code', *[f'invited_{slug}' for slug in EVENT_SLUGS],
+        )
+        for member_id, code, *invited in rows:
+            families[code].append((member_id, [slug for slug, yes in zip(EVENT_SLUGS, invited) if yes]))
+
+        staff_cookies = None
+        if staff is not None:
+            client = Client()
+            client.force_login(staff)
+            staff_cookies = {name: morsel.value for name, morsel in client.cookies.items()}
+        return cls(families, staff_cookies)
+
+
+def journey_home(visitor, workload, rng):
+    visitor.request('home', 'GET', reverse('wedding:home'))
+
+
+def journey_lookup(visitor, workload, rng):
+    path = reverse('wedding:rsvp_lookup')
+    if visitor.request('rsvp_lookup', 'GET', path) == 200:
+        visitor.request('rsvp_lookup', 'POST', path, {'rsvp_code': rng.choice(workload.codes)})
+
+
+def journey_rsvp(visitor, workload, rng):
+    visitor.request('rsvp_form', 'GET', reverse('wedding:rsvp_form', args=[rng.choice(workload.codes)]))
+
+
+def journey_submit(visitor, workload, rng):
+    code = rng.choice(workload.codes)
+    path = reverse('wedding:rsvp_form', args=[code])
+    if visitor.request('rsvp_form', 'GET', path) != 200:
+        return
+    form = {'message': ''}
+    for member_id, events in workload.families[code]:
+        for slug in events:
+            form[f'rsvp_{slug}_{member_id}'] = rng.choice(ANSWERS)
+    visitor.request('rsvp_form', 'POST', path, form, error_marker=RSVP_ERROR_MARKER)
+
+
+def journey_poll(visitor, workload, rng):
+    visitor.request('api_dashboard_stats', 'GET', reverse('wedding:api_dashboard_stats'))
+
+
+def journey_dashboard(visitor, workload, rng):
+    visitor.request('admin_dashboard', 'GET', reverse('wedding:admin_dashboard'))
+
+
+def journey_export(visitor, workload, rng):
+    visitor.request('export_guests_csv', 'GET', reverse('wedding:export_guests_csv'))
+
+
+JOURNEYS = {
+    'home': journey_home,
+    'lookup': journey_lookup,
+    'rsvp': journey_rsvp,
+    'submit': journey_submit,
+    'poll': journey_poll,
+    'dashboard': journey_dashboard,
+    'export': journey_export,
+}
+
+STAFF_JOURNEYS = {'poll', 'dashboard', 'export'}
+
+# Journeys that change data (RSVP answers)
+WRITING_JOURNEYS = {'submit'}
+
+
+def parse_mix(value):
+    """A MIXES name or ``journey=weight,...``; raises ValueError"""
+    if value in MIXES:
+        return dict(MIXES[value])
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in JOURNEYS:
+            raise ValueError(f"Unknown journey '{name}' (choose from {', '.join(JOURNEYS)})")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('The mix needs at least one journey with a positive weight')
+    return mix
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples, elapsed):
+    """Throughput, error count and latency percentiles (ms) of [(status, seconds, failed)]"""
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, failed in samples if failed),
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'max_ms': round(latencies[-1], 2) if latencies else None,
+        'statuses': statuses,
+    }
+    for p in PERCENTILES:
+        value = percentile(latencies, p)
+        summary[f'p{p}_ms'] = round(value, 2) if value is not None else None
+    return summary
+
+
+def run(target, workload, mix, concurrency=10, duration=None, journeys=None, seed=0, timeout=30):
+    """
+    Drive ``target`` with ``concurrency`` visitors until ``duration``
+    seconds pass or ``journeys`` journeys have started; returns the results dict.
+    """
+    if duration is None and journeys is None:
+        raise ValueError('Give a duration or a number of journeys')
+    if workload.staff_cookies is None and STAFF_JOURNEYS.intersection(name for name, w in mix.items() if w > 0):
+        raise ValueError('Dashboard journeys need a staff session')
+    if not workload.codes:
+        raise ValueError('No families to visit; generate some first')
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    lock = threading.Lock()
+    started_journeys = 0
+    deadline = None
+
+    def claim():
+        nonlocal started_journeys
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        if journeys is not None:
+            with lock:
+                if started_journeys >= journeys:
+                    return False
+                started_journeys += 1
+        return True
+
+    def worker(number):
+        rng = random.Random(f'{seed}-{number}')
+        while claim():
+            name = rng.choices(names, weights)[0]
+            cookies = workload.staff_cookies if name in STAFF_JOURNEYS else None
+            JOURNEYS[name](Visitor(target, recorder, cookies, timeout), workload, rng)
+
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(concurrency)]
+    started = time.perf_counter()
+    if duration is not None:
+        deadline = started + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    every = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        'target': target,
+        'concurrency': concurrency,
+        'mix': mix,
+        'seed': seed,
+        'elapsed_s': round(elapsed, 3),
+        'totals': summarize(every, elapsed),
+        'endpoints': {label: summarize(samples, elapsed) for label, samples in sorted(recorder.samples.items())},
+    }
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadTestServer(ThreadedWSGIServer):
+    # Django's default backlog of 10 drops connections under heavy concurrency
+    request_queue_size = 128
+
+
+@contextmanager
+def serve(host='127.0.0.1', port=0):
+    """Run the project's WSGI app on a background threaded server; yields its base URL"""
+    server = LoadTestServer((host, port), QuietRequestHandler)
+    server.set_app(get_internal_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,194 @@
+"""
+RSVP code resolution with an in-process LRU and negative caching.
+
+Codes resolve to guest ids through three tiers: a per-process LRU, an
+optional shared Django cache (``RSVP_LOOKUP_SHARED_CACHE``, a cache alias),
+then the database. Unknown codes are cached too, for a short
+``RSVP_LOOKUP_NEGATIVE_TTL``, so bots guessing codes stop costing a query
+per request.
+
+Positive entries are never trusted blindly: ``get_guest`` loads the guest
+by primary key and checks its code still matches, dropping stale entries
+(a code regenerated or a guest deleted by another process) on the spot.
+Signal handlers invalidate entries for saves and deletes made in this
+process; bulk writes call ``invalidate_guests``/``invalidate_codes``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from .models import Guest
+
+
+# Code -> guest id entries kept per process
+CACHE_SIZE = getattr(settings, 'RSVP_LOOKUP_CACHE_SIZE', 10000)
+
+# Seconds an unknown code stays cached as missing
+NEGATIVE_TTL = getattr(settings, 'RSVP_LOOKUP_NEGATIVE_TTL', 30)
+
+# Seconds a known code stays in the shared cache
+SHARED_TTL = getattr(settings, 'RSVP_LOOKUP_SHARED_TTL', 24 * 60 * 60)
+
+SHARED_CACHE = getattr(settings, 'RSVP_LOOKUP_SHARED_CACHE', None)
+
+SHARED_KEY_PREFIX = 'rsvp-code:'
+
+# Stored for unknown codes; guest ids are UUIDs, so this never collides
+MISSING = ''
+
+CODE_MAX_LENGTH = Guest._meta.get_field('rsvp_code').max_length
+
+
+def normalize(code):
+    return (code or '').strip().upper()
+
+
+class CodeCache:
+    """Thread-safe LRU of code -> guest id (or MISSING, with an expiry)"""
+
+    def __init__(self, maxsize=CACHE_SIZE, negative_ttl=NEGATIVE_TTL, shared_alias=SHARED_CACHE):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self.shared_alias = shared_alias
+        self._entries = OrderedDict()
+        self._by_guest = {}  # guest id -> codes cached for it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _get_local(self, code):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._discard(code)
+                return None
+            self._entries.move_to_end(code)
+            return value
+
+    def _set_local(self, code, value):
+        expires_at = time.monotonic() + self.negative_ttl if value == MISSING else None
+        with self._lock:
+            self._discard(code)
+            self._entries[code] = (value, expires_at)
+            if value != MISSING:
+                self._by_guest.setdefault(value, set()).add(code)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, code):
+        """Remove one entry; the caller holds the lock"""
+        entry = self._entries.pop(code, None)
+        if entry is not None and entry[0] != MISSING:
+            guest_codes = self._by_guest.get(entry[0])
+            if guest_codes is not None:
+                guest_codes.discard(code)
+                if not guest_codes:
+                    del self._by_guest[entry[0]]
+
+    def resolve(self, code):
+        """Guest id (as a string) for a normalized code, or None if unknown"""
+        value = self._get_local(code)
+        if value is None and self.shared is not None:
+            value = self.shared.get(SHARED_KEY_PREFIX + code)
+            if value is not None:
+                self._set_local(code, value)
+        if value is not None:
+            self.hits += 1
+            return value or None
+
+        self.misses += 1
+        pk = Guest.objects.filter(rsvp_code=code).values_list('pk', flat=True).first()
+        self.store(code, pk)
+        return str(pk) if pk else None
+
+    def store(self, code, pk):
+        value = str(pk) if pk else MISSING
+        self._set_local(code, value)
+        if self.shared is not None:
+            timeout = SHARED_TTL if value else self.negative_ttl
+            self.shared.set(SHARED_KEY_PREFIX + code, value, timeout)
+
+    def invalidate_codes(self, codes):
+        codes = [normalize(code) for code in codes if code]
+        with self._lock:
+            for code in codes:
+                self._discard(code)
+        if self.shared is not None and codes:
+            self.shared.delete_many([SHARED_KEY_PREFIX + code for code in codes])
+
+    def invalidate_guests(self, pks):
+        """Drop local entries pointing at these guests (whatever their code)"""
+        stale = []
+        with self._lock:
+            for pk in pks:
+                stale.extend(self._by_guest.get(str(pk), ()))
+            for code in stale:
+                self._discard(code)
+        if self.shared is not None and stale:
+            self.shared.delete_many([SHARED_KEY_PREFIX + code for code in stale])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_guest.clear()
+
+
+code_cache = CodeCache()
+
+
+def resolve_code(code):
+    """Guest id for an RSVP code, or None; usually served from memory"""
+    code = normalize(code)
+    if not code or len(code) > CODE_MAX_LENGTH:
+        return None
+    return code_cache.resolve(code)
+
+
+def get_guest(code, queryset=None):
+    """The Guest holding this RSVP code, or None"""
+    code = normalize(code)
+    pk = resolve_code(code)
+    if pk is None:
+        return None
+    if queryset is None:
+        queryset = Guest.objects.all()
+    guest = queryset.filter(pk=pk).first()
+    if guest is not None and guest.rsvp_code == code:
+        return guest
+
+    # Stale entry: the code moved or the guest is gone; ask the database
+    code_cache.invalidate_codes([code])
+    guest = queryset.filter(rsvp_code=code).first()
+    code_cache.store(code, guest.pk if guest else None)
+    return guest
+
+
+def get_guest_or_404(code, queryset=None):
+    guest = get_guest(code, queryset)
+    if guest is None:
+        raise Http404('No guest matches this RSVP code.')
+    return guest
+
+
+def remember(guest):
+    """Cache a guest's current code, replacing any older code it had"""
+    code_cache.invalidate_guests([guest.pk])
+    code_cache.store(normalize(guest.rsvp_code), guest.pk)
+
+
+def invalidate_codes(codes):
+    code_cache.invalidate_codes(codes)
+
+
+def invalidate_guests(pks):
+    code_cache.invalidate_guests(pks)
@@ -0,0 +1,51 @@
+"""
+Management command to check that the hot queries use their indexes.
+
+Usage:
+    python manage.py check_query_plans
+    python manage.py check_query_plans --verbose   # print every plan
+
+Runs EXPLAIN on each query in wedding.queryplans.HOT_QUERIES and exits
+with an error if any of them would scan a whole table, e.g. because a
+migration adding its index has not been applied.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wedding import queryplans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot lookup queries and fail if any falls back to a sequential scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Print the plan of every query, not only of failing ones',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Database alias to check (default: default)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = queryplans.check(using=options['database'])
+        except NotImplementedError as exc:
+            raise CommandError(str(exc))
+
+        failed = 0
+        for query, plan, problems in results:
+            if problems:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {query.name}: {'; '.join(problems)}"))
+            else:
+                self.stdout.write(f"ok   {query.name}")
+            if problems or options['verbose']:
+                for line in plan.splitlines():
+                    self.stdout.write(f"       {line}")
+
+        if failed:
+            raise CommandError(f'{failed} of {len(results)} hot queries are not indexed')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} hot queries use an index'))
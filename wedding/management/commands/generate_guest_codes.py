@@ -3,10 +3,13 @@ Management command to generate/export guest list with RSVP codes.
 
 Usage:
     python manage.py generate_guest_codes --output guests_with_codes.csv
+
+RSVP links are built from the SITE_URL setting.
 """
 
 import csv
 from django.core.management.base import BaseCommand
+from wedding.invitations import rsvp_link
 from wedding.models import Guest
 
 
@@ -35,7 +38,6 @@ class Command(BaseCommand):
             ])
             
             for guest in guests:
-                rsvp_link = f"https://yourwebsite.com/rsvp/{guest.rsvp_code}/"
                 writer.writerow([
                     guest.name,
                     guest.rsvp_code,
@@ -47,7 +49,7 @@ class Command(BaseCommand):
                     'Yes' if guest.invited_vidhi else 'No',
                     'Yes' if guest.invited_wedding else 'No',
                     'Yes' if guest.invited_reception else 'No',
-                    rsvp_link,
+                    rsvp_link(guest.rsvp_code),
                 ])
         
         self.stdout.write(self.style.SUCCESS(
@@ -3,23 +3,52 @@ Management command to import guests from a CSV file.
 
 Usage:
     python manage.py import_guests path/to/guests.csv
+    python manage.py import_guests path/to/guests.csv --bulk --batch-size 2000
+    python manage.py import_guests path/to/guests.csv --copy --update
+    python manage.py import_guests path/to/guests.csv --bulk --resume
 
 CSV Format:
     name,email,phone,party_name,max_guests,invited_mendhi,invited_vidhi,invited_wedding,invited_reception
-    
+
+    An optional rsvp_code column pre-assigns codes to new guests; blank
+    codes are generated.
+
 Example:
     "John Smith","john@email.com","555-1234","The Smith Family",4,True,True,True,True
     "Jane Doe","jane@email.com","555-5678","",2,False,False,True,True
+
+--bulk preloads an email/name index of existing guests once and writes
+rows with bulk_create/bulk_update, one transaction per batch. Use it for
+large lists; the default mode saves and reports row by row.
+
+--copy (PostgreSQL only) streams each batch into a temporary staging table
+with COPY and merges it with one set-based upsert; missing RSVP codes
+are drawn in Python with ``secrets``, as everywhere else. On other
+databases it falls back to --bulk.
+
+Checkpoints and rejects:
+    Every --batch-size rows the work so far is committed and the byte
+    offset reached is saved to <csv>.checkpoint. If the import stops
+    partway, --resume seeks straight to that offset. Rows that cannot be
+    imported are written to <csv>.rejects.csv (or --rejects) with their
+    row number and error. The checkpoint is removed once the file is done.
 """
 
 import csv
+import time
 from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, transaction
+from wedding import counters
+from wedding.importing import (
+    COPY_BATCH_SIZE, DEFAULT_BATCH_SIZE, MATCH_ORDER, BatchImporter, ImportCheckpoint,
+    RejectWriter, ResumableCsvReader, copy_import, copy_supported, parse_row,
+)
 from wedding.models import Guest
 
 
 class Command(BaseCommand):
     help = 'Import guests from a CSV file'
-    
+
     def add_arguments(self, parser):
         parser.add_argument('csv_file', type=str, help='Path to the CSV file')
         parser.add_argument(
@@ -32,115 +61,251 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be imported without actually importing',
         )
-    
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Batched mode: preload a lookup index and write with bulk_create/bulk_update',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='PostgreSQL: COPY into a staging table and merge with one upsert (falls back to --bulk)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help=(
+                f'Rows per commit and checkpoint (default {DEFAULT_BATCH_SIZE}, '
+                f'or {COPY_BATCH_SIZE} with --copy)'
+            ),
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted import from its checkpoint',
+        )
+        parser.add_argument(
+            '--rejects',
+            type=str,
+            default=None,
+            help='Where to write rejected rows (default <csv_file>.rejects.csv)',
+        )
+
     def handle(self, *args, **options):
         csv_file = options['csv_file']
-        update_existing = options['update']
-        dry_run = options['dry_run']
-        
+        self.update_existing = options['update']
+        self.dry_run = options['dry_run']
+
+        mode = 'rows'
+        if not self.dry_run and (options['bulk'] or options['copy']):
+            mode = 'bulk'
+            if options['copy']:
+                if copy_supported():
+                    mode = 'copy'
+                else:
+                    self.stdout.write(self.style.WARNING("--copy needs PostgreSQL; using --bulk instead"))
+        self.batch_size = options['batch_size'] or (
+            COPY_BATCH_SIZE if mode == 'copy' else DEFAULT_BATCH_SIZE
+        )
+
+        self.checkpoint = ImportCheckpoint(csv_file)
+        state = None
+        if options['resume']:
+            if self.dry_run:
+                raise CommandError('--resume cannot be combined with --dry-run')
+            state = self.checkpoint.load()
+            if state is None:
+                raise CommandError(f'No checkpoint found for {csv_file}; nothing to resume')
+
+        counts = state['counts'] if state else {}
+        self.created_count = counts.get('created', 0)
+        self.updated_count = counts.get('updated', 0)
+        self.skipped_count = counts.get('skipped', 0)
+        self.row_count = counts.get('rows', 0)
+        started = time.monotonic()
+
         try:
-            with open(csv_file, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                
-                created_count = 0
-                updated_count = 0
-                skipped_count = 0
-                errors = []
-                
-                for row_num, row in enumerate(reader, start=2):  # Start at 2 (1 for header)
-                    try:
-                        # Parse row data
-                        name = row.get('name', '').strip()
-                        email = row.get('email', '').strip()
-                        phone = row.get('phone', '').strip()
-                        party_name = row.get('party_name', '').strip()
-                        
-                        # Parse max_guests (default to 1)
-                        try:
-                            max_guests = int(row.get('max_guests', 1) or 1)
-                        except ValueError:
-                            max_guests = 1
-                        
-                        # Parse boolean fields
-                        invited_mendhi = self._parse_bool(row.get('invited_mendhi', 'False'))
-                        invited_vidhi = self._parse_bool(row.get('invited_vidhi', 'False'))
-                        invited_wedding = self._parse_bool(row.get('invited_wedding', 'False'))
-                        invited_reception = self._parse_bool(row.get('invited_reception', 'False'))
-                        
-                        if not name:
-                            errors.append(f"Row {row_num}: Name is required")
-                            continue
-                        
-                        if dry_run:
-                            self.stdout.write(
-                                f"Would import: {name} (Email: {email}, Party: {max_guests}, "
-                                f"Events: M={invited_mendhi}, V={invited_vidhi}, W={invited_wedding}, R={invited_reception})"
-                            )
-                            created_count += 1
-                            continue
-                        
-                        # Check if guest exists
-                        existing_guest = None
-                        if email:
-                            existing_guest = Guest.objects.filter(email__iexact=email).first()
-                        if not existing_guest:
-                            existing_guest = Guest.objects.filter(name__iexact=name).first()
-                        
-                        if existing_guest:
-                            if update_existing:
-                                existing_guest.email = email
-                                existing_guest.phone = phone
-                                existing_guest.party_name = party_name
-                                existing_guest.max_guests = max_guests
-                                existing_guest.invited_mendhi = invited_mendhi
-                                existing_guest.invited_vidhi = invited_vidhi
-                                existing_guest.invited_wedding = invited_wedding
-                                existing_guest.invited_reception = invited_reception
-                                existing_guest.save()
-                                updated_count += 1
-                                self.stdout.write(self.style.WARNING(f"Updated: {name}"))
-                            else:
-                                skipped_count += 1
-                                self.stdout.write(f"Skipped (exists): {name}")
-                        else:
-                            Guest.objects.create(
-                                name=name,
-                                email=email,
-                                phone=phone,
-                                party_name=party_name,
-                                max_guests=max_guests,
-                                invited_mendhi=invited_mendhi,
-                                invited_vidhi=invited_vidhi,
-                                invited_wedding=invited_wedding,
-                                invited_reception=invited_reception,
-                            )
-                            created_count += 1
-                            self.stdout.write(self.style.SUCCESS(f"Created: {name}"))
-                    
-                    except Exception as e:
-                        errors.append(f"Row {row_num}: {str(e)}")
-                
-                # Summary
-                self.stdout.write("\n" + "=" * 50)
-                if dry_run:
-                    self.stdout.write(self.style.WARNING("DRY RUN - No changes made"))
-                self.stdout.write(f"Created: {created_count}")
-                self.stdout.write(f"Updated: {updated_count}")
-                self.stdout.write(f"Skipped: {skipped_count}")
-                
-                if errors:
-                    self.stdout.write(self.style.ERROR(f"\nErrors ({len(errors)}):"))
-                    for error in errors:
-                        self.stdout.write(self.style.ERROR(f"  - {error}"))
-        
+            if state:
+                reader = ResumableCsvReader.resume(csv_file, state)
+            else:
+                reader = ResumableCsvReader(csv_file)
         except FileNotFoundError:
             raise CommandError(f'File not found: {csv_file}')
-        except Exception as e:
-            raise CommandError(f'Error reading CSV: {str(e)}')
-    
-    def _parse_bool(self, value):
-        """Parse boolean value from CSV"""
-        if isinstance(value, bool):
-            return value
-        return str(value).lower() in ('true', 'yes', '1', 'y', 't')
+        except csv.Error as e:
+            raise CommandError(f'Error reading CSV: {e}')
+
+        if state:
+            self.stdout.write(f"Resuming after row {state['row_num']} ({self.row_count} rows already done)")
+
+        self.rejects = RejectWriter(options['rejects'] or f'{csv_file}.rejects.csv', reader.fieldnames)
+        if not self.dry_run:
+            self.rejects.reset(state['rejects_size'] if state else None)
+        self.rejects.count = counts.get('rejected', 0)
+        self.committed_row = state['row_num'] if state else None
+
+        with reader:
+            try:
+                if mode == 'copy':
+                    self._import_copy(reader)
+                elif mode == 'bulk':
+                    self._import_bulk(reader)
+                else:
+                    self._import_rows(reader)
+            except csv.Error as e:
+                raise CommandError(f'Malformed CSV after row {reader.row_num}: {e}. {self._resume_hint()}')
+            except DatabaseError as e:
+                raise CommandError(f'Database error near row {reader.row_num}: {e}. {self._resume_hint()}')
+            finally:
+                self.rejects.close()
+
+        if not self.dry_run:
+            self.checkpoint.clear()
+        self._print_summary(time.monotonic() - started)
+
+    def _run(self, reader, add_row, commit):
+        """Feed every row to add_row, committing and checkpointing each batch"""
+        pending = 0
+        for row_num, row in reader:
+            self.row_count += 1
+            pending += 1
+            try:
+                add_row(row_num, row)
+            except ValueError as e:
+                self._reject(row_num, row, e)
+            if pending >= self.batch_size:
+                commit()
+                self._save_checkpoint(reader)
+                pending = 0
+        commit()
+
+    def _save_checkpoint(self, reader):
+        if self.dry_run:
+            return
+        state = reader.position
+        state['rejects_size'] = self.rejects.size
+        state['counts'] = {
+            'rows': self.row_count,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'skipped': self.skipped_count,
+            'rejected': self.rejects.count,
+        }
+        self.checkpoint.save(state)
+        self.committed_row = state['row_num']
+        self.stdout.write(f"  ... {self.row_count} rows committed")
+
+    def _resume_hint(self):
+        if self.dry_run:
+            return 'Nothing was written'
+        if self.committed_row is None:
+            return 'No checkpoint was reached; fix the problem and run the import again'
+        return f'Rows up to {self.committed_row} are committed; fix the problem and re-run with --resume'
+
+    def _reject(self, row_num, row, error):
+        if self.dry_run:
+            self.rejects.count += 1
+            self.stdout.write(self.style.ERROR(f"Row {row_num}: {error}"))
+        else:
+            self.rejects.write(row_num, row, error)
+
+    def _import_rows(self, reader):
+        """Row-by-row import, reporting each guest as it is written"""
+        self._run(reader, self._import_row, commit=lambda: None)
+
+    def _import_row(self, row_num, row):
+        data = parse_row(row)
+        name = data['name']
+        email = data['email']
+
+        if self.dry_run:
+            self.stdout.write(
+                f"Would import: {name} (Email: {email}, Party: {data['max_guests']}, "
+                f"Events: M={data['invited_mendhi']}, V={data['invited_vidhi']}, "
+                f"W={data['invited_wedding']}, R={data['invited_reception']})"
+            )
+            self.created_count += 1
+            return
+
+        # Check if guest exists
+        existing_guest = None
+        if email:
+            existing_guest = Guest.objects.with_email(email).order_by(*MATCH_ORDER).first()
+        if not existing_guest:
+            existing_guest = Guest.objects.named(name).order_by(*MATCH_ORDER).first()
+
+        if existing_guest:
+            if self.update_existing:
+                for field, value in data.items():
+                    if field not in ('name', 'rsvp_code'):
+                        setattr(existing_guest, field, value)
+                existing_guest.save()
+                self.updated_count += 1
+                self.stdout.write(self.style.WARNING(f"Updated: {name}"))
+            else:
+                self.skipped_count += 1
+                self.stdout.write(f"Skipped (exists): {name}")
+        else:
+            try:
+                with transaction.atomic():
+                    Guest.objects.create(**data)
+                    counters.family_added()
+            except IntegrityError as e:
+                # e.g. a pre-assigned rsvp_code that is already taken
+                raise ValueError(str(e))
+            self.created_count += 1
+            self.stdout.write(self.style.SUCCESS(f"Created: {name}"))
+
+    def _import_bulk(self, reader):
+        """Batched import: one index load, then bulk writes per batch"""
+        importer = BatchImporter(update_existing=self.update_existing, batch_size=self.batch_size)
+
+        def add_row(row_num, row):
+            result = importer.add(parse_row(row))
+            if result == 'created':
+                self.created_count += 1
+            elif result == 'updated':
+                self.updated_count += 1
+            else:
+                self.skipped_count += 1
+
+        self._run(reader, add_row, importer.flush)
+
+    def _import_copy(self, reader):
+        """COPY each batch into a staging table, then one set-based merge"""
+        batch = []
+        raw_rows = {}
+
+        def add_row(row_num, row):
+            batch.append((row_num, parse_row(row)))
+            raw_rows[row_num] = row
+
+        def commit():
+            if not batch:
+                return
+            created, updated, skipped, rejects = copy_import(batch, self.update_existing)
+            self.created_count += created
+            self.updated_count += updated
+            self.skipped_count += skipped
+            for row_num, error in rejects:
+                self._reject(row_num, raw_rows[row_num], error)
+            batch.clear()
+            raw_rows.clear()
+
+        self._run(reader, add_row, commit)
+
+    def _print_summary(self, elapsed):
+        self.stdout.write("\n" + "=" * 50)
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("DRY RUN - No changes made"))
+        self.stdout.write(f"Created: {self.created_count}")
+        self.stdout.write(f"Updated: {self.updated_count}")
+        self.stdout.write(f"Skipped: {self.skipped_count}")
+        rate = self.row_count / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"Processed {self.row_count} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
 
+        if self.rejects.count:
+            message = f"\nRejected: {self.rejects.count}"
+            if not self.dry_run:
+                message += f" (written to {self.rejects.path})"
+            self.stdout.write(self.style.ERROR(message))
@@ -0,0 +1,212 @@
+"""
+Management command to load test the site over HTTP.
+
+Usage:
+    python manage.py loadtest                                  # 30 s of the 'invitations' mix, 10 visitors
+    python manage.py loadtest --generate 5000 --concurrency 50 --duration 60
+    python manage.py loadtest --mix dashboard
+    python manage.py loadtest --mix lookup=3,rsvp=2,poll=1 --journeys 2000
+    python manage.py loadtest --url http://127.0.0.1:8000      # a running gunicorn
+    python manage.py loadtest --baseline loadtest-before.json  # compare with an earlier run
+
+Without --url the app is served in-process on a threaded WSGI server
+against the configured database. Journeys: home, lookup (enter a code),
+rsvp (open an invitation link), submit (answer the RSVP form), poll
+(dashboard stats API), dashboard and export (guest CSV). Prints
+throughput and p50/p95/p99 latency per URL name and saves the results as
+JSON (--output).
+
+The submit journey saves RSVP answers, so the command refuses to run
+with DEBUG off unless --force is given; use a development database,
+seeded with --generate (or generate_dataset).
+"""
+
+import json
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from wedding import datagen, loadtest
+from wedding.models import Guest
+
+
+class Command(BaseCommand):
+    help = 'Replay a mix of visitor journeys over HTTP and report latency percentiles per URL name'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server (default: serve the app in-process)',
+        )
+        parser.add_argument(
+            '--mix',
+            default='invitations',
+            help=f"Journey mix: {' or '.join(loadtest.MIXES)}, or journey=weight,... (default: invitations)",
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=10,
+            help='Simultaneous visitors (default: 10)',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Seconds to run (default: 30; ignored with --journeys)',
+        )
+        parser.add_argument(
+            '--journeys',
+            type=int,
+            help='Stop after this many journeys instead of after --duration',
+        )
+        parser.add_argument(
+            '--families',
+            type=int,
+            default=500,
+            help='Families sampled as visitors (default: 500)',
+        )
+        parser.add_argument(
+            '--generate',
+            type=int,
+            default=0,
+            metavar='N',
+            help='First add N generated families (wedding.datagen)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for generated data, the family sample and journey choices (default: 0)',
+        )
+        parser.add_argument(
+            '--staff',
+            metavar='USERNAME',
+            help='Staff user for dashboard journeys (default: the first active superuser)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30,
+            help='Seconds before a request counts as failed (default: 30)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Results JSON file (default: loadtest-<timestamp>.json)',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results JSON of an earlier run to compare against',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run even with DEBUG off (submit journeys write RSVP answers)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        writes = loadtest.WRITING_JOURNEYS.intersection(name for name, weight in mix.items() if weight > 0)
+        if writes and not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'The submit journey saves RSVP answers; run against a development database '
+                '(DEBUG=True) or pass --force'
+            )
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['baseline']}: {exc}")
+
+        if options['generate']:
+            self.stdout.write(f"Generating {options['generate']} families...")
+            totals = datagen.generate(options['generate'], seed=options['seed'])
+            self.stdout.write(f"  {totals['families']} families, {totals['members']} members")
+
+        staff = None
+        if loadtest.STAFF_JOURNEYS.intersection(name for name, weight in mix.items() if weight > 0):
+            staff = self.get_staff(options['staff'])
+        workload = loadtest.Workload.load(options['families'], seed=options['seed'], staff=staff)
+        if not workload.codes:
+            raise CommandError('No families in the database; seed some with --generate N')
+
+        run_options = {
+            'mix': mix,
+            'concurrency': options['concurrency'],
+            'duration': None if options['journeys'] else options['duration'],
+            'journeys': options['journeys'],
+            'seed': options['seed'],
+            'timeout': options['timeout'],
+        }
+        started_at = timezone.now()
+        if options['url']:
+            self.stdout.write(f"Load testing {options['url']}...")
+            results = loadtest.run(options['url'], workload, **run_options)
+        else:
+            with loadtest.serve() as url:
+                self.stdout.write(f'Load testing the in-process server at {url}...')
+                results = loadtest.run(url, workload, **run_options)
+
+        results.update({
+            'started_at': started_at.isoformat(),
+            'server': 'external' if options['url'] else 'in-process',
+            'database': connection.vendor,
+            'families': Guest.objects.count(),
+            'visited_families': len(workload.codes),
+        })
+        self.print_results(results, baseline)
+
+        output = options['output'] or f"loadtest-{started_at:%Y%m%d-%H%M%S}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Results saved to {output}'))
+
+    def get_staff(self, username):
+        users = User.objects.filter(is_active=True, is_staff=True)
+        if username:
+            user = users.filter(username=username).first()
+            if user is None:
+                raise CommandError(f"No active staff user '{username}'")
+            return user
+        user = users.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError(
+                'Dashboard journeys need a staff user: create one (createsuperuser), '
+                'pass --staff, or use a mix without poll/dashboard/export'
+            )
+        return user
+
+    def print_results(self, results, baseline=None):
+        before = (baseline or {}).get('endpoints', {})
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'URL name':<26} {'requests':>8} {'errors':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+            + (f" {'p95 vs baseline':>16}" if baseline else '')
+        )
+        rows = list(results['endpoints'].items()) + [('TOTAL', results['totals'])]
+        for label, row in rows:
+            line = f"{label:<26} {row['requests']:>8} {row['errors']:>6} {row['throughput'] or 0:>8.1f} " + ' '.join(
+                f"{row[key]:>8.1f}" if row[key] is not None else f"{'-':>8}"
+                for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+            )
+            if baseline:
+                old = before.get(label) if label != 'TOTAL' else baseline.get('totals')
+                if old and old.get('p95_ms') and row['p95_ms'] is not None:
+                    line += f" {(row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100:>+15.0f}%"
+                else:
+                    line += f" {'-':>16}"
+            style = self.style.ERROR if row['errors'] else (lambda text: text)
+            self.stdout.write(style(line))
+        self.stdout.write(
+            f"\n{results['totals']['requests']} requests in {results['elapsed_s']:.1f} s "
+            f"({results['totals']['throughput'] or 0:.1f} req/s) with {results['concurrency']} visitors"
+        )
@@ -0,0 +1,27 @@
+"""
+Management command to pre-render the public home page.
+
+Usage:
+    python manage.py prerender_home
+
+Writes PRERENDER_ROOT/home.html and home.html.gz, served by views.home when
+PRERENDER_HOME is on. Saving wedding info, events or story milestones
+rebuilds the page automatically; run this after deploying template changes
+(the Procfile does it on every release).
+"""
+
+import os
+from django.core.management.base import BaseCommand
+from wedding import prerender
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the home page to a static, compressed file'
+
+    def handle(self, *args, **options):
+        path = prerender.build_home()
+        size = os.path.getsize(path)
+        compressed = os.path.getsize(f'{path}.gz')
+        self.stdout.write(self.style.SUCCESS(
+            f'Pre-rendered home page to {path} ({size:,} bytes, {compressed:,} gzipped)'
+        ))
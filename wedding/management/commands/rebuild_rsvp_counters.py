@@ -0,0 +1,39 @@
+"""
+Management command to recompute the denormalized RSVP counters.
+
+Usage:
+    python manage.py rebuild_rsvp_counters
+    python manage.py rebuild_rsvp_counters --check   # report drift only
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from wedding import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute RSVP counters from guests/family members and report any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift; exit with an error if any is found',
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        drift = counters.rebuild(dry_run=check_only)
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('RSVP counters are in sync'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'Drift found in {len(drift)} counter row(s):'))
+        for scope, fields in sorted(drift.items()):
+            for field, (stored, actual) in sorted(fields.items()):
+                stored_display = 'missing' if stored is None else stored
+                self.stdout.write(f"  {scope}.{field}: stored={stored_display} actual={actual}")
+
+        if check_only:
+            raise CommandError('RSVP counters have drifted; run without --check to fix')
+        self.stdout.write(self.style.SUCCESS('Counters rebuilt'))
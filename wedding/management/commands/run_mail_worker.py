@@ -0,0 +1,85 @@
+"""
+Management command to send queued emails from the outbox.
+
+Usage:
+    python manage.py run_mail_worker                 # run until stopped
+    python manage.py run_mail_worker --once          # drain what is due, then exit
+    python manage.py run_mail_worker --batch-size 100 --poll-interval 2
+
+Messages are claimed in batches and sent over one mail connection per
+batch. Failures are retried with backoff; repeated connection failures
+pause sending until the circuit breaker's cooldown has passed. Stop with
+Ctrl+C or SIGTERM; the current batch is finished first.
+"""
+
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from wedding.outbox import BATCH_SIZE, MAX_ATTEMPTS, MailWorker
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Send every message that is due now, then exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Messages claimed and sent per connection (default {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=MAX_ATTEMPTS,
+            help=f'Attempts before a message is marked failed (default {MAX_ATTEMPTS})',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when the outbox is empty (default 5)',
+        )
+
+    def handle(self, *args, **options):
+        worker = MailWorker(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+        poll_interval = options['poll_interval']
+        totals = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+
+        try:
+            while not self.stopping:
+                close_old_connections()
+                stats = worker.run_once()
+                for key, value in stats.items():
+                    totals[key] += value
+                if any(stats.values()):
+                    self.stdout.write(
+                        f"Sent {stats['sent']}, retrying {stats['retried']}, "
+                        f"failed {stats['failed']}, deferred {stats['deferred']}"
+                    )
+
+                if stats['sent'] or stats['retried'] or stats['failed']:
+                    continue  # more may be due right away
+                if options['once']:
+                    break
+                # Empty outbox, unreachable server or open breaker: wait
+                time.sleep(max(poll_interval, worker.breaker.retry_in()))
+        except KeyboardInterrupt:
+            pass
+
+        style = self.style.SUCCESS if not totals['failed'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Done: {totals['sent']} sent, {totals['retried']} retries scheduled, {totals['failed']} failed"
+        ))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
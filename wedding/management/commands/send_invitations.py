@@ -0,0 +1,150 @@
+"""
+Management command to email invitations with each family's RSVP code.
+
+Usage:
+    python manage.py send_invitations                  # everyone with an email
+    python manage.py send_invitations --pending        # yet to respond
+    python manage.py send_invitations --event mendhi   # invited to an event
+    python manage.py send_invitations --code ABCD2345 --code EFGH6789
+    python manage.py send_invitations --concurrency 8 --rate 20
+    python manage.py send_invitations --dry-run        # preview, send nothing
+
+Each guest's invitation is queued once per RSVP code in the email outbox,
+then sent over --concurrency reused mail connections at no more than
+--rate messages per second. Interrupt it at any time and run it again:
+guests already sent to are not sent again. Only the selected guests'
+invitations are sent; anything else in the outbox, and messages waiting
+for a retry, are sent by run_mail_worker. RSVP links use the SITE_URL
+setting.
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from wedding import invitations
+from wedding.models import OutboundEmail
+from wedding.outbox import EmailTemplates
+from wedding.stats import EVENT_SLUGS
+
+
+class Command(BaseCommand):
+    help = 'Email invitations with RSVP codes to selected guests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only families that have not responded yet',
+        )
+        parser.add_argument(
+            '--event',
+            choices=EVENT_SLUGS,
+            help='Only families with someone invited to this event',
+        )
+        parser.add_argument(
+            '--code',
+            action='append',
+            dest='codes',
+            help='Only the family with this RSVP code (repeatable)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=invitations.CONCURRENCY,
+            help=f'Parallel mail connections (default {invitations.CONCURRENCY})',
+        )
+        parser.add_argument(
+            '--rate',
+            type=float,
+            default=invitations.RATE_LIMIT,
+            help=f'Maximum messages per second, 0 for no limit (default {invitations.RATE_LIMIT:g})',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue invitations that previously failed for another attempt',
+        )
+        parser.add_argument(
+            '--queue-only',
+            action='store_true',
+            help='Queue the invitations and leave sending to run_mail_worker',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show who would be sent an invitation and preview one',
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        guests = invitations.select_guests(
+            pending=options['pending'], event=options['event'], codes=options['codes'],
+        )
+        selected = guests.count()
+        if not selected:
+            self.stdout.write(self.style.WARNING('No guests with an email address match'))
+            return
+
+        if options['dry_run']:
+            self._preview(guests, selected)
+            return
+
+        existing = invitations.invitations_for(guests)
+        if options['retry_failed']:
+            # Failed rows have had their context cleared: queue them afresh
+            retried, _ = existing.filter(status=OutboundEmail.FAILED).delete()
+            self.stdout.write(f'{retried} failed invitation(s) queued again')
+
+        queued = invitations.queue_invitations(guests)
+        self.stdout.write(f'{selected} guest(s) selected, {queued} newly queued')
+        already_sent = existing.filter(status=OutboundEmail.SENT).count()
+        if already_sent:
+            self.stdout.write(f'{already_sent} already sent; they will not be sent again')
+
+        if options['queue_only']:
+            self.stdout.write(self.style.SUCCESS('Queued; run_mail_worker will send them'))
+            return
+
+        started = time.monotonic()
+        last_report = [0]
+
+        def progress(totals):
+            done = totals['sent'] + totals['failed']
+            if done - last_report[0] >= 100:
+                last_report[0] = done
+                self.stdout.write(f"  ... {totals['sent']} sent")
+
+        try:
+            totals = invitations.send_queued(
+                existing, concurrency=options['concurrency'], rate=options['rate'], progress=progress,
+            )
+        except KeyboardInterrupt:
+            sent = existing.filter(status=OutboundEmail.SENT).count()
+            raise CommandError(f'Interrupted with {sent} sent; run the same command again to continue')
+        self._print_summary(totals, existing, time.monotonic() - started)
+
+    def _preview(self, guests, selected):
+        self.stdout.write(self.style.WARNING('DRY RUN - nothing queued or sent'))
+        self.stdout.write(f'{selected} guest(s) would be sent an invitation')
+        sample = invitations.build_invitations(guests[:1])[0]
+        email = EmailTemplates().render(sample)
+        self.stdout.write(f'\nTo: {sample.to_email}\nSubject: {email.subject}\n\n{email.body}')
+
+    def _print_summary(self, totals, existing, elapsed):
+        rate = totals['sent'] / elapsed if elapsed > 0 else 0
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent: {totals['sent']} in {elapsed:.1f}s ({rate:.1f}/s)"
+        ))
+        waiting = existing.filter(status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING]).count()
+        if waiting:
+            self.stdout.write(self.style.WARNING(
+                f'Still queued: {waiting} (waiting for a retry or an unreachable server); '
+                f'run again later or leave them to run_mail_worker'
+            ))
+        failed = existing.filter(status=OutboundEmail.FAILED).count()
+        if failed:
+            self.stdout.write(self.style.ERROR(
+                f'Failed: {failed}; see the Outbound Emails admin, or re-run with --retry-failed'
+            ))
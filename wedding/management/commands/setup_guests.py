@@ -1,10 +1,13 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from wedding import counters
 from wedding.models import Guest, FamilyMember
 
 
 class Command(BaseCommand):
     help = 'Create 5 families with individual member event invitations'
 
+    @transaction.atomic
     def handle(self, *args, **options):
         # Clear existing data
         FamilyMember.objects.all().delete()
@@ -125,4 +128,7 @@ class Command(BaseCommand):
                 if member.invited_reception: events.append('R')
                 self.stdout.write(f"  - {member.name} ({member.get_relation_display()}): {', '.join(events)}")
         
+        # The whole list was replaced, so recount rather than apply deltas
+        counters.rebuild()
+        
         self.stdout.write(self.style.SUCCESS(f'\nSetup complete! Created {Guest.objects.count()} families with {FamilyMember.objects.count()} total members'))
@@ -0,0 +1,267 @@
+"""
+Grid editing of a large family's members in the admin.
+
+The change form's inline renders and validates every member as a form of
+ten fields and saves changed rows one by one, which gets slow for joint
+families of dozens of members. The grid editor posts every member as one
+JSON payload instead::
+
+    {"members": [
+        {"id": 12, "name": "Asha Patel", "relation": "aunt", "dietary_requirements": "",
+         "invited": {"mendhi": true, ...}, "rsvp": {"mendhi": "attending", ...}},
+        {"id": null, "name": "New Cousin", ...},
+        {"id": 15, "delete": true}
+    ]}
+
+Rows are in display order. ``parse`` validates the whole payload in one
+pass and reports every problem at once; ``save_grid`` applies it with one
+``bulk_update``, one ``bulk_create`` and one delete, then brings the
+invitation rows, RSVP counters and cohort index in step, since bulk
+writes send no signals. Members missing from the payload are left alone,
+except that they are numbered after the listed rows.
+"""
+
+import json
+from typing import NamedTuple
+from django.conf import settings
+from django.db import transaction
+from . import cohorts
+from .counters import CounterDelta
+from .models import Event, FamilyMember, Guest, Invitation
+
+
+# Families with more members than this are edited in the grid, not the inline
+GRID_THRESHOLD = getattr(settings, 'MEMBER_GRID_THRESHOLD', 12)
+
+EVENT_SLUGS = [slug for slug, _ in Event.EVENT_CHOICES]
+
+RELATIONS = {relation for relation, _ in FamilyMember.RELATION_CHOICES}
+
+STATUSES = {status for status, _ in FamilyMember.RSVP_STATUS_CHOICES}
+
+NAME_MAX_LENGTH = FamilyMember._meta.get_field('name').max_length
+
+# Member fields the RSVP counters are computed from
+COUNTED_FIELDS = [f'invited_{slug}' for slug in EVENT_SLUGS] + [f'rsvp_{slug}' for slug in EVENT_SLUGS]
+
+
+class GridError(ValueError):
+    """A grid payload that cannot be applied; ``errors`` lists every problem"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class GridChanges(NamedTuple):
+    updated: list  # existing members with new values set
+    fields: dict  # member pk -> names of its changed fields
+    created: list  # unsaved new members
+    deleted: list  # existing members to delete
+
+
+def member_row(member):
+    """A member as a grid payload row"""
+    return {
+        'id': member.pk,
+        'name': member.name,
+        'relation': member.relation,
+        'dietary_requirements': member.dietary_requirements,
+        'invited': {slug: getattr(member, f'invited_{slug}') for slug in EVENT_SLUGS},
+        'rsvp': {slug: getattr(member, f'rsvp_{slug}') for slug in EVENT_SLUGS},
+    }
+
+
+def display_rows(rows):
+    """
+    Payload rows as the grid template shows them, with per-event cells;
+    tolerates the malformed rows of a rejected submission.
+    """
+    display = []
+    for row in rows:
+        invited = row.get('invited') if isinstance(row.get('invited'), dict) else {}
+        statuses = row.get('rsvp') if isinstance(row.get('rsvp'), dict) else {}
+        display.append({
+            'id': row.get('id') if type(row.get('id')) is int else '',
+            'name': row.get('name') or '',
+            'relation': row.get('relation') or 'other',
+            'dietary_requirements': row.get('dietary_requirements') or '',
+            'delete': bool(row.get('delete')),
+            'events': [
+                {'slug': slug, 'invited': invited.get(slug) is True, 'status': statuses.get(slug, 'pending')}
+                for slug in EVENT_SLUGS
+            ],
+        })
+    return display
+
+
+def load_payload(text):
+    """The member rows of a posted payload; raises GridError if it is not one"""
+    try:
+        data = json.loads(text or '')
+    except ValueError:
+        raise GridError(['The grid could not be read; reload the page and try again.'])
+    rows = data.get('members') if isinstance(data, dict) else None
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise GridError(['The grid could not be read; reload the page and try again.'])
+    return rows
+
+
+def _values(row, label, errors):
+    """Field values of one payload row, or None if it has errors (appended to ``errors``)"""
+    values = {}
+    problems = []
+    name = row.get('name')
+    name = name.strip() if isinstance(name, str) else ''
+    if not name:
+        problems.append('a name is required')
+    elif len(name) > NAME_MAX_LENGTH:
+        problems.append(f'the name is longer than {NAME_MAX_LENGTH} characters')
+    values['name'] = name
+
+    relation = row.get('relation', 'other')
+    if not isinstance(relation, str) or relation not in RELATIONS:
+        problems.append(f'unknown relation {relation!r}')
+    values['relation'] = relation
+
+    dietary = row.get('dietary_requirements', '')
+    if not isinstance(dietary, str):
+        problems.append('dietary requirements must be text')
+    values['dietary_requirements'] = dietary.strip() if isinstance(dietary, str) else ''
+
+    invited = row.get('invited') or {}
+    statuses = row.get('rsvp') or {}
+    if not isinstance(invited, dict) or not isinstance(statuses, dict):
+        problems.append('invitations must be given per event')
+        invited, statuses = {}, {}
+    for slug in EVENT_SLUGS:
+        is_invited = invited.get(slug, False)
+        status = statuses.get(slug, 'pending')
+        if not isinstance(is_invited, bool):
+            problems.append(f'invited to {slug} must be true or false')
+        if not isinstance(status, str) or status not in STATUSES:
+            problems.append(f'unknown {slug} response {status!r}')
+        values[f'invited_{slug}'] = is_invited
+        values[f'rsvp_{slug}'] = status
+
+    if problems:
+        errors.append(f"{label}: {', '.join(problems)}")
+        return None
+    return values
+
+
+def parse(rows, family, members, can_add=True, can_delete=True):
+    """
+    Validate payload ``rows`` against the family's current ``members``
+    (in display order); ``can_add``/``can_delete`` are the user's
+    permissions for new and deleted rows.
+
+    Returns GridChanges; raises GridError listing every invalid row.
+    """
+    existing = {member.pk: member for member in members}
+    errors = []
+    seen = set()
+    updated, created, deleted = [], [], []
+    fields = {}
+    order = 0
+    for number, row in enumerate(rows, 1):
+        member_id = row.get('id')
+        label = f"Row {number} ({str(row.get('name') or '').strip() or 'unnamed'})"
+        if member_id is not None:
+            # JSON true is an int in Python; lists and objects are unhashable
+            if not isinstance(member_id, int) or isinstance(member_id, bool):
+                errors.append(f'{label}: invalid member id {member_id!r}; reload the page')
+                continue
+            if member_id not in existing:
+                errors.append(f'{label}: not a member of this family (deleted elsewhere?); reload the page')
+                continue
+            if member_id in seen:
+                errors.append(f'{label}: listed twice')
+                continue
+            seen.add(member_id)
+        if row.get('delete'):
+            if member_id is not None:
+                if not can_delete:
+                    errors.append(f'{label}: you do not have permission to delete members')
+                    continue
+                deleted.append(existing[member_id])
+            continue
+
+        values = _values(row, label, errors)
+        if values is None:
+            continue
+        values['order'] = order
+        order += 1
+        if member_id is None:
+            if not can_add:
+                errors.append(f'{label}: you do not have permission to add members')
+                continue
+            created.append(FamilyMember(family=family, **values))
+            continue
+        member = existing[member_id]
+        changes = {field: value for field, value in values.items() if getattr(member, field) != value}
+        if changes:
+            for field, value in changes.items():
+                setattr(member, field, value)
+            updated.append(member)
+            fields[member.pk] = list(changes)
+
+    # Members left out keep their places, numbered after the listed rows
+    for member in members:
+        if member.pk in seen:
+            continue
+        if member.order != order:
+            member.order = order
+            updated.append(member)
+            fields[member.pk] = ['order']
+        order += 1
+
+    if errors:
+        raise GridError(errors)
+    return GridChanges(updated, fields, created, deleted)
+
+
+def save_grid(family_pk, rows, can_add=True, can_delete=True):
+    """
+    Apply grid payload ``rows`` to a family as one atomic write; see
+    ``parse`` for ``can_add``/``can_delete``.
+
+    Returns (family, GridChanges); raises GridError, before writing
+    anything, if the payload is invalid.
+    """
+    with transaction.atomic():
+        # Row lock: a concurrent RSVP for this family waits, so the counter
+        # delta below is computed from the committed state
+        family = Guest.objects.select_for_update().get(pk=family_pk)
+        members = list(family.members.order_by('order', 'name'))
+        before = {
+            member.pk: FamilyMember(**{field: getattr(member, field) for field in COUNTED_FIELDS})
+            for member in members
+        }
+        changes = parse(rows, family, members, can_add, can_delete)
+
+        delta = CounterDelta()
+        for member in changes.updated:
+            delta.add_member(before[member.pk], sign=-1)
+            delta.add_member(member)
+        for member in changes.deleted:
+            delta.add_member(member, sign=-1)
+        for member in changes.created:
+            delta.add_member(member)
+
+        if changes.updated:
+            changed = {field for names in changes.fields.values() for field in names}
+            FamilyMember.objects.bulk_update(changes.updated, sorted(changed))
+        if changes.created:
+            FamilyMember.objects.bulk_create(changes.created)
+        if changes.deleted:
+            # A queryset delete: post_delete drops the members from the cohort index
+            FamilyMember.objects.filter(pk__in=[member.pk for member in changes.deleted]).delete()
+
+        saved = changes.updated + changes.created
+        if saved:
+            Invitation.objects.sync(saved)
+            cohorts.members_changed(saved, responded=family.has_responded)
+        delta.apply()
+    return family, changes
+
@@ -0,0 +1,50 @@
+"""
+Streaming responses under ASGI.
+
+Django's ASGI handler can only stream async iterators: a file response
+from WhiteNoise (static files, the pre-rendered home page) or a CSV export
+is read into memory in full first, with a warning. ``AsyncStreamingMiddleware``
+wraps those sync iterators so they are read block by block in the
+request's thread instead. Under WSGI responses are left alone.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+# Bytes read from a sync iterator per hop to its thread
+BLOCK_SIZE = 64 * 1024
+
+
+def _next_block(chunks):
+    """Join chunks up to BLOCK_SIZE bytes; b'' once the iterator is exhausted"""
+    block = []
+    size = 0
+    for chunk in chunks:
+        block.append(chunk)
+        size += len(chunk)
+        if size >= BLOCK_SIZE:
+            break
+    return b''.join(block)
+
+
+async def _async_blocks(chunks):
+    next_block = sync_to_async(_next_block)
+    while True:
+        block = await next_block(chunks)
+        if not block:
+            return
+        yield block
+
+
+class AsyncStreamingMiddleware:
+    """Turn sync streaming content into an async iterator for ASGI requests"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if isinstance(request, ASGIRequest) and response.streaming and not response.is_async:
+            response.streaming_content = _async_blocks(iter(response.streaming_content))
+        return response
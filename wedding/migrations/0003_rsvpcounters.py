@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0002_add_family_member'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RsvpCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('mendhi', 'Mendhi'), ('vidhi', 'Vidhi'), ('wedding', 'Wedding'), ('reception', 'Reception'), ('families', 'Families'), ('members', 'Members')], max_length=20, unique=True)),
+                ('invited', models.IntegerField(default=0)),
+                ('attending', models.IntegerField(default=0)),
+                ('declined', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'RSVP Counters',
+                'verbose_name_plural': 'RSVP Counters',
+            },
+        ),
+    ]
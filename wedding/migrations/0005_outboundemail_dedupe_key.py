@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0004_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='dedupe_key',
+            field=models.CharField(blank=True, help_text='Set for one-per-guest emails (e.g. invitation:<guest id>) so they are queued once', max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='template',
+            field=models.CharField(choices=[('forgot_code', 'Forgot RSVP code'), ('invitation', 'Invitation')], max_length=50),
+        ),
+    ]
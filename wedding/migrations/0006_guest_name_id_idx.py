@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0005_outboundemail_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(fields=['name', 'id'], name='guest_name_id_idx'),
+        ),
+    ]
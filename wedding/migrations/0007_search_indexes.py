@@ -0,0 +1,45 @@
+from django.db import migrations
+
+
+# Trigram GIN indexes behind wedding.search on PostgreSQL. SQLite gets FTS5
+# side tables instead, installed after every migrate (see wedding.search).
+# Servers without the pg_trgm extension available are left as they are and
+# searched with unindexed substring matches.
+TRIGRAM_INDEXES = [
+    ('guest_name_trgm_idx', 'wedding_guest', 'name'),
+    ('guest_party_name_trgm_idx', 'wedding_guest', 'party_name'),
+    ('guest_email_trgm_idx', 'wedding_guest', 'email'),
+    ('familymember_name_trgm_idx', 'wedding_familymember', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0006_guest_name_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
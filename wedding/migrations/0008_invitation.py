@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Event and status are strongly correlated (a past event has few pending
+# rows): without joint statistics PostgreSQL multiplies their frequencies,
+# badly overestimates sparse combinations, and picks plans that scan every
+# guest looking for matches
+def create_event_status_statistics(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE STATISTICS IF NOT EXISTS invitation_event_status_stats (mcv) '
+            'ON event, status FROM wedding_invitation'
+        )
+
+
+def drop_event_status_statistics(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP STATISTICS IF EXISTS invitation_event_status_stats')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0007_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Invitation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('mendhi', 'Mendhi'), ('vidhi', 'Vidhi'), ('wedding', 'Wedding'), ('reception', 'Reception')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('attending', 'Attending'), ('not_attending', 'Not Attending')], default='pending', max_length=20)),
+                ('headcount', models.PositiveIntegerField(default=0)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invitations', to='wedding.familymember')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['event', 'status'], name='invitation_event_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'event'), name='invitation_member_event_uniq')],
+            },
+        ),
+        migrations.RunPython(create_event_status_statistics, drop_event_status_statistics),
+    ]
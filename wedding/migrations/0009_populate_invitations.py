@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# Events with per-member columns at the time of this migration
+EVENTS = ['mendhi', 'vidhi', 'wedding', 'reception']
+
+
+def populate_invitations(apps, schema_editor):
+    # One INSERT ... SELECT per event: the copy never leaves the database
+    for event in EVENTS:
+        schema_editor.execute(
+            f'''
+            INSERT INTO wedding_invitation (member_id, event, status, headcount)
+            SELECT id, %s, rsvp_{event}, CASE WHEN rsvp_{event} = 'attending' THEN 1 ELSE 0 END
+            FROM wedding_familymember
+            WHERE invited_{event}
+            ''',
+            [event],
+        )
+    if schema_editor.connection.vendor == 'postgresql':
+        # Planner statistics for the new rows before the first query uses them
+        schema_editor.execute('ANALYZE wedding_invitation')
+
+
+def clear_invitations(apps, schema_editor):
+    apps.get_model('wedding', 'Invitation').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0008_invitation'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_invitations, clear_invitations),
+    ]
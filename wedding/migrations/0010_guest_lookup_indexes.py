@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:19
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0009_populate_invitations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='familymember',
+            index=models.Index(fields=['family', 'order', 'name'], name='member_family_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='guest_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='guest_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guest',
+            index=models.Index(condition=models.Q(('has_responded', True)), fields=['rsvp_submitted_at'], name='guest_responded_at_idx'),
+        ),
+    ]
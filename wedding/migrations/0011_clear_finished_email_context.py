@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def clear_finished_context(apps, schema_editor):
+    # The worker now clears these as it goes; empty the rows it already finished
+    OutboundEmail = apps.get_model('wedding', 'OutboundEmail')
+    OutboundEmail.objects.filter(status__in=['sent', 'failed']).update(context={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0010_guest_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_finished_context, migrations.RunPython.noop),
+    ]
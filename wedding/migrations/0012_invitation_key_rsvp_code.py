@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:33
+
+from django.db import migrations, models
+
+
+def add_rsvp_codes(apps, schema_editor):
+    # invitation:<guest id> -> invitation:<guest id>:<rsvp code>, taking the
+    # guest's current code, so invitations already sent aren't queued again
+    OutboundEmail = apps.get_model('wedding', 'OutboundEmail')
+    rows = OutboundEmail.objects.filter(template='invitation', guest__isnull=False)
+    updated = [
+        OutboundEmail(pk=pk, dedupe_key=f'invitation:{guest_id}:{rsvp_code}')
+        for pk, guest_id, rsvp_code in rows.values_list('pk', 'guest_id', 'guest__rsvp_code').iterator()
+    ]
+    OutboundEmail.objects.bulk_update(updated, ['dedupe_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wedding', '0011_clear_finished_email_context'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboundemail',
+            name='dedupe_key',
+            field=models.CharField(blank=True, help_text='Set for one-per-guest emails (e.g. invitation:<guest id>:<rsvp code>) so they are queued once', max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(add_rsvp_codes, migrations.RunPython.noop),
+    ]
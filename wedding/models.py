@@ -2,14 +2,19 @@ import uuid
 import secrets
 import string
 from django.db import models
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
 from django.utils import timezone
 
 
+# Uppercase letters and digits, excluding confusing characters (0, O, I, L, 1)
+RSVP_CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+RSVP_CODE_LENGTH = 8
+
+
 def generate_rsvp_code():
     """Generate a unique 8-character RSVP code"""
-    # Use uppercase letters and digits, excluding confusing characters (0, O, I, L, 1)
-    alphabet = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
-    return ''.join(secrets.choice(alphabet) for _ in range(8))
+    return ''.join(secrets.choice(RSVP_CODE_ALPHABET) for _ in range(RSVP_CODE_LENGTH))
 
 
 class Event(models.Model):
@@ -54,6 +59,25 @@ class StoryMilestone(models.Model):
         return f"{self.year} - {self.title}"
 
 
+class GuestQuerySet(models.QuerySet):
+    def with_email(self, email):
+        """Case-insensitive email match that can use guest_email_lower_idx"""
+        return self.filter(Exact(Lower('email'), email.lower()))
+
+    def named(self, name):
+        """Case-insensitive name match that can use guest_name_lower_idx"""
+        return self.filter(Exact(Lower('name'), name.lower()))
+
+    def invited_to(self, event):
+        """
+        Families invited to ``event``: by the family-level ``invited_*``
+        flag (which the admin's bulk invite actions set) or by any member's
+        invitation.
+        """
+        members_invited = Invitation.objects.for_event(event).family_ids()
+        return self.filter(models.Q(**{f'invited_{event}': True}) | models.Q(pk__in=members_invited))
+
+
 class Guest(models.Model):
     """
     Guest model with unique RSVP code.
@@ -121,11 +145,27 @@ class Guest(models.Model):
     # Tracking
     has_responded = models.BooleanField(default=False)
     last_viewed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = GuestQuerySet.as_manager()
     
     class Meta:
         ordering = ['name']
         verbose_name = "Guest"
         verbose_name_plural = "Guests"
+        indexes = [
+            # Keyset pagination of the guest list
+            models.Index(fields=['name', 'id'], name='guest_name_id_idx'),
+            # Forgot-code and import lookups (GuestQuerySet.with_email / named)
+            models.Index(Lower('email'), name='guest_email_lower_idx'),
+            models.Index(Lower('name'), name='guest_name_lower_idx'),
+            # Dashboard "recent RSVPs": responded families, newest first. Only
+            # responded rows are indexed, so has_responded itself is not a column
+            models.Index(
+                fields=['rsvp_submitted_at'],
+                condition=models.Q(has_responded=True),
+                name='guest_responded_at_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.rsvp_code})"
@@ -133,9 +173,8 @@ class Guest(models.Model):
     def save(self, *args, **kwargs):
         # Ensure RSVP code is unique
         if not self.rsvp_code:
-            self.rsvp_code = generate_rsvp_code()
-            while Guest.objects.filter(rsvp_code=self.rsvp_code).exists():
-                self.rsvp_code = generate_rsvp_code()
+            from .codes import CodeAllocator
+            self.rsvp_code = CodeAllocator().allocate_one()
         super().save(*args, **kwargs)
     
     @property
@@ -252,6 +291,10 @@ class FamilyMember(models.Model):
         ordering = ['order', 'name']
         verbose_name = "Family Member"
         verbose_name_plural = "Family Members"
+        indexes = [
+            # A family's members in display order (RSVP form and page)
+            models.Index(fields=['family', 'order', 'name'], name='member_family_order_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.get_relation_display()}) - {self.family.party_name}"
@@ -266,6 +309,173 @@ class FamilyMember(models.Model):
         return events
 
 
+class InvitationQuerySet(models.QuerySet):
+    def for_event(self, event):
+        return self.filter(event=event)
+
+    def with_status(self, status):
+        return self.filter(status=status)
+
+    def family_ids(self):
+        """Subquery of the families these invitations belong to"""
+        return self.order_by().values('member__family_id')
+
+    def sync(self, members):
+        """
+        Bring the invitation rows of ``members`` in line with their
+        ``invited_*``/``rsvp_*`` columns: one DELETE for events they are no
+        longer invited to and one upsert for the rest. Call it after bulk
+        writes to member invitations or responses, which send no signals.
+        """
+        members = [member for member in members if member.pk]
+        if not members:
+            return
+        rows = []
+        uninvited = {}  # event -> member ids
+        for member in members:
+            for slug, _ in Event.EVENT_CHOICES:
+                if getattr(member, f'invited_{slug}'):
+                    status = getattr(member, f'rsvp_{slug}')
+                    rows.append(Invitation(
+                        member_id=member.pk,
+                        event=slug,
+                        status=status,
+                        # Each member is one person
+                        headcount=1 if status == 'attending' else 0,
+                    ))
+                else:
+                    uninvited.setdefault(slug, []).append(member.pk)
+        if uninvited:
+            # One IN list per event: a term per member and event nests too
+            # deep for SQLite once a few hundred members are synced at once
+            condition = models.Q()
+            for slug, member_ids in uninvited.items():
+                condition |= models.Q(event=slug, member_id__in=member_ids)
+            self.model.objects.filter(condition).delete()
+        self.model.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['member', 'event'],
+            update_fields=['status', 'headcount'],
+        )
+
+
+class Invitation(models.Model):
+    """
+    One member's invitation to one event and their response.
+
+    A normalized copy of the ``FamilyMember.invited_*``/``rsvp_*`` columns,
+    kept in step by ``Invitation.objects.sync()``. Per-event filters and
+    counts read this table, where they are index range scans on
+    ``(event, status)`` rather than ORs across the wide columns.
+    """
+    member = models.ForeignKey(FamilyMember, on_delete=models.CASCADE, related_name='invitations')
+    event = models.CharField(max_length=20, choices=Event.EVENT_CHOICES)
+    status = models.CharField(max_length=20, choices=FamilyMember.RSVP_STATUS_CHOICES, default='pending')
+    headcount = models.PositiveIntegerField(default=0)
+
+    objects = InvitationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Also the (member, event) index used by sync() and per-member lookups
+            models.UniqueConstraint(fields=['member', 'event'], name='invitation_member_event_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'status'], name='invitation_event_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member.name} - {self.get_event_display()} ({self.status})"
+
+
+class RsvpCounters(models.Model):
+    """
+    Denormalized RSVP counts, kept current by every write path.
+
+    One row per event (member-level counts) plus two summary rows:
+    ``families`` (invited = total families, attending = responded,
+    pending = awaiting response) and ``members`` (invited = total members).
+    """
+    FAMILIES = 'families'
+    MEMBERS = 'members'
+    SCOPE_CHOICES = Event.EVENT_CHOICES + [
+        (FAMILIES, 'Families'),
+        (MEMBERS, 'Members'),
+    ]
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, unique=True)
+    invited = models.IntegerField(default=0)
+    attending = models.IntegerField(default=0)
+    declined = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "RSVP Counters"
+        verbose_name_plural = "RSVP Counters"
+    
+    def __str__(self):
+        return f"{self.get_scope_display()}: {self.invited} invited, {self.attending} attending"
+
+
+class OutboundEmail(models.Model):
+    """
+    Transactional email waiting to be sent (the outbox).
+
+    Views enqueue rows; ``manage.py run_mail_worker`` renders and sends
+    them, so a slow mail server never holds up a request.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    
+    TEMPLATE_CHOICES = [
+        ('forgot_code', 'Forgot RSVP code'),
+        ('invitation', 'Invitation'),
+    ]
+    
+    template = models.CharField(max_length=50, choices=TEMPLATE_CHOICES)
+    to_email = models.EmailField()
+    guest = models.ForeignKey(Guest, on_delete=models.SET_NULL, null=True, blank=True, related_name='emails')
+    context = models.JSONField(default=dict, blank=True, help_text="Template context")
+    dedupe_key = models.CharField(
+        max_length=100,
+        unique=True,
+        null=True,
+        blank=True,
+        help_text="Set for one-per-guest emails (e.g. invitation:<guest id>:<rsvp code>) so they are queued once"
+    )
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        ordering = ['-created_at']
+        indexes = [
+            # The worker's claim query: due messages in order
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_template_display()} to {self.to_email} ({self.status})"
+
+
 class WeddingInfo(models.Model):
     """General wedding information (singleton model)"""
     partner1_name = models.CharField(max_length=100, default="Sarah")
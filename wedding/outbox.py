@@ -0,0 +1,329 @@
+"""
+Durable outbox for transactional email.
+
+Views call ``enqueue()``, which only inserts an ``OutboundEmail`` row, so
+their response time no longer depends on the mail server.
+``manage.py run_mail_worker`` drains the outbox through a ``MailWorker``:
+
+* Due messages are claimed in batches (``SELECT ... FOR UPDATE SKIP LOCKED``
+  where supported) under a lease, so several workers can run side by side
+  and a crashed worker's claims are picked up once the lease expires.
+* Each batch is sent over one mail connection.
+* Failures are retried with exponential backoff until
+  ``MAIL_MAX_ATTEMPTS``, then marked failed with the last error.
+* Connection-level failures (server down, timeouts) feed a circuit
+  breaker; while it is open the worker stops claiming, then tries again
+  with a single probe batch.
+* Templates are compiled once per worker and rendered per message.
+* A message's context is cleared once it is sent or given up on, so RSVP
+  codes don't stay in the table.
+
+Any Django email backend works, so the console and locmem backends (or a
+local SMTP stand-in) exercise the full path.
+"""
+
+import logging
+import random
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils import timezone
+from .models import OutboundEmail
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'MAIL_BATCH_SIZE', 50)
+
+MAX_ATTEMPTS = getattr(settings, 'MAIL_MAX_ATTEMPTS', 8)
+
+# Retry delays double from the base up to the cap (seconds)
+RETRY_BASE_DELAY = getattr(settings, 'MAIL_RETRY_BASE_DELAY', 30)
+RETRY_MAX_DELAY = getattr(settings, 'MAIL_RETRY_MAX_DELAY', 60 * 60)
+
+# Consecutive connection failures that open the breaker, and how long it stays open
+BREAKER_THRESHOLD = getattr(settings, 'MAIL_BREAKER_THRESHOLD', 3)
+BREAKER_COOLDOWN = getattr(settings, 'MAIL_BREAKER_COOLDOWN', 60)
+
+# Seconds a claimed message stays reserved for the worker that claimed it
+CLAIM_LEASE = getattr(settings, 'MAIL_CLAIM_LEASE', 5 * 60)
+
+# The server rejected this message; other messages may still go through
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# template -> base path; <base>_subject.txt, <base>.txt and <base>.html
+EMAIL_TEMPLATES = {
+    'forgot_code': 'wedding/email/forgot_code',
+    'invitation': 'wedding/email/invitation',
+}
+
+
+def enqueue(template, to_email, context, guest=None):
+    """Queue an email for the mail worker; returns the OutboundEmail"""
+    if template not in EMAIL_TEMPLATES:
+        raise ValueError(f'Unknown email template: {template}')
+    return OutboundEmail.objects.create(template=template, to_email=to_email, context=context, guest=guest)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, with jitter so retries spread out"""
+    delay = min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+@contextmanager
+def _claim_transaction():
+    """
+    ``transaction.atomic()`` for a claim, which reads and then writes. On
+    SQLite such a transaction fails with "database is locked", rather than
+    waiting, when another sender has written in the meantime, so it starts
+    with BEGIN IMMEDIATE and queues for the write lock instead.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+    connection.ensure_connection()
+    mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic():
+            # BEGIN has been sent; nested blocks are savepoints
+            connection.transaction_mode = mode
+            yield
+    finally:
+        connection.transaction_mode = mode
+
+
+class EmailTemplates:
+    """Compiled subject/text/html templates, loaded once per process"""
+
+    def __init__(self, paths=EMAIL_TEMPLATES):
+        self.paths = paths
+        self._compiled = {}
+
+    def _get(self, name):
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            base = self.paths[name]
+            compiled = (
+                get_template(f'{base}_subject.txt'),
+                get_template(f'{base}.txt'),
+                get_template(f'{base}.html'),
+            )
+            self._compiled[name] = compiled
+        return compiled
+
+    def render(self, message):
+        subject, text, html = self._get(message.template)
+        context = message.context
+        email = EmailMultiAlternatives(
+            subject=' '.join(subject.render(context).split()),
+            body=text.render(context),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[message.to_email],
+        )
+        email.attach_alternative(html.render(context), 'text/html')
+        return email
+
+
+class CircuitBreaker:
+    """Stops sending after repeated connection failures, then probes after a cooldown"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def retry_in(self):
+        """Seconds until a probe is allowed (0 when closed or due)"""
+        if self.opened_at is None:
+            return 0
+        return max(0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        return self.retry_in() == 0
+
+    def record_success(self):
+        if self.is_open:
+            logger.info('Mail server reachable again; circuit closed')
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if not self.is_open:
+                logger.warning('Mail circuit opened after %d connection failures', self.failures)
+            # Re-opened on a failed probe: wait a full cooldown again
+            self.opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Token bucket shared by sending threads: at most ``rate`` messages per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class MailWorker:
+    """
+    Claims due messages in batches and sends each batch over one connection.
+
+    With ``keep_alive`` the connection stays open between batches (reopened
+    after a failure) until ``close()``; ``queryset`` narrows what is claimed;
+    ``rate_limiter`` paces individual sends.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, breaker=None, templates=None,
+                 queryset=None, rate_limiter=None, keep_alive=False):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self.templates = templates or EmailTemplates()
+        self.queryset = queryset if queryset is not None else OutboundEmail.objects.all()
+        self.rate_limiter = rate_limiter
+        self.keep_alive = keep_alive
+        self._mail_connection = None
+
+    def claim(self):
+        """Reserve up to batch_size due messages for this worker"""
+        now = timezone.now()
+        due = self.queryset.filter(
+            status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING],
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        with _claim_transaction():
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            pks = list(due.values_list('pk', flat=True)[:self.batch_size])
+            OutboundEmail.objects.filter(pk__in=pks).update(
+                status=OutboundEmail.SENDING,
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE),
+            )
+        return list(OutboundEmail.objects.filter(pk__in=pks).order_by('next_attempt_at', 'created_at'))
+
+    def run_once(self):
+        """Claim and send one batch; returns {'sent', 'retried', 'failed', 'deferred'} counts"""
+        stats = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0}
+        if not self.breaker.allow():
+            return stats
+        messages = self.claim()
+        if messages:
+            self.send(messages, stats)
+        return stats
+
+    def _open(self):
+        if self._mail_connection is None:
+            mail_connection = get_connection(fail_silently=False)
+            mail_connection.open()
+            self._mail_connection = mail_connection
+        return self._mail_connection
+
+    def close(self):
+        mail_connection, self._mail_connection = self._mail_connection, None
+        if mail_connection is not None:
+            try:
+                mail_connection.close()
+            except Exception:
+                pass
+
+    def send(self, messages, stats):
+        try:
+            mail_connection = self._open()
+        except Exception as e:
+            self.breaker.record_failure()
+            self._release(messages, e, stats)
+            return
+
+        sent = []
+        try:
+            for index, message in enumerate(messages):
+                try:
+                    email = self.templates.render(message)
+                except (KeyError, TemplateDoesNotExist) as e:
+                    self._fail(message, f'Cannot render: {e!r}', stats)
+                    continue
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                try:
+                    mail_connection.send_messages([email])
+                except MESSAGE_ERRORS as e:
+                    self._retry(message, e, stats)
+                except Exception as e:
+                    # The connection itself is broken: stop this batch
+                    self.breaker.record_failure()
+                    self.close()
+                    self._retry(message, e, stats)
+                    self._release(messages[index + 1:], e, stats)
+                    break
+                else:
+                    self.breaker.record_success()
+                    sent.append(message.pk)
+        finally:
+            if not self.keep_alive:
+                self.close()
+            if sent:
+                OutboundEmail.objects.filter(pk__in=sent).update(
+                    status=OutboundEmail.SENT, sent_at=timezone.now(), last_error='', context={},
+                )
+                stats['sent'] += len(sent)
+
+    def _retry(self, message, error, stats):
+        if message.attempts >= self.max_attempts:
+            self._fail(message, repr(error), stats)
+            return
+        message.status = OutboundEmail.PENDING
+        message.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(message.attempts))
+        message.last_error = repr(error)
+        message.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+        stats['retried'] += 1
+
+    def _fail(self, message, error, stats):
+        logger.error('Giving up on email %s to %s: %s', message.pk, message.to_email, error)
+        message.status = OutboundEmail.FAILED
+        message.last_error = error
+        message.context = {}
+        message.save(update_fields=['status', 'last_error', 'context'])
+        stats['failed'] += 1
+
+    def _release(self, messages, error, stats):
+        """Hand back claimed messages that were never tried; no attempt is used up"""
+        if messages:
+            OutboundEmail.objects.filter(pk__in=[m.pk for m in messages]).update(
+                status=OutboundEmail.PENDING,
+                attempts=F('attempts') - 1,
+                next_attempt_at=timezone.now(),
+                last_error=repr(error),
+            )
+            stats['deferred'] += len(messages)
@@ -0,0 +1,194 @@
+"""
+Keyset pagination and cheap result counts for large guest lists.
+
+Offset pagination gets slower with every page (the database still walks
+the skipped rows) and needs an exact ``COUNT(*)``. ``keyset_page`` instead
+continues from the last row shown: pages are ordered by a unique key such
+as ``(name, id)`` and fetched with ``WHERE (name, id) > (last name, last
+id) LIMIT n``, which an index on those columns answers in constant time
+however deep the page.
+
+``approximate_count`` bounds the cost of the total shown next to the
+results: an unfiltered table on PostgreSQL uses the planner's row
+estimate, and anything else is counted only up to ``COUNT_LIMIT`` rows.
+``ApproximatePaginator`` puts the same count behind Django's paginator
+API for the admin changelists.
+"""
+
+import base64
+import binascii
+import json
+from typing import NamedTuple
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+# Filtered results are counted exactly up to this many rows
+COUNT_LIMIT = getattr(settings, 'APPROXIMATE_COUNT_LIMIT', 10000)
+
+
+def encode_cursor(values):
+    data = json.dumps([str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """
+    Values of ``model``'s key ``fields`` from a cursor, converted by each
+    field, or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != len(fields) or not all(isinstance(v, str) for v in values):
+        return None
+    try:
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except ValidationError:
+        return None
+
+
+def _after(fields, values, descending=False):
+    """Rows strictly after ``values`` in ``fields`` order (row-value comparison)"""
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for index in range(len(fields) - 1, -1, -1):
+        step = Q(**{f'{fields[index]}__{lookup}': values[index]})
+        if index < len(fields) - 1:
+            step |= Q(**{fields[index]: values[index]}) & condition
+        condition = step
+    # Redundant bound on the leading column: planners use it as the index
+    # range start, where the OR alone would be a filter over every row
+    return Q(**{f'{fields[0]}__{lookup}e': values[0]}) & condition
+
+
+class KeysetPage:
+    """One page of rows plus cursors for the pages either side"""
+
+    def __init__(self, object_list, fields, has_next, has_previous):
+        self.object_list = object_list
+        self.fields = fields
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, field) for field in self.fields])
+
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self.has_next else None
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self.has_previous else None
+
+
+def keyset_page(queryset, fields, per_page, after=None, before=None):
+    """
+    A page of ``queryset`` ordered by ``fields`` (which must be unique
+    together), following the ``after`` cursor or preceding ``before``.
+    """
+    if before:
+        values = decode_cursor(before, queryset.model, fields)
+        if values is not None:
+            rows = list(
+                queryset.filter(_after(fields, values, descending=True))
+                .order_by(*[f'-{field}' for field in fields])[:per_page + 1]
+            )
+            has_previous = len(rows) > per_page
+            return KeysetPage(rows[:per_page][::-1], fields, has_next=True, has_previous=has_previous)
+
+    values = decode_cursor(after, queryset.model, fields)
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values))
+    rows = list(queryset.order_by(*fields)[:per_page + 1])
+    return KeysetPage(rows[:per_page], fields, has_next=len(rows) > per_page, has_previous=values is not None)
+
+
+class ApproximateCount(NamedTuple):
+    value: int
+    estimated: bool = False  # planner statistics, not a count
+    at_least: bool = False   # counting stopped at the limit
+
+    def __str__(self):
+        return f"{'~' if self.estimated else ''}{self.value}{'+' if self.at_least else ''}"
+
+
+def approximate_count(queryset, limit=COUNT_LIMIT):
+    """
+    Row count for a queryset without an unbounded COUNT(*).
+
+    Unfiltered PostgreSQL tables use ``pg_class.reltuples``; anything else
+    is counted up to ``limit`` rows.
+    """
+    connection = connections[queryset.db]
+    if not queryset.query.where and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 (or 0) before the first ANALYZE: fall through and count
+        if row and row[0] > limit:
+            return ApproximateCount(int(row[0]), estimated=True)
+
+    # Only the key in the counted subquery, not the caller's annotations
+    count = queryset.order_by().values('pk')[:limit].count()
+    return ApproximateCount(count, at_least=count >= limit)
+
+
+class ApproximatePaginator(Paginator):
+    """
+    Paginator counting with ``approximate_count`` instead of COUNT(*).
+
+    When the total is an estimate or a lower bound, pages past it are
+    still served (empty if there really are no rows there) and the last
+    page is not clamped to the estimate.
+    """
+
+    @cached_property
+    def approximate_count(self):
+        return approximate_count(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self.approximate_count.value
+
+    @property
+    def exact(self):
+        return not (self.approximate_count.estimated or self.approximate_count.at_least)
+
+    def validate_number(self, number):
+        if self.exact:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if self.exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
@@ -0,0 +1,145 @@
+"""
+Pre-rendered public home page.
+
+The home page only changes when ``WeddingInfo``, ``Event`` or
+``StoryMilestone`` rows do, so it is rendered once to
+``PRERENDER_ROOT/home.html`` (plus a gzip copy) and served from disk
+through WhiteNoise, which handles ``Accept-Encoding``, ``ETag`` and
+conditional requests. Saves and deletes of those models rebuild it after
+commit (see ``signals``); ``manage.py prerender_home`` rebuilds it by hand.
+
+Each process re-opens the artifact when its mtime changes, so a rebuild by
+any worker is picked up by all of them. Artifacts older than
+``PRERENDER_HOME_MAX_AGE`` seconds are rebuilt on the next request, which
+covers edits made on another host with its own disk.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.template.loader import render_to_string
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import StaticFile
+from .catalog import get_catalog
+from .models import StoryMilestone, WeddingInfo
+
+
+logger = logging.getLogger(__name__)
+
+PRERENDER_ROOT = getattr(settings, 'PRERENDER_ROOT', os.path.join(settings.BASE_DIR, 'prerendered'))
+
+# Seconds before an artifact is considered stale and rebuilt on request
+MAX_AGE = getattr(settings, 'PRERENDER_HOME_MAX_AGE', 600)
+
+HOME_PATH = os.path.join(PRERENDER_ROOT, 'home.html')
+
+# Browsers revalidate every time; unchanged pages cost a 304
+RESPONSE_HEADERS = [
+    ('Content-Type', 'text/html; charset=utf-8'),
+    ('Cache-Control', 'no-cache'),
+]
+
+DEFAULT_WEDDING_INFO = {
+    'partner1_name': 'Prit',
+    'partner2_name': 'Khushboo',
+    'wedding_date': '2025-12-28',
+    'location': 'Mumbai, India',
+    'hashtag': '#PritniKhushi',
+    'welcome_title': 'Welcome to Our Wedding',
+    'welcome_message': 'We are so excited to celebrate our special day with you! Join us for a beautiful celebration of love, laughter, and happily ever after.',
+}
+
+DEFAULT_MILESTONES = [
+    {'year': '2018', 'title': 'How We Met', 'description': 'It all started at a mutual friend\'s birthday party. Across a crowded room, our eyes met, and we knew something magical was beginning.'},
+    {'year': '2019', 'title': 'The First Date', 'description': 'Our first official date was at a cozy café downtown. We were both so nervous, but within minutes, it felt like we had known each other forever.'},
+    {'year': '2021', 'title': 'Moving In Together', 'description': 'After two wonderful years of dating, we decided to take the next step. We found our perfect little apartment and started building our life together.'},
+    {'year': '2024', 'title': 'The Proposal', 'description': 'On a beautiful sunset evening at our favorite beach, Michael got down on one knee and asked the question that would change our lives forever.'},
+    {'year': '2025', 'title': 'Forever Begins', 'description': 'And now, we\'re ready to begin our forever journey together. We can\'t wait to celebrate this new chapter with all of you.'},
+]
+
+
+def home_context():
+    """Template context for the home page, with defaults for empty tables"""
+    return {
+        'wedding_info': WeddingInfo.objects.first() or DEFAULT_WEDDING_INFO,
+        'events': get_catalog().events,
+        'milestones': list(StoryMilestone.objects.all()) or DEFAULT_MILESTONES,
+    }
+
+
+def render_home():
+    return render_to_string('wedding/home.html', home_context())
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_home():
+    """Render the home page to disk (gzip copy first, so the pair stays consistent)"""
+    html = render_home().encode('utf-8')
+    os.makedirs(PRERENDER_ROOT, exist_ok=True)
+    _write_atomic(f'{HOME_PATH}.gz', gzip.compress(html, compresslevel=9, mtime=0))
+    _write_atomic(HOME_PATH, html)
+    return HOME_PATH
+
+
+def rebuild_quietly():
+    """on_commit hook: a failed rebuild must not break the admin save"""
+    try:
+        build_home()
+    except OSError:
+        logger.exception('Could not pre-render the home page')
+
+
+class PrerenderedPage:
+    """A pre-rendered file served through WhiteNoise, reloaded when it changes"""
+
+    def __init__(self, path, build, max_age=MAX_AGE):
+        self.path = path
+        self.build = build
+        self.max_age = max_age
+        self._static_file = None
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self, stat):
+        return stat is None or time.time() - stat.st_mtime > self.max_age
+
+    def static_file(self):
+        stat = self._stat()
+        if self._is_stale(stat):
+            with self._lock:
+                stat = self._stat()
+                if self._is_stale(stat):
+                    self.build()
+                    stat = self._stat()
+        if stat.st_mtime_ns != self._mtime_ns:
+            with open(self.path, 'rb') as f:
+                etag = hashlib.sha1(f.read()).hexdigest()[:16]
+            self._static_file = StaticFile(
+                self.path,
+                RESPONSE_HEADERS + [('ETag', f'"{etag}"')],
+                encodings={'gzip': f'{self.path}.gz'},
+            )
+            self._mtime_ns = stat.st_mtime_ns
+        return self._static_file
+
+    def serve(self, request):
+        return WhiteNoiseMiddleware.serve(self.static_file(), request)
+
+
+home_page = PrerenderedPage(HOME_PATH, build_home)
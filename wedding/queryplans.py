@@ -0,0 +1,106 @@
+"""
+Query plans of the hot lookup paths.
+
+Each entry in HOT_QUERIES mirrors a query the site runs on every request
+of some page (or for every row of an import) and names the index it is
+meant to use. ``check()`` runs EXPLAIN on each and reports any that would
+read a whole table instead. On PostgreSQL sequential scans are disabled
+for the EXPLAIN, so the answer does not depend on how many rows the
+database holds: a plan that still scans has no usable index.
+"""
+
+import re
+import uuid
+from typing import Callable, NamedTuple, Optional
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import FamilyMember, Guest, Invitation, OutboundEmail
+
+
+class HotQuery(NamedTuple):
+    name: str
+    build: Callable  # () -> QuerySet
+    index: Optional[str] = None  # index the plan should use; None when its name is backend-specific
+
+
+HOT_QUERIES = [
+    HotQuery(
+        'rsvp code lookup',
+        lambda: Guest.objects.filter(rsvp_code='ABCD2345'),
+    ),
+    HotQuery(
+        'forgot code: guest by email',
+        lambda: Guest.objects.with_email('guest@example.com'),
+        'guest_email_lower_idx',
+    ),
+    HotQuery(
+        'import: guest by name',
+        lambda: Guest.objects.named('The Smith Family'),
+        'guest_name_lower_idx',
+    ),
+    HotQuery(
+        'dashboard: recent RSVPs',
+        lambda: Guest.objects.filter(has_responded=True).order_by('-rsvp_submitted_at')[:10],
+        'guest_responded_at_idx',
+    ),
+    HotQuery(
+        'guest list: first page',
+        lambda: Guest.objects.order_by('name', 'id')[:50],
+        'guest_name_id_idx',
+    ),
+    HotQuery(
+        'rsvp form: family members',
+        lambda: FamilyMember.objects.filter(family_id=uuid.uuid4()).order_by('order', 'name'),
+        'member_family_order_idx',
+    ),
+    HotQuery(
+        'event filter: invitations by status',
+        lambda: Invitation.objects.for_event('wedding').with_status('attending'),
+        'invitation_event_status_idx',
+    ),
+    HotQuery(
+        'mail worker: due messages',
+        lambda: OutboundEmail.objects.filter(
+            status__in=[OutboundEmail.PENDING, OutboundEmail.SENDING],
+            next_attempt_at__lte=timezone.now(),
+        ).order_by('next_attempt_at'),
+        'outbox_due_idx',
+    ),
+]
+
+
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (\w+)(?!.*\bUSING\b)')
+POSTGRES_SCAN_RE = re.compile(r'\bSeq Scan on (\w+)')
+
+
+def explain(queryset, using=None):
+    """EXPLAIN output for ``queryset``, with sequential scans discouraged on PostgreSQL"""
+    using = using or queryset.db
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.using(using).explain()
+
+
+def sequential_scans(plan, vendor):
+    """Tables ``plan`` reads in full"""
+    if vendor == 'postgresql':
+        return POSTGRES_SCAN_RE.findall(plan)
+    if vendor == 'sqlite':
+        return [table for table in SQLITE_SCAN_RE.findall(plan) if table.startswith('wedding_')]
+    raise NotImplementedError(f'Query plans are not checked on {vendor}')
+
+
+def check(queries=HOT_QUERIES, using='default'):
+    """[(query, plan, problems)] for each hot query; problems is empty when it is indexed"""
+    vendor = connections[using].vendor
+    results = []
+    for query in queries:
+        plan = explain(query.build(), using)
+        problems = [f'sequential scan of {table}' for table in sequential_scans(plan, vendor)]
+        if query.index and query.index not in plan:
+            problems.append(f'does not use {query.index}')
+        results.append((query, plan, problems))
+    return results
@@ -0,0 +1,440 @@
+"""
+Indexed, ranked search over families and family members.
+
+One query string is matched against guest name, party name, email, RSVP
+code and member names. Each database finds candidates with its own index:
+
+* PostgreSQL - ``pg_trgm`` GIN indexes (migration 0007) answer substring
+  (``ILIKE '%q%'``) and fuzzy word-similarity (``q <% name``) matches.
+* SQLite - FTS5 tables with the trigram tokenizer mirror the guest and
+  member tables through triggers. They hold derived data, so
+  ``install_sqlite_search`` (run after every ``migrate``) recreates them
+  and their triggers if missing, for example after Django rebuilt a table
+  during a schema change, and re-indexes from the base tables. Typo
+  tolerance comes from matching any of the query's trigrams, ranked by
+  bm25.
+* PostgreSQL without ``pg_trgm`` and other databases fall back to
+  unindexed substring matches; queries shorter than a trigram use
+  bounded prefix matches everywhere.
+
+Candidates from every backend are then ranked the same way in Python
+(exact/prefix/word-prefix/substring/trigram similarity), so results don't
+depend on the database. Ranking works on at most ``CANDIDATE_LIMIT``
+candidates per table; ``family_filter`` and ``member_filter`` instead
+return the backend's substring predicate as a ``Q``, uncapped, for the
+admin changelists, which page and count their own results.
+"""
+
+import re
+from contextlib import contextmanager
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import FamilyMember, Guest
+
+
+# Results returned to callers
+SEARCH_LIMIT = 100
+
+# Candidates fetched from the index before ranking
+CANDIDATE_LIMIT = 500
+
+# Shorter queries have no trigram to look up
+MIN_TRIGRAM_QUERY = 3
+
+# Member-name matches rank slightly below matches on the family itself
+MEMBER_WEIGHT = 0.95
+
+GUEST_FIELDS = ('name', 'party_name', 'email', 'rsvp_code')
+
+SQLITE_GUEST_TABLE = 'wedding_guest_search'
+SQLITE_MEMBER_TABLE = 'wedding_familymember_search'
+
+
+def normalize_query(query):
+    return ' '.join((query or '').split())[:100]
+
+
+def trigrams(text):
+    text = f'  {text.lower()} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def text_score(query, text):
+    """How well ``text`` matches ``query``, from 0 to 1"""
+    if not text:
+        return 0.0
+    query, text = query.lower(), text.lower()
+    if text == query:
+        return 1.0
+    if text.startswith(query):
+        return 0.9
+    if re.search(r'\b' + re.escape(query), text):
+        return 0.8
+    if query in text:
+        return 0.6
+    query_trigrams = trigrams(query)
+    # Best match against any single word, as with pg_trgm's word_similarity
+    best = max(
+        (len(query_trigrams & trigrams(word)) / len(query_trigrams | trigrams(word)) for word in text.split()),
+        default=0.0,
+    )
+    return 0.5 * best
+
+
+def guest_score(query, guest):
+    score = max(text_score(query, guest.get(field)) for field in ('name', 'party_name', 'email'))
+    if (guest.get('rsvp_code') or '').upper() == query.upper():
+        score = max(score, 1.0)
+    return score
+
+
+def like_pattern(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+class PrefixSearch:
+    """Bounded prefix matching, for short queries and other databases"""
+
+    def guest_candidates(self, query, limit):
+        return list(Guest.objects.filter(self.guest_filter(query)).values('id', *GUEST_FIELDS)[:limit])
+
+    def member_candidates(self, query, limit):
+        return list(
+            FamilyMember.objects.filter(self.member_name_filter(query)).values('id', 'family_id', 'name')[:limit]
+        )
+
+    def guest_filter(self, query):
+        return (
+            Q(name__istartswith=query) | Q(party_name__istartswith=query)
+            | Q(email__istartswith=query) | Q(rsvp_code=query.upper())
+        )
+
+    def member_name_filter(self, query):
+        return Q(name__istartswith=query)
+
+
+class ContainsSearch(PrefixSearch):
+    """Unindexed substring matching, where no search index is available"""
+
+    def guest_filter(self, query):
+        return (
+            Q(name__icontains=query) | Q(party_name__icontains=query)
+            | Q(email__icontains=query) | Q(rsvp_code=query.upper())
+        )
+
+    def member_name_filter(self, query):
+        return Q(name__icontains=query)
+
+
+class PostgresSearch:
+    """Substring and fuzzy matches served by the pg_trgm GIN indexes"""
+
+    GUEST_SQL = '''
+        SELECT id, name, party_name, email, rsvp_code
+        FROM wedding_guest
+        WHERE name ILIKE %(pattern)s OR party_name ILIKE %(pattern)s OR email ILIKE %(pattern)s
+           OR %(query)s <%% name OR %(query)s <%% party_name
+           OR rsvp_code = %(code)s
+        ORDER BY GREATEST(word_similarity(%(query)s, name), word_similarity(%(query)s, party_name),
+                          word_similarity(%(query)s, email)) DESC
+        LIMIT %(limit)s
+    '''
+
+    MEMBER_SQL = '''
+        SELECT id, family_id, name
+        FROM wedding_familymember
+        WHERE name ILIKE %(pattern)s OR %(query)s <%% name
+        ORDER BY word_similarity(%(query)s, name) DESC
+        LIMIT %(limit)s
+    '''
+
+    def _fetch(self, sql, query, limit):
+        params = {'query': query, 'pattern': like_pattern(query), 'code': query.upper(), 'limit': limit}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def guest_candidates(self, query, limit):
+        return self._fetch(self.GUEST_SQL, query, limit)
+
+    def member_candidates(self, query, limit):
+        return self._fetch(self.MEMBER_SQL, query, limit)
+
+    # Plain ILIKE on the indexed columns (icontains wraps them in UPPER())
+    def guest_filter(self, query):
+        pattern = like_pattern(query)
+        return Q(pk__in=RawSQL(
+            'SELECT id FROM wedding_guest WHERE name ILIKE %s OR party_name ILIKE %s OR email ILIKE %s '
+            'OR rsvp_code = %s',
+            [pattern, pattern, pattern, query.upper()],
+        ))
+
+    def member_name_filter(self, query):
+        return Q(pk__in=RawSQL('SELECT id FROM wedding_familymember WHERE name ILIKE %s', [like_pattern(query)]))
+
+
+class SqliteSearch:
+    """Substring matches, then any-trigram fuzzy matches, from the FTS5 side tables"""
+
+    @staticmethod
+    def _phrase(text):
+        """An FTS5 string: with the trigram tokenizer, a substring match"""
+        return '"' + text.replace('"', '""') + '"'
+
+    def _match_expressions(self, query):
+        """Exact substring first; for longer queries also any of its trigrams"""
+        quote = self._phrase
+        expressions = [quote(query)]
+        grams = sorted({query[i:i + 3].lower() for i in range(len(query) - 2)})
+        if len(query) > MIN_TRIGRAM_QUERY and grams:
+            expressions.append(' OR '.join(quote(gram) for gram in grams))
+        return expressions
+
+    def _fetch(self, sql, query, limit):
+        rows, seen = [], set()
+        with connection.cursor() as cursor:
+            for expression in self._match_expressions(query):
+                cursor.execute(sql, [expression, limit])
+                columns = [col[0] for col in cursor.description]
+                for row in cursor.fetchall():
+                    if row[0] not in seen:
+                        seen.add(row[0])
+                        rows.append(dict(zip(columns, row)))
+                if len(rows) >= limit:
+                    break
+        return rows[:limit]
+
+    def guest_candidates(self, query, limit):
+        rows = self._fetch(f'''
+            SELECT g.id, g.name, g.party_name, g.email, g.rsvp_code
+            FROM {SQLITE_GUEST_TABLE} JOIN wedding_guest g ON g.rowid = {SQLITE_GUEST_TABLE}.rowid
+            WHERE {SQLITE_GUEST_TABLE} MATCH %s
+            ORDER BY {SQLITE_GUEST_TABLE}.rank LIMIT %s
+        ''', query, limit)
+        if len(query) == 8:
+            # Codes are an exact lookup on the unique index
+            rows += PrefixSearch().guest_candidates(query, 1)
+        for row in rows:
+            row['id'] = Guest._meta.pk.to_python(row['id'])
+        return rows
+
+    def member_candidates(self, query, limit):
+        rows = self._fetch(f'''
+            SELECT m.id, m.family_id, m.name
+            FROM {SQLITE_MEMBER_TABLE} JOIN wedding_familymember m ON m.id = {SQLITE_MEMBER_TABLE}.rowid
+            WHERE {SQLITE_MEMBER_TABLE} MATCH %s
+            ORDER BY {SQLITE_MEMBER_TABLE}.rank LIMIT %s
+        ''', query, limit)
+        for row in rows:
+            row['family_id'] = Guest._meta.pk.to_python(row['family_id'])
+        return rows
+
+    def guest_filter(self, query):
+        return Q(pk__in=RawSQL(
+            f'SELECT g.id FROM {SQLITE_GUEST_TABLE} JOIN wedding_guest g ON g.rowid = {SQLITE_GUEST_TABLE}.rowid '
+            f'WHERE {SQLITE_GUEST_TABLE} MATCH %s',
+            [self._phrase(query)],
+        )) | Q(rsvp_code=query.upper())
+
+    def member_name_filter(self, query):
+        return Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_MEMBER_TABLE} WHERE {SQLITE_MEMBER_TABLE} MATCH %s', [self._phrase(query)],
+        ))
+
+
+_trigram_extension = {}
+
+
+def has_trigram_extension():
+    """Whether migration 0007 could install pg_trgm (checked once per process)"""
+    if connection.alias not in _trigram_extension:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_extension[connection.alias] = cursor.fetchone() is not None
+    return _trigram_extension[connection.alias]
+
+
+def get_backend(query):
+    if len(query) < MIN_TRIGRAM_QUERY:
+        return PrefixSearch()
+    if connection.vendor == 'postgresql' and has_trigram_extension():
+        return PostgresSearch()
+    if connection.vendor == 'sqlite':
+        return SqliteSearch()
+    return ContainsSearch()
+
+
+class Match:
+    """A ranked family, with the member whose name matched best (if any)"""
+
+    def __init__(self, guest_id, score, member=None):
+        self.guest_id = guest_id
+        self.score = score
+        self.member = member
+
+
+class Ranking(list):
+    """Ranked matches; ``capped`` if a candidate limit cut off further matches"""
+    capped = False
+
+
+def rank_families(query, limit=CANDIDATE_LIMIT):
+    """Family matches for ``query``, best first"""
+    query = normalize_query(query)
+    ranking = Ranking()
+    if not query:
+        return ranking
+    backend = get_backend(query)
+    matches = {}
+    guests = backend.guest_candidates(query, limit)
+    for guest in guests:
+        matches[guest['id']] = Match(guest['id'], guest_score(query, guest))
+    members = backend.member_candidates(query, limit)
+    for member in members:
+        score = MEMBER_WEIGHT * text_score(query, member['name'])
+        match = matches.get(member['family_id'])
+        if match is None or score > match.score:
+            matches[member['family_id']] = Match(member['family_id'], score, member)
+    ranking.extend(sorted(matches.values(), key=lambda match: -match.score))
+    ranking.capped = len(guests) >= limit or len(members) >= limit
+    return ranking
+
+
+class SearchResults(list):
+    """Guests, best first; ``truncated`` if more guests match than are listed"""
+    truncated = False
+
+
+def search_families(queryset, query, limit=SEARCH_LIMIT):
+    """Guests from ``queryset`` matching ``query``, best match first"""
+    results = SearchResults()
+    ranking = rank_families(query)
+    if not ranking:
+        return results
+    ranked = [match.guest_id for match in ranking]
+    by_pk = queryset.filter(pk__in=ranked).in_bulk()
+    found = [by_pk[pk] for pk in ranked if pk in by_pk]
+    results.extend(found[:limit])
+    results.truncated = len(found) > limit or ranking.capped
+    return results
+
+
+def family_filter(query):
+    """Q for families matching by their own fields or a member's name, uncapped"""
+    query = normalize_query(query)
+    if not query:
+        return Q()
+    backend = get_backend(query)
+    members = FamilyMember.objects.filter(backend.member_name_filter(query))
+    return backend.guest_filter(query) | Q(pk__in=members.values('family_id'))
+
+
+def member_filter(query):
+    """Q for members matching by their own name or their family's, uncapped"""
+    query = normalize_query(query)
+    if not query:
+        return Q()
+    backend = get_backend(query)
+    families = Guest.objects.filter(backend.guest_filter(query))
+    return backend.member_name_filter(query) | Q(family_id__in=families.values('pk'))
+
+
+def autocomplete(query, limit=10):
+    """Suggestions for the staff search box: one per family, best first"""
+    matches = rank_families(query)[:limit]
+    guests = Guest.objects.only('id', 'name', 'party_name', 'rsvp_code').in_bulk([m.guest_id for m in matches])
+    results = []
+    for match in matches:
+        guest = guests.get(match.guest_id)
+        if guest is None:
+            continue
+        family = guest.party_name or guest.name
+        results.append({
+            'type': 'member' if match.member else 'family',
+            'label': match.member['name'] if match.member else family,
+            'family': family,
+            'rsvp_code': guest.rsvp_code,
+        })
+    return results
+
+
+# SQLite side tables: external-content FTS5 indexes over the base tables,
+# maintained by triggers (see module docstring)
+SQLITE_SCHEMA = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_GUEST_TABLE} USING fts5(
+        name, party_name, email, rsvp_code, content='wedding_guest', tokenize='trigram')''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_GUEST_TABLE}_ai AFTER INSERT ON wedding_guest BEGIN
+        INSERT INTO {SQLITE_GUEST_TABLE}(rowid, name, party_name, email, rsvp_code)
+        VALUES (new.rowid, new.name, new.party_name, new.email, new.rsvp_code);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_GUEST_TABLE}_ad AFTER DELETE ON wedding_guest BEGIN
+        INSERT INTO {SQLITE_GUEST_TABLE}({SQLITE_GUEST_TABLE}, rowid, name, party_name, email, rsvp_code)
+        VALUES ('delete', old.rowid, old.name, old.party_name, old.email, old.rsvp_code);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_GUEST_TABLE}_au
+        AFTER UPDATE OF name, party_name, email, rsvp_code ON wedding_guest BEGIN
+        INSERT INTO {SQLITE_GUEST_TABLE}({SQLITE_GUEST_TABLE}, rowid, name, party_name, email, rsvp_code)
+        VALUES ('delete', old.rowid, old.name, old.party_name, old.email, old.rsvp_code);
+        INSERT INTO {SQLITE_GUEST_TABLE}(rowid, name, party_name, email, rsvp_code)
+        VALUES (new.rowid, new.name, new.party_name, new.email, new.rsvp_code);
+    END''',
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_MEMBER_TABLE} USING fts5(
+        name, content='wedding_familymember', content_rowid='id', tokenize='trigram')''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_MEMBER_TABLE}_ai AFTER INSERT ON wedding_familymember BEGIN
+        INSERT INTO {SQLITE_MEMBER_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_MEMBER_TABLE}_ad AFTER DELETE ON wedding_familymember BEGIN
+        INSERT INTO {SQLITE_MEMBER_TABLE}({SQLITE_MEMBER_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {SQLITE_MEMBER_TABLE}_au AFTER UPDATE OF name ON wedding_familymember BEGIN
+        INSERT INTO {SQLITE_MEMBER_TABLE}({SQLITE_MEMBER_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {SQLITE_MEMBER_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END''',
+]
+
+
+SQLITE_TRIGGERS = [
+    f'{table}_{suffix}' for table in (SQLITE_GUEST_TABLE, SQLITE_MEMBER_TABLE) for suffix in ('ai', 'ad', 'au')
+]
+
+
+def install_sqlite_search(using=None, **kwargs):
+    """post_migrate: (re)create the SQLite search tables and triggers, then re-index"""
+    from django.db import connections
+    db = connections[using or 'default']
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        if 'wedding_guest' not in tables or 'wedding_familymember' not in tables:
+            return
+        for statement in SQLITE_SCHEMA:
+            cursor.execute(statement)
+        # Table rebuilds renumber rowids; a full re-index is cheap and always correct
+        for table in (SQLITE_GUEST_TABLE, SQLITE_MEMBER_TABLE):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+@contextmanager
+def sqlite_search_deferred(using=None):
+    """
+    Bulk writes without the SQLite search triggers: they are dropped for
+    the block and reinstalled with a full re-index after it, which costs
+    far less than indexing hundreds of thousands of rows one by one.
+    """
+    from django.db import connections
+    db = connections[using or 'default']
+    if db.vendor != 'sqlite':
+        yield
+        return
+    with db.cursor() as cursor:
+        for trigger in SQLITE_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    try:
+        yield
+    finally:
+        install_sqlite_search(using)
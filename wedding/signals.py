@@ -0,0 +1,81 @@
+"""
+Signal handlers keeping in-process caches in step with model writes.
+
+Connected in ``WeddingConfig.ready()``: the RSVP code lookup cache, the
+event catalog, the pre-rendered home page, the ``Invitation`` rows
+mirroring each member's event columns and the cohort bitmap index. Bulk writes (``bulk_create``,
+``bulk_update``, ``QuerySet.update``) send no signals; code paths using
+them invalidate (or call ``Invitation.objects.sync()``) explicitly.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import catalog, cohorts, lookup, prerender
+from .models import Event, FamilyMember, Guest, Invitation, StoryMilestone, WeddingInfo
+
+
+# Member columns mirrored by Invitation rows
+INVITATION_FIELDS = frozenset(
+    f'{prefix}_{slug}' for prefix in ('invited', 'rsvp') for slug, _ in Event.EVENT_CHOICES
+)
+
+
+@receiver(post_save, sender=Guest)
+def guest_saved(sender, instance, update_fields=None, **kwargs):
+    # Saves that cannot have touched the code leave the lookup cache warm
+    if update_fields is not None and 'rsvp_code' not in update_fields:
+        return
+    lookup.remember(instance)
+
+
+@receiver(post_save, sender=Guest)
+def guest_response_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A new family has no members in the cohort index yet
+    if created or (update_fields is not None and 'has_responded' not in update_fields):
+        return
+    cohorts.family_responded(instance.pk, instance.has_responded)
+
+
+@receiver(post_delete, sender=Guest)
+def guest_deleted(sender, instance, **kwargs):
+    lookup.invalidate_guests([instance.pk])
+    lookup.invalidate_codes([instance.rsvp_code])
+
+
+@receiver(post_save, sender=FamilyMember)
+def member_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not INVITATION_FIELDS.intersection(update_fields):
+        return
+    Invitation.objects.sync([instance])
+
+
+@receiver(post_save, sender=FamilyMember)
+def member_cohorts_saved(sender, instance, **kwargs):
+    # Not instance.family: that is a query per member unless already loaded
+    responded = instance.family.has_responded if FamilyMember.family.is_cached(instance) else None
+    cohorts.member_saved(instance, responded)
+
+
+@receiver(post_delete, sender=FamilyMember)
+def member_deleted(sender, instance, **kwargs):
+    cohorts.member_deleted(instance.pk)
+
+
+# Registered before home_content_changed so the home page rebuild that
+# follows the same commit already sees the fresh catalog
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, **kwargs):
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(post_save, sender=WeddingInfo)
+@receiver(post_delete, sender=WeddingInfo)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=StoryMilestone)
+@receiver(post_delete, sender=StoryMilestone)
+def home_content_changed(sender, **kwargs):
+    # Render from committed data only; a rebuild takes a few milliseconds
+    transaction.on_commit(prerender.rebuild_quietly)
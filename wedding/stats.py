@@ -0,0 +1,93 @@
+"""
+RSVP statistics engine.
+
+Family-level numbers come from one aggregate over ``wedding_guest``;
+per-event member counts from one ``GROUP BY event, status`` over
+``wedding_invitation``, which the ``(event, status)`` index answers
+without touching the member rows.
+"""
+
+from django.db.models import Count, Q
+from .models import Event, Guest, Invitation
+
+
+EVENT_SLUGS = [slug for slug, _ in Event.EVENT_CHOICES]
+
+RSVP_STATUSES = ['attending', 'not_attending', 'pending']
+
+# Number of families shown in the dashboard "recent" and "pending" lists
+DASHBOARD_LIST_LIMIT = 20
+
+
+def _family_aggregates():
+    return {
+        'total_families': Count('id', distinct=True),
+        'responded': Count('id', distinct=True, filter=Q(has_responded=True)),
+        'total_members': Count('members'),
+    }
+
+
+def _event_counts(queryset=None):
+    """``{(event, status): members}`` for the given families (default: all)"""
+    invitations = Invitation.objects.all()
+    if queryset is not None:
+        invitations = invitations.filter(member__family__in=queryset.order_by().values('pk'))
+    rows = invitations.order_by().values('event', 'status').annotate(members=Count('*'))
+    return {(row['event'], row['status']): row['members'] for row in rows}
+
+
+def compute_rsvp_stats(queryset=None):
+    """
+    Compute every dashboard number in two queries.
+
+    ``queryset`` restricts the families (and their members) counted;
+    by default every family is included. Returns a dict with
+    ``total_families``, ``responded``, ``pending``, ``total_members`` and
+    ``events`` (slug -> invited/attending/not_attending/pending/total_guests).
+    """
+    families = queryset if queryset is not None else Guest.objects.all()
+    row = families.order_by().aggregate(**_family_aggregates())
+    counts = _event_counts(queryset)
+
+    events = {}
+    for slug in EVENT_SLUGS:
+        by_status = {status: counts.get((slug, status), 0) for status in RSVP_STATUSES}
+        events[slug] = {
+            'invited': sum(by_status.values()),
+            'attending': by_status['attending'],
+            'not_attending': by_status['not_attending'],
+            'pending': by_status['pending'],
+            # Each member is one person, so attending members == headcount
+            'total_guests': by_status['attending'],
+        }
+
+    return {
+        'total_families': row['total_families'],
+        'responded': row['responded'],
+        'pending': row['total_families'] - row['responded'],
+        'total_members': row['total_members'],
+        'events': events,
+    }
+
+
+def response_rate(responded, total):
+    """Percentage of families that have responded, rounded to one decimal"""
+    return round((responded / total * 100) if total > 0 else 0, 1)
+
+
+def recent_rsvps(limit=DASHBOARD_LIST_LIMIT):
+    """Most recently submitted families, bounded and projected for list display"""
+    return list(
+        Guest.objects.filter(has_responded=True)
+        .order_by('-rsvp_submitted_at')
+        .only('name', 'party_name', 'rsvp_code', 'rsvp_submitted_at')[:limit]
+    )
+
+
+def pending_families(limit=DASHBOARD_LIST_LIMIT):
+    """First families (by name) still awaiting a response, bounded"""
+    return list(
+        Guest.objects.filter(has_responded=False)
+        .order_by('name')
+        .only('name', 'party_name', 'rsvp_code')[:limit]
+    )
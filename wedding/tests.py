@@ -1,3 +1,794 @@
-from django.test import TestCase
+"""
+Query and wall-time budgets for the site's views.
 
-# Create your tests here.
+Every hot view is requested against a generated guest list
+(QUERY_BUDGET_FAMILIES families, see ``wedding.datagen``). Queries are
+counted on a cold request, with every cache cleared first, and must stay
+within the view's budget: a view over budget usually means a new N+1 (a
+template or ``__str__`` reaching into a relation once per row). Timings
+are the median of a few warm requests. Wall time depends on the machine,
+so time budgets are only reported (over-budget views are marked ``!``)
+unless QUERY_BUDGET_CHECK_TIME=1 makes them fail the test; they are
+generous and only meant to catch gross regressions, and
+QUERY_BUDGET_TIME_SCALE stretches them on slow machines. Views whose work
+grows with the list (exports, event filters) get extra time per 1000
+families. A per-view report is printed at the end of the run.
+
+    QUERY_BUDGET_FAMILIES=20000 QUERY_BUDGET_CHECK_TIME=1 python manage.py test wedding
+
+The other test cases cover the bookkeeping behind those views: cohort
+expressions and bitmaps, counter deltas, resumable imports and RSVP
+code allocation.
+"""
+
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import smtplib
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from unittest import mock
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, reset_queries
+from django.db.models import Count, Q
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from . import catalog, cohorts, counters, datagen, importing, invitations, lookup, member_grid, outbox, paging, prerender, queryplans, search, tracking
+from .codes import CodeAllocator, allocate_codes
+from .models import RSVP_CODE_ALPHABET, RSVP_CODE_LENGTH, FamilyMember, Guest, Invitation, OutboundEmail
+
+
+QUERY_BUDGET_FAMILIES = int(os.environ.get('QUERY_BUDGET_FAMILIES', 2000))
+QUERY_BUDGET_TIME_SCALE = float(os.environ.get('QUERY_BUDGET_TIME_SCALE', 1))
+QUERY_BUDGET_CHECK_TIME = os.environ.get('QUERY_BUDGET_CHECK_TIME') == '1'
+
+SEED = 2026
+
+# Warm requests timed per view
+TIMED_RUNS = 3
+
+# view label -> (max queries on a cold request, max median ms, extra ms per 1000 families)
+VIEW_BUDGETS = {
+    'home': (3, 50, 0),
+    'rsvp_lookup GET': (0, 50, 0),
+    'rsvp_lookup POST': (1, 50, 0),
+    'rsvp_form GET': (5, 100, 0),
+    'rsvp_form GET (largest family)': (5, 100, 0),
+    'rsvp_form POST': (13, 200, 0),
+    'admin_dashboard': (5, 100, 0),
+    # One more query on PostgreSQL: paging.approximate_count asks the planner first
+    'admin_guest_list': (5, 200, 0),
+    'admin_guest_list (event filter)': (4, 200, 20),
+    'admin_guest_list (search)': (7, 200, 0),
+    'admin_guest_list (cohort)': (5, 200, 0),
+    'family_detail': (5, 50, 0),
+    'family_detail (largest family)': (5, 100, 0),
+    'export_guests_csv': (3, 50, 100),
+    'export_guests_csv (members)': (3, 100, 400),
+    'api_dashboard_stats': (4, 50, 0),
+    # As admin_guest_list: one more on PostgreSQL for the planner estimate
+    'admin_guest_changelist': (7, 300, 0),
+    'admin_guest_changelist (facets)': (9, 300, 50),
+    'admin_member_changelist': (6, 300, 0),
+    'admin_member_changelist (facets)': (8, 300, 50),
+    'admin_member_grid GET': (5, 100, 0),
+    'admin_member_grid POST': (12, 200, 0),
+}
+
+
+def reset_caches():
+    """Start from cold: shared caches, the code lookup cache, catalog and cohort index"""
+    for cache in caches.all():
+        cache.clear()
+    lookup.code_cache.clear()
+    catalog.invalidate()
+    cohorts.invalidate()
+
+
+def read_body(response):
+    """The whole response body, running a streaming response's queries"""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+@override_settings(PRERENDER_HOME=False)
+class ViewBudgetTests(TestCase):
+    report = []
+
+    @classmethod
+    def setUpTestData(cls):
+        datagen.generate(QUERY_BUDGET_FAMILIES, seed=SEED)
+        cls.staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+        families = Guest.objects.annotate(size=Count('members'))
+        cls.family = families.filter(size=4).order_by('rsvp_code').first()
+        cls.largest = families.order_by('-size', 'rsvp_code').first()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.print_report()
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.client.force_login(self.staff)
+
+    def tearDown(self):
+        # Buffered last_viewed_at writes belong to this test's database
+        tracking.flush()
+
+    def request(self, label, url, data=None, method='get', client=None, status=200):
+        """Request ``url`` cold and then warm; assert it stays within its budget. Returns (response, body)"""
+        client = client or self.client
+        send = getattr(client, method)
+        max_queries, max_ms, per_thousand = VIEW_BUDGETS[label]
+        max_ms = (max_ms + per_thousand * QUERY_BUDGET_FAMILIES / 1000) * QUERY_BUDGET_TIME_SCALE
+
+        reset_caches()
+        # The request resets the query log as it starts; so must the capture
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            response = send(url, data)
+            body = read_body(response)
+        # Read now: later requests reset the log the capture slices
+        queries = captured.captured_queries
+        self.assertEqual(response.status_code, status, label)
+
+        timings = []
+        for _ in range(TIMED_RUNS):
+            started = time.perf_counter()
+            read_body(send(url, data))
+            timings.append((time.perf_counter() - started) * 1000)
+        elapsed = statistics.median(timings)
+
+        self.report.append((label, len(queries), max_queries, elapsed, max_ms))
+        sql = '\n'.join(query['sql'] for query in queries)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f'{label}: {len(queries)} queries, budget {max_queries}\n{sql}',
+        )
+        if QUERY_BUDGET_CHECK_TIME:
+            self.assertLessEqual(elapsed, max_ms, f'{label}: {elapsed:.1f} ms, budget {max_ms:.0f} ms')
+        return response, body
+
+    @classmethod
+    def print_report(cls):
+        if not cls.report:
+            return
+        out = sys.stderr
+        out.write(f'\nView budgets ({QUERY_BUDGET_FAMILIES} families)\n')
+        out.write(f"{'view':<36} {'queries':>12} {'median ms':>18}\n")
+        for label, queries, max_queries, elapsed, max_ms in sorted(cls.report):
+            out.write(
+                f'{label:<36} {queries:>5} / {max_queries:<4} '
+                f"{elapsed:>8.1f} / {max_ms:<7.0f}{' !' if elapsed > max_ms else ''}\n"
+            )
+        cls.report.clear()
+
+    def test_home(self):
+        self.request('home', reverse('wedding:home'), client=self.guest_client)
+
+    def test_rsvp_lookup(self):
+        url = reverse('wedding:rsvp_lookup')
+        self.request('rsvp_lookup GET', url, client=self.guest_client)
+        self.request(
+            'rsvp_lookup POST', url, {'rsvp_code': self.family.rsvp_code},
+            method='post', client=self.guest_client, status=302,
+        )
+
+    def test_rsvp_form(self):
+        self.request('rsvp_form GET', reverse('wedding:rsvp_form', args=[self.family.rsvp_code]), client=self.guest_client)
+        self.request(
+            'rsvp_form GET (largest family)',
+            reverse('wedding:rsvp_form', args=[self.largest.rsvp_code]), client=self.guest_client,
+        )
+
+    def test_rsvp_form_post(self):
+        members = list(self.largest.members.all())
+        data = {'message': 'See you there!'}
+        for member in members:
+            for slug in datagen.EVENT_SLUGS:
+                if getattr(member, f'invited_{slug}'):
+                    data[f'rsvp_{slug}_{member.id}'] = 'attending'
+        self.request(
+            'rsvp_form POST', reverse('wedding:rsvp_form', args=[self.largest.rsvp_code]), data,
+            method='post', client=self.guest_client,
+        )
+        self.assertTrue(Guest.objects.get(pk=self.largest.pk).has_responded)
+
+    def test_admin_dashboard(self):
+        self.request('admin_dashboard', reverse('wedding:admin_dashboard'))
+
+    def test_admin_guest_list(self):
+        url = reverse('wedding:admin_guest_list')
+        self.request('admin_guest_list', url)
+        self.request('admin_guest_list (event filter)', url, {'event': 'mendhi', 'status': 'attending'})
+        self.request('admin_guest_list (search)', url, {'search': 'patel'})
+        self.request('admin_guest_list (cohort)', url, {'cohort': 'vidhi & family(grandmother)'})
+
+    def test_family_detail(self):
+        self.request('family_detail', reverse('wedding:family_detail', args=[self.family.rsvp_code]))
+        self.request(
+            'family_detail (largest family)', reverse('wedding:family_detail', args=[self.largest.rsvp_code]),
+        )
+
+    def test_export_guests_csv(self):
+        url = reverse('wedding:export_guests_csv')
+        _, body = self.request('export_guests_csv', url)
+        self.assertEqual(body.count(b'\n'), QUERY_BUDGET_FAMILIES + 1)
+        self.request('export_guests_csv (members)', url, {'mode': 'members'})
+
+    def test_api_dashboard_stats(self):
+        response, _ = self.request('api_dashboard_stats', reverse('wedding:api_dashboard_stats'))
+        self.assertEqual(response.json()['total'], QUERY_BUDGET_FAMILIES)
+
+    def test_admin_changelists(self):
+        for label, name in (
+            ('admin_guest_changelist', 'admin:wedding_guest_changelist'),
+            ('admin_member_changelist', 'admin:wedding_familymember_changelist'),
+        ):
+            url = reverse(name)
+            _, body = self.request(label, url)
+            self.assertEqual(body.count(b'name="_selected_action"'), 100, label)
+            self.request(f'{label} (facets)', url, {'_facets': 'True'})
+
+    def test_admin_search_finds_every_match(self):
+        # Not just the ranked search's CANDIDATE_LIMIT candidates
+        term = 'example'
+        expected = Guest.objects.filter(
+            Q(name__icontains=term) | Q(party_name__icontains=term) | Q(email__icontains=term)
+            | Q(members__name__icontains=term)
+        ).distinct().count()
+        self.assertGreater(expected, search.CANDIDATE_LIMIT)
+        response = self.client.get(reverse('admin:wedding_guest_changelist'), {'q': term})
+        self.assertEqual(response.context['cl'].result_count, expected)
+
+        response = self.client.get(reverse('wedding:admin_guest_list'), {'search': term})
+        self.assertTrue(response.context['search_truncated'])
+        self.assertContains(response, 'more guests match')
+
+    def test_admin_member_grid(self):
+        # Big families get the grid instead of a form per member
+        change_form = self.client.get(reverse('admin:wedding_guest_change', args=[self.largest.pk]))
+        self.assertNotContains(change_form, 'members-TOTAL_FORMS')
+        self.assertContains(change_form, 'Edit members in grid')
+
+        url = reverse('admin:wedding_guest_member_grid', args=[self.largest.pk])
+        _, body = self.request('admin_member_grid GET', url)
+        members = list(self.largest.members.all())
+        self.assertEqual(body.count(b'data-field="delete"'), len(members) + 1)
+
+        # Invite everyone to the mendhi and rename one member
+        rows = [member_grid.member_row(member) for member in members]
+        for row in rows:
+            row['invited']['mendhi'] = True
+        rows[0]['name'] = 'Renamed Member'
+        self.request(
+            'admin_member_grid POST', url,
+            {'payload': json.dumps({'members': rows}), '_continue': '1'}, method='post', status=302,
+        )
+        self.assertEqual(FamilyMember.objects.get(pk=rows[0]['id']).name, 'Renamed Member')
+        self.assertEqual(
+            Invitation.objects.filter(member__family=self.largest, event='mendhi').count(), len(members),
+        )
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_admin_member_grid_adds_and_removes_members(self):
+        url = reverse('admin:wedding_guest_member_grid', args=[self.largest.pk])
+        members = list(self.largest.members.all())
+        rows = [member_grid.member_row(member) for member in members]
+        rows[1]['delete'] = True
+        rows.append({'id': None, 'name': 'New Cousin', 'relation': 'cousin', 'invited': {'wedding': True}})
+        response = self.client.post(url, {'payload': json.dumps({'members': rows})})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(FamilyMember.objects.filter(pk=members[1].pk).exists())
+        cousin = FamilyMember.objects.get(family=self.largest, name='New Cousin')
+        self.assertEqual(cousin.order, len(members) - 1)
+        self.assertEqual(list(cousin.invitations.values_list('event', flat=True)), ['wedding'])
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+        # One bad row rejects the whole payload and every problem is reported
+        rows = [member_grid.member_row(member) for member in self.largest.members.all()]
+        rows[0]['name'] = 'Not Saved'
+        rows[1]['name'] = ''
+        rows[2]['rsvp']['vidhi'] = 'maybe'
+        response = self.client.post(url, {'payload': json.dumps({'members': rows})})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['errors']), 2)
+        self.assertFalse(FamilyMember.objects.filter(name='Not Saved').exists())
+
+        # Values of the wrong JSON type are row errors, not server errors
+        for bad in ({'relation': []}, {'id': []}, {'id': True}, {'rsvp': {'vidhi': {}}}):
+            rows = [dict(member_grid.member_row(self.largest.members.first()), **bad)]
+            response = self.client.post(url, {'payload': json.dumps({'members': rows})})
+            self.assertEqual(response.status_code, 200, bad)
+            self.assertEqual(len(response.context['errors']), 1, bad)
+
+    def test_admin_member_grid_checks_add_and_delete_permissions(self):
+        editor = User.objects.create_user('editor', 'editor@example.com', 'password', is_staff=True)
+        editor.user_permissions.set(Permission.objects.filter(
+            content_type__app_label='wedding', codename__in=['change_guest', 'change_familymember'],
+        ))
+        self.client.force_login(editor)
+        url = reverse('admin:wedding_guest_member_grid', args=[self.largest.pk])
+        response = self.client.get(url)
+        self.assertNotContains(response, 'id="member-grid-add"')
+        self.assertContains(response, 'data-field="delete" disabled')
+
+        members = list(self.largest.members.all())
+        rows = [member_grid.member_row(member) for member in members]
+        rows[1]['delete'] = True
+        rows.append({'id': None, 'name': 'New Cousin', 'relation': 'cousin', 'invited': {}})
+        response = self.client.post(url, {'payload': json.dumps({'members': rows})})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['errors']), 2)
+        self.assertEqual(self.largest.members.count(), len(members))
+
+    def test_admin_member_grid_numbers_left_out_members_after_the_listed_rows(self):
+        url = reverse('admin:wedding_guest_member_grid', args=[self.largest.pk])
+        members = list(self.largest.members.all())
+        rows = [member_grid.member_row(member) for member in members[2:]]
+        response = self.client.post(url, {'payload': json.dumps({'members': rows})})
+        self.assertEqual(response.status_code, 302)
+        order = [member.pk for member in self.largest.members.order_by('order')]
+        self.assertEqual(order, [member.pk for member in members[2:] + members[:2]])
+        self.assertEqual(
+            list(self.largest.members.order_by('order').values_list('order', flat=True)),
+            list(range(len(members))),
+        )
+
+    def test_query_count_does_not_grow_with_family_size(self):
+        for name in ('wedding:rsvp_form', 'wedding:family_detail'):
+            counts = []
+            for family in (self.family, self.largest):
+                reset_caches()
+                reset_queries()
+                with CaptureQueriesContext(connection) as captured:
+                    self.client.get(reverse(name, args=[family.rsvp_code]))
+                counts.append(len(captured))
+            self.assertEqual(counts[0], counts[1], name)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        for query, plan, problems in queryplans.check():
+            self.assertEqual(problems, [], f'{query.name}:\n{plan}')
+
+
+class EventFilterTests(TestCase):
+    def test_family_flag_and_member_invitations_both_count(self):
+        staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+        flagged = Guest.objects.create(name='Flagged Family', email='flagged@example.com', invited_vidhi=True)
+        by_member = Guest.objects.create(name='Member Family', email='member@example.com')
+        FamilyMember.objects.create(family=by_member, name='Invited Member', invited_vidhi=True)
+        Guest.objects.create(name='Uninvited Family', email='uninvited@example.com')
+
+        self.assertEqual(set(invitations.select_guests(event='vidhi')), {flagged, by_member})
+        self.client.force_login(staff)
+        response = self.client.get(reverse('wedding:admin_guest_list'), {'event': 'vidhi'})
+        self.assertEqual(set(response.context['guests']), {flagged, by_member})
+
+
+class KeysetPagingTests(TestCase):
+    def test_malformed_cursors_show_the_first_page(self):
+        staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+        Guest.objects.create(name='Paged Family')
+        self.client.force_login(staff)
+        url = reverse('wedding:admin_guest_list')
+        for cursor in [paging.encode_cursor(['A', 'zzz']), paging.encode_cursor(['A']), 'not base64!', 'WyJB']:
+            for direction in ['after', 'before']:
+                response = self.client.get(url, {direction: cursor})
+                self.assertEqual(response.status_code, 200, (direction, cursor))
+                self.assertEqual([guest.name for guest in response.context['guests']], ['Paged Family'])
+
+    def test_cursor_continues_after_the_last_row(self):
+        for name in ['Alpha', 'Bravo', 'Charlie']:
+            Guest.objects.create(name=name)
+        first = paging.keyset_page(Guest.objects.all(), ('name', 'id'), 2)
+        second = paging.keyset_page(Guest.objects.all(), ('name', 'id'), 2, after=first.next_cursor)
+        self.assertEqual([guest.name for guest in second], ['Charlie'])
+        back = paging.keyset_page(Guest.objects.all(), ('name', 'id'), 2, before=second.previous_cursor)
+        self.assertEqual([guest.name for guest in back], ['Alpha', 'Bravo'])
+
+
+class MemberChangelistTests(TestCase):
+    def test_members_are_listed_by_family_name(self):
+        staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+        for family_name in ['Zaveri Family', 'Amin Family', 'Mehta Family']:
+            family = Guest.objects.create(name=family_name)
+            for order, name in enumerate(['Second', 'First']):
+                FamilyMember.objects.create(family=family, name=f'{name} {family_name}', order=1 - order)
+
+        self.client.force_login(staff)
+        response = self.client.get(reverse('admin:wedding_familymember_changelist'))
+        self.assertEqual([member.name for member in response.context['cl'].result_list], [
+            'First Amin Family', 'Second Amin Family',
+            'First Mehta Family', 'Second Mehta Family',
+            'First Zaveri Family', 'Second Zaveri Family',
+        ])
+
+
+class CohortExpressionTests(SimpleTestCase):
+    def test_precedence_and_aliases(self):
+        self.assertEqual(
+            cohorts.parse('mendhi | vidhi & !wedding'),
+            ('or', ('term', 'mendhi'), ('and', ('term', 'vidhi'), ('not', ('term', 'wedding')))),
+        )
+        self.assertEqual(
+            cohorts.parse('NOT family(grandmother) and mendhi:not_attending'),
+            ('and', ('not', ('family', ('term', 'grandmother'))), ('term', 'mendhi:declined')),
+        )
+
+    def test_invalid_expressions(self):
+        for expression in ('', 'mendhi &', '(mendhi', 'mendhi)', 'family mendhi', 'cousins', 'mendhi:maybe', 'a + b'):
+            with self.assertRaises(cohorts.CohortError, msg=expression):
+                cohorts.parse(expression)
+
+
+class CohortIndexTests(SimpleTestCase):
+    """Bitset results against the same cohorts computed with Python sets"""
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.index = cohorts.CohortIndex()
+        self.members = {}  # member id -> (family id, terms)
+        member_id = 0
+        for family_id in range(40):
+            for _ in range(rng.randrange(1, 9)):
+                member_id += 1
+                self.set_member(member_id, family_id, rng)
+        # Upkeep: members moved, removed and added to full blocks
+        for member_id in rng.sample(sorted(self.members), 15):
+            self.set_member(member_id, rng.randrange(40), rng)
+        for member_id in rng.sample(sorted(self.members), 10):
+            self.index.remove_member(member_id)
+            del self.members[member_id]
+        for member_id in range(1000, 1030):
+            self.set_member(member_id, rng.randrange(45), rng)
+
+    def set_member(self, member_id, family_id, rng):
+        invited = {slug: rng.random() < 0.5 for slug in cohorts.EVENT_SLUGS}
+        statuses = {slug: rng.choice(list(cohorts.STATUS_TERMS)) for slug in cohorts.EVENT_SLUGS}
+        terms = cohorts.member_terms(rng.choice(cohorts.RELATIONS), False, invited, statuses)
+        self.index.set_member(member_id, family_id, terms)
+        self.members[member_id] = (family_id, set(terms))
+
+    def expected(self, predicate, widen=False):
+        ids = {member_id for member_id, (_, terms) in self.members.items() if predicate(terms)}
+        if widen:
+            families = {self.members[member_id][0] for member_id in ids}
+            ids = {member_id for member_id, (family_id, _) in self.members.items() if family_id in families}
+        return ids
+
+    def assertCohort(self, expression, ids):
+        cohort = self.index.query(expression)
+        self.assertEqual(set(cohort.member_ids()), ids, expression)
+        self.assertEqual(cohort.member_count, len(ids), expression)
+        self.assertEqual(
+            sorted(cohort.family_ids()), sorted({self.members[member_id][0] for member_id in ids}), expression,
+        )
+
+    def test_operators(self):
+        self.assertCohort('all', set(self.members))
+        self.assertCohort('mendhi & !vidhi', self.expected(lambda t: 'mendhi' in t and 'vidhi' not in t))
+        self.assertCohort(
+            'wedding:pending | father', self.expected(lambda t: 'wedding:pending' in t or 'father' in t),
+        )
+
+    def test_family_widening(self):
+        self.assertCohort('family(grandmother)', self.expected(lambda t: 'grandmother' in t, widen=True))
+        self.assertCohort(
+            'family(reception:declined) & !reception',
+            self.expected(lambda t: 'reception:declined' in t, widen=True) & self.expected(lambda t: 'reception' not in t),
+        )
+
+    def test_family_responded(self):
+        family_id = self.members[next(iter(self.members))][0]
+        self.index.set_family_responded(family_id, True)
+        self.assertCohort(
+            'responded', {member_id for member_id, (family, _) in self.members.items() if family == family_id},
+        )
+
+
+class CohortUpkeepTests(TestCase):
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(cohorts.invalidate)
+        self.family = Guest.objects.create(name='Indexed Family', has_responded=True)
+        FamilyMember.objects.create(family=self.family, name='First Member', invited_mendhi=True)
+        cohorts.get_index()
+
+    def test_member_saves_read_responded_from_the_index(self):
+        member = FamilyMember(family_id=self.family.pk, name='Second Member', relation='cousin')
+        with self.captureOnCommitCallbacks() as callbacks:
+            member.save()
+        with self.assertNumQueries(0):
+            for callback in callbacks:
+                callback()
+        self.assertIn(member.pk, cohorts.query('cousin & responded').member_ids())
+
+    def test_first_member_of_a_family_reads_the_database(self):
+        family = Guest.objects.create(name='New Family', has_responded=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            member = FamilyMember.objects.create(family_id=family.pk, name='Only Member', relation='aunt')
+        self.assertEqual(cohorts.query('aunt & responded').member_ids(), [member.pk])
+
+    def test_changes_committed_during_a_build_are_replayed(self):
+        member = FamilyMember.objects.create(family=self.family, name='Leaving Member', relation='uncle')
+        build = cohorts.CohortIndex.build
+
+        def build_then_commit_a_delete(version):
+            index = build(version)
+            # Committed while the (slow) query ran: the new index misses it
+            with self.captureOnCommitCallbacks(execute=True):
+                FamilyMember.objects.filter(pk=member.pk).delete()
+                cohorts.member_deleted(member.pk)
+            return index
+
+        cohorts.invalidate()
+        with mock.patch.object(cohorts.CohortIndex, 'build', side_effect=build_then_commit_a_delete):
+            index = cohorts.get_index()
+        self.assertEqual(index.query('uncle').member_ids(), [])
+        self.assertEqual(index.version, cohorts._shared_version())
+        self.assertIs(cohorts.get_index(), index)
+
+    def test_readers_keep_the_old_index_during_a_build(self):
+        old = cohorts.get_index()
+        # As after a missed change: rebuilt on next use
+        old.version = None
+        old.checked_at = float('-inf')
+        with cohorts._build_lock:
+            self.assertIs(cohorts.get_index(), old)
+        self.assertIsNot(cohorts.get_index(), old)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.family = Guest.objects.create(name='Counted Family')
+        self.members = [
+            FamilyMember.objects.create(family=self.family, name=f'Member {i}', invited_mendhi=True, invited_wedding=i < 2)
+            for i in range(3)
+        ]
+        counters.rebuild()
+
+    def test_delta_of_a_change_cancels_out_when_reverted(self):
+        member = self.members[0]
+        delta = counters.CounterDelta()
+        delta.add_member(member, sign=-1)
+        member.rsvp_mendhi = 'attending'
+        delta.add_member(member)
+        self.assertEqual(delta.changes['mendhi'], {'attending': 1, 'pending': -1, 'invited': 0})
+        delta.add_member(member, sign=-1)
+        member.rsvp_mendhi = 'pending'
+        delta.add_member(member)
+        delta.apply()
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_rsvp_submissions_keep_counters_exact(self):
+        url = reverse('wedding:rsvp_form', args=[self.family.rsvp_code])
+        for answer in ('attending', 'not_attending'):
+            data = {'message': ''}
+            for member in self.members:
+                data[f'rsvp_mendhi_{member.id}'] = answer
+                if member.invited_wedding:
+                    data[f'rsvp_wedding_{member.id}'] = 'attending'
+            self.assertTrue(self.client.post(url, data).context['rsvp_success'])
+            self.assertEqual(counters.rebuild(dry_run=True), {})
+        stats = counters.read_stats()
+        self.assertEqual(stats['responded'], 1)
+        self.assertEqual(stats['events']['mendhi']['not_attending'], 3)
+        self.assertEqual(stats['events']['wedding']['attending'], 2)
+
+    def test_tracking_covers_deletes(self):
+        with counters.tracking({self.family.pk}):
+            self.members[0].delete()
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+
+class ResumableImportTests(TestCase):
+    def setUp(self):
+        counters.rebuild()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'guests.csv')
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'email', 'max_guests', 'invited_wedding'])
+            for i in range(10):
+                # Row 4 (Guest 2) has no name and is rejected
+                writer.writerow(['' if i == 2 else f'Guest {i}', f'guest{i}@example.com', 2, 'yes'])
+
+    def test_resume_after_a_failed_batch(self):
+        flush = importing.BatchImporter.flush
+        calls = []
+
+        def fail_second_batch(importer):
+            if importer.pending:
+                calls.append(importer.pending)
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return flush(importer)
+
+        out = io.StringIO()
+        with mock.patch.object(importing.BatchImporter, 'flush', fail_second_batch):
+            with self.assertRaisesMessage(CommandError, 'Rows up to 5 are committed'):
+                call_command('import_guests', self.path, '--bulk', '--batch-size', '4', stdout=out)
+        self.assertEqual(Guest.objects.count(), 3)  # the first batch, less the rejected row
+        self.assertTrue(os.path.exists(f'{self.path}.checkpoint'))
+
+        call_command('import_guests', self.path, '--bulk', '--batch-size', '4', '--resume', stdout=out)
+        self.assertEqual(
+            sorted(Guest.objects.values_list('name', flat=True)), [f'Guest {i}' for i in range(10) if i != 2],
+        )
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+        with open(f'{self.path}.rejects.csv', encoding='utf-8') as f:
+            rejects = list(csv.DictReader(f))
+        self.assertEqual([row['email'] for row in rejects], ['guest2@example.com'])
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_engines_match_the_same_duplicate(self):
+        # Created out of name order, so only an explicit order picks Amy
+        Guest.objects.create(name='Zed Family', email='shared@example.com')
+        amy = Guest.objects.create(name='Amy Family', email='shared@example.com')
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'email', 'phone'])
+            writer.writerow(['Someone Else', 'SHARED@example.com', '555-0100'])
+
+        engines = [[], ['--bulk']] + ([['--copy']] if importing.copy_supported() else [])
+        for flags in engines:
+            with self.subTest(flags=flags):
+                Guest.objects.update(phone='')
+                call_command('import_guests', self.path, '--update', *flags, stdout=io.StringIO())
+                self.assertEqual(
+                    list(Guest.objects.exclude(phone='').values_list('pk', flat=True)), [amy.pk],
+                )
+
+    def test_reader_resumes_at_an_offset(self):
+        with importing.ResumableCsvReader(self.path) as reader:
+            rows = iter(reader)
+            for _ in range(4):
+                next(rows)
+            position = reader.position
+            rest = list(rows)
+        with importing.ResumableCsvReader.resume(self.path, position) as reader:
+            self.assertEqual(list(reader), rest)
+
+
+class CodeAllocatorTests(TestCase):
+    def test_codes_are_unique_against_guests_and_each_other(self):
+        Guest.objects.create(name='Existing', rsvp_code='AAAAAAAA')
+        draws = iter(['AAAAAAAA', 'BBBBBBBB', 'BBBBBBBB', 'CCCCCCCC', 'DDDDDDDD', 'EEEEEEEE', 'FFFFFFFF'])
+        allocator = CodeAllocator(generate=lambda: next(draws))
+        allocator.reserve(['CCCCCCCC'])
+        self.assertEqual(allocator.allocate(2), ['BBBBBBBB', 'DDDDDDDD'])
+        self.assertEqual(allocator.allocate_one(), 'EEEEEEEE')
+
+    def test_preloaded_taken_set_needs_no_queries(self):
+        taken = {'AAAAAAAA'}
+        draws = iter(['AAAAAAAA', 'BBBBBBBB', 'CCCCCCCC'])
+        allocator = CodeAllocator(taken=taken, generate=lambda: next(draws))
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate(2), ['BBBBBBBB', 'CCCCCCCC'])
+        self.assertEqual(taken, {'AAAAAAAA', 'BBBBBBBB', 'CCCCCCCC'})
+
+    def test_default_codes_use_the_code_alphabet(self):
+        codes = allocate_codes(200)
+        self.assertEqual(len(set(codes)), 200)
+        for code in codes:
+            self.assertEqual(len(code), RSVP_CODE_LENGTH)
+            self.assertFalse(set(code) - set(RSVP_CODE_ALPHABET), code)
+
+
+    def test_admin_regenerates_codes_and_touches_updated_at(self):
+        guest = Guest.objects.create(name='Recoded Family')
+        staff = User.objects.create_superuser('staff', 'staff@example.com', 'password')
+        self.client.force_login(staff)
+        self.client.post(reverse('admin:wedding_guest_changelist'), {
+            'action': 'regenerate_rsvp_codes', '_selected_action': [guest.pk],
+        })
+        recoded = Guest.objects.get(pk=guest.pk)
+        self.assertNotEqual(recoded.rsvp_code, guest.rsvp_code)
+        self.assertGreater(recoded.updated_at, guest.updated_at)
+
+
+class AsgiStreamingTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        path = os.path.join(root, 'home.html')
+        patcher = mock.patch.multiple(
+            prerender, PRERENDER_ROOT=root, HOME_PATH=path,
+            home_page=prerender.PrerenderedPage(path, prerender.build_home),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def read(self, response):
+        self.assertTrue(response.is_async)
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    @override_settings(PRERENDER_HOME=True)
+    async def test_file_and_csv_responses_stream_without_buffering(self):
+        staff = await User.objects.acreate_superuser('staff', 'staff@example.com', 'password')
+        await Guest.objects.acreate(name='Streamed Family', email='streamed@example.com')
+        await self.async_client.aforce_login(staff)
+        with warnings.catch_warnings():
+            # Django warns when it has to buffer a sync iterator
+            warnings.filterwarnings('error', message='StreamingHttpResponse must consume')
+            home = await self.async_client.get('/')
+            self.assertIn(b'</html>', await self.read(home))
+            export = await self.async_client.get(reverse('wedding:export_guests_csv'))
+            self.assertIn(b'Streamed Family', await self.read(export))
+
+
+class OutboxTests(TestCase):
+    def test_finished_messages_lose_their_context(self):
+        guest = Guest.objects.create(name='Outbox Family', email='outbox@example.com')
+        context = {'guest_name': guest.name, 'couple_names': 'A & B', 'rsvp_code': guest.rsvp_code, 'rsvp_link': '/'}
+        sent = outbox.enqueue('forgot_code', guest.email, context, guest=guest)
+        refused = outbox.enqueue('forgot_code', 'refused@example.com', context, guest=guest)
+
+        def send_messages(emails):
+            if emails[0].to == ['refused@example.com']:
+                raise smtplib.SMTPRecipientsRefused({})
+            return len(emails)
+
+        worker = outbox.MailWorker(max_attempts=1)
+        with mock.patch.object(mail.get_connection().__class__, 'send_messages', side_effect=send_messages):
+            worker.run_once()
+        sent.refresh_from_db()
+        refused.refresh_from_db()
+        self.assertEqual((sent.status, sent.context), (OutboundEmail.SENT, {}))
+        self.assertEqual((refused.status, refused.context), (OutboundEmail.FAILED, {}))
+
+
+class SendInvitationsTests(TransactionTestCase):
+    def test_only_the_selected_guests_are_sent(self):
+        chosen = Guest.objects.create(name='Chosen Family', email='chosen@example.com')
+        left = Guest.objects.create(name='Left Family', email='left@example.com')
+        # Queued by an earlier run that never sent
+        invitations.queue_invitations(Guest.objects.filter(pk=left.pk))
+        call_command(
+            'send_invitations', code=[chosen.rsvp_code], concurrency=1, rate=0, stdout=io.StringIO(),
+        )
+        self.assertEqual([message.to for message in mail.outbox], [['chosen@example.com']])
+        self.assertEqual(
+            OutboundEmail.objects.get(guest=left).status, OutboundEmail.PENDING,
+        )
+
+    def test_retry_failed_queues_a_fresh_invitation(self):
+        guest = Guest.objects.create(name='Failed Family', email='failed@example.com')
+        invitations.queue_invitations(Guest.objects.filter(pk=guest.pk))
+        OutboundEmail.objects.filter(guest=guest).update(status=OutboundEmail.FAILED, context={})
+        call_command(
+            'send_invitations', code=[guest.rsvp_code], retry_failed=True, concurrency=1, rate=0,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(guest.rsvp_code, mail.outbox[0].body)
+
+    def test_a_new_rsvp_code_supersedes_the_queued_invitation(self):
+        guest = Guest.objects.create(name='Recoded Family', email='recoded@example.com')
+        old_code = guest.rsvp_code
+        invitations.queue_invitations(Guest.objects.filter(pk=guest.pk))
+        guest.rsvp_code = allocate_codes(1)[0]
+        guest.save()
+        call_command(
+            'send_invitations', code=[guest.rsvp_code], concurrency=1, rate=0, stdout=io.StringIO(),
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(guest.rsvp_code, mail.outbox[0].body)
+        self.assertNotIn(old_code, mail.outbox[0].body)
+        self.assertEqual(OutboundEmail.objects.filter(guest=guest).count(), 1)
@@ -0,0 +1,168 @@
+"""
+Write-behind buffer for ``Guest.last_viewed_at``.
+
+A successful code entry used to cost an UPDATE on the lookup path, which
+is exactly the path that spikes after invitations go out. Views now call
+``record_view(guest_id)``, which only stores a timestamp in a per-process
+dict (the latest view wins for each guest). A daemon thread flushes the
+dict every ``VIEW_TRACKING_FLUSH_INTERVAL`` seconds with a single
+``UPDATE ... CASE`` covering every buffered guest.
+
+The buffer holds at most ``VIEW_TRACKING_BUFFER_SIZE`` guests; views of
+further guests are dropped until the next flush and counted. A failed flush
+puts its entries back (unless a newer view arrived meanwhile). The buffer is
+flushed at interpreter exit and from gunicorn's ``worker_exit`` hook (see
+``gunicorn.conf.py``); dropped counts are logged with each flush.
+
+Setting the interval to 0 writes each view straight away, which tests and
+one-off scripts rely on.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from .models import Guest
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between flushes; 0 disables buffering
+FLUSH_INTERVAL = getattr(settings, 'VIEW_TRACKING_FLUSH_INTERVAL', 10)
+
+# Distinct guests held before new views are dropped
+BUFFER_SIZE = getattr(settings, 'VIEW_TRACKING_BUFFER_SIZE', 10000)
+
+# Guests per UPDATE statement, well under every backend's parameter limit
+FLUSH_CHUNK_SIZE = 500
+
+
+def write_views(views):
+    """Set last_viewed_at for ``{guest_id: timestamp}`` with one UPDATE per chunk"""
+    pks = list(views)
+    for start in range(0, len(pks), FLUSH_CHUNK_SIZE):
+        chunk = pks[start:start + FLUSH_CHUNK_SIZE]
+        Guest.objects.filter(pk__in=chunk).update(last_viewed_at=Case(
+            *[When(pk=pk, then=Value(views[pk])) for pk in chunk],
+            output_field=Guest._meta.get_field('last_viewed_at'),
+        ))
+
+
+class ViewBuffer:
+    """Per-process buffer of guest id -> latest view time, flushed in the background"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_size=BUFFER_SIZE):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._views = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self._dropped_reported = 0
+
+    def record(self, guest_id, viewed_at=None):
+        viewed_at = viewed_at or timezone.now()
+        if not self.flush_interval:
+            write_views({guest_id: viewed_at})
+            return
+        with self._lock:
+            if guest_id not in self._views and len(self._views) >= self.max_size:
+                self.dropped += 1
+                return
+            self._views[guest_id] = max(viewed_at, self._views.get(guest_id, viewed_at))
+            self.recorded += 1
+        self._ensure_thread()
+
+    def _take(self):
+        with self._lock:
+            views, self._views = self._views, {}
+        return views
+
+    def _restore(self, views):
+        """Put back entries from a failed flush, keeping any newer view"""
+        with self._lock:
+            for guest_id, viewed_at in views.items():
+                current = self._views.get(guest_id)
+                if current is None and len(self._views) >= self.max_size:
+                    self.dropped += 1
+                elif current is None or current < viewed_at:
+                    self._views[guest_id] = viewed_at
+
+    def flush(self):
+        """Write buffered views now; returns the number of guests updated"""
+        with self._flush_lock:
+            views = self._take()
+            if views:
+                try:
+                    write_views(views)
+                except DatabaseError:
+                    self._restore(views)
+                    logger.exception('Could not flush %d guest view(s); will retry', len(views))
+                    return 0
+                self.flushed += len(views)
+            self._report_dropped()
+            return len(views)
+
+    def _report_dropped(self):
+        newly_dropped = self.dropped - self._dropped_reported
+        if newly_dropped:
+            logger.warning(
+                'View tracking buffer full: dropped %d view(s) (%d since start)',
+                newly_dropped, self.dropped,
+            )
+            self._dropped_reported = self.dropped
+
+    def pending(self):
+        with self._lock:
+            return len(self._views)
+
+    def _ensure_thread(self):
+        # Forked workers inherit the dict but not the thread: start one per process
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='view-tracking-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._wakeup.wait(self.flush_interval):
+            try:
+                self.flush()
+            finally:
+                # Don't hold a database connection between flushes
+                connection.close()
+
+    def shutdown(self):
+        """Final flush for process exit"""
+        self._wakeup.set()
+        flushed = self.flush()
+        if flushed or self.dropped:
+            logger.info(
+                'View tracking: flushed %d guest(s) at shutdown; %d view(s) dropped since start',
+                flushed, self.dropped,
+            )
+
+
+view_buffer = ViewBuffer()
+atexit.register(view_buffer.shutdown)
+
+
+def record_view(guest_id):
+    """Note that a guest opened their RSVP; written to the database later"""
+    view_buffer.record(guest_id)
+
+
+def flush():
+    return view_buffer.flush()
@@ -17,4 +17,7 @@ urlpatterns = [
     path('dashboard/family/<str:rsvp_code>/', views.family_detail, name='family_detail'),
     path('dashboard/export/', views.export_guests_csv, name='export_guests_csv'),
     path('api/dashboard/stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
+    path('api/dashboard/stream/', views.api_dashboard_stream, name='api_dashboard_stream'),
+    path('api/search/autocomplete/', views.api_search_autocomplete, name='api_search_autocomplete'),
+    path('api/cohorts/', views.api_cohort, name='api_cohort'),
 ]
@@ -1,66 +1,50 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.shortcuts import render, redirect
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Count, Q, Sum
-from django.core.mail import send_mail
+from django.db import DatabaseError, transaction
 from django.conf import settings
 from django.template.loader import render_to_string
-from .models import Event, StoryMilestone, WeddingInfo, Guest, FamilyMember
+from .models import WeddingInfo, Guest, FamilyMember, Invitation
 from .forms import RSVPCodeForm, GuestRSVPForm, ForgotCodeForm
-import csv
+from . import cohorts, exports, live, lookup, outbox, prerender, tracking
+from .catalog import get_catalog
+from .counters import CounterDelta, read_stats
+from .paging import ApproximateCount, KeysetPage, approximate_count, keyset_page
+from . import search as search_index
+from .stats import DASHBOARD_LIST_LIMIT, EVENT_SLUGS, RSVP_STATUSES, pending_families, recent_rsvps, response_rate
 import json
+import logging
+import time
+from asgiref.sync import sync_to_async
+
+
+logger = logging.getLogger(__name__)
+
+GUEST_LIST_PAGE_SIZE = 100
+
+# Unique sort key for keyset pages (matches the guest_name_id_idx index)
+GUEST_LIST_ORDER = ('name', 'id')
+
+# Everything admin_guest_list.html renders; the TextFields stay in the database
+GUEST_LIST_COLUMNS = [
+    'id', 'name', 'rsvp_code', 'email', 'max_guests', 'has_responded',
+    *[f'{prefix}_{slug}' for prefix in ('invited', 'rsvp', 'guests') for slug in EVENT_SLUGS],
+]
 
 
 def home(request):
     """Main wedding website view with all sections"""
-    # Get wedding info or use defaults
-    wedding_info = WeddingInfo.objects.first()
-    
-    # Get events and story milestones
-    events = Event.objects.all()
-    milestones = StoryMilestone.objects.all()
-    
-    # Default wedding info if none exists
-    if not wedding_info:
-        wedding_info = {
-            'partner1_name': 'Prit',
-            'partner2_name': 'Khushboo',
-            'wedding_date': '2025-12-28',
-            'location': 'Mumbai, India',
-            'hashtag': '#PritniKhushi',
-            'welcome_title': 'Welcome to Our Wedding',
-            'welcome_message': 'We are so excited to celebrate our special day with you! Join us for a beautiful celebration of love, laughter, and happily ever after.',
-        }
-    
-    # Default milestones if none exist
-    if not milestones:
-        milestones = [
-            {'year': '2018', 'title': 'How We Met', 'description': 'It all started at a mutual friend\'s birthday party. Across a crowded room, our eyes met, and we knew something magical was beginning.'},
-            {'year': '2019', 'title': 'The First Date', 'description': 'Our first official date was at a cozy café downtown. We were both so nervous, but within minutes, it felt like we had known each other forever.'},
-            {'year': '2021', 'title': 'Moving In Together', 'description': 'After two wonderful years of dating, we decided to take the next step. We found our perfect little apartment and started building our life together.'},
-            {'year': '2024', 'title': 'The Proposal', 'description': 'On a beautiful sunset evening at our favorite beach, Michael got down on one knee and asked the question that would change our lives forever.'},
-            {'year': '2025', 'title': 'Forever Begins', 'description': 'And now, we\'re ready to begin our forever journey together. We can\'t wait to celebrate this new chapter with all of you.'},
-        ]
-    
-    # Default events if none exist
-    if not events:
-        events = [
-            {'name': 'Mendhi', 'icon': '✿', 'date': 'December 25, 2025', 'time': '4:00 PM onwards', 'venue_name': 'The Garden Pavilion', 'venue_address': '123 Celebration Lane, Mumbai', 'description': 'Join us for an evening of beautiful henna designs, music, and dance.', 'dress_code': 'Colorful Indian Attire', 'is_featured': False},
-            {'name': 'Vidhi', 'icon': '🪔', 'date': 'December 26, 2025', 'time': '10:00 AM - 2:00 PM', 'venue_name': 'Family Residence', 'venue_address': '456 Heritage Road, Mumbai', 'description': 'A sacred ceremony filled with traditional rituals and blessings.', 'dress_code': 'Traditional Indian Wear', 'is_featured': False},
-            {'name': 'Wedding', 'icon': '💒', 'date': 'December 27, 2025', 'time': '6:00 PM onwards', 'venue_name': 'The Grand Ballroom', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'description': 'The main event! Watch us exchange vows and become partners for life.', 'dress_code': 'Formal Indian / Western', 'is_featured': True},
-            {'name': 'Reception', 'icon': '🎉', 'date': 'December 28, 2025', 'time': '7:00 PM onwards', 'venue_name': 'Starlight Terrace', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'description': 'Let\'s dance the night away!', 'dress_code': 'Glamorous Evening Wear', 'is_featured': False},
-        ]
-    
-    context = {
-        'wedding_info': wedding_info,
-        'events': events,
-        'milestones': milestones,
-    }
-    
-    return render(request, 'wedding/home.html', context)
+    if getattr(settings, 'PRERENDER_HOME', False):
+        try:
+            return prerender.home_page.serve(request)
+        except OSError:
+            logger.exception('Pre-rendered home page unavailable; rendering live')
+
+    return render(request, 'wedding/home.html', prerender.home_context())
 
 
 def rsvp_lookup(request):
@@ -68,12 +52,10 @@ def rsvp_lookup(request):
     if request.method == 'POST':
         form = RSVPCodeForm(request.POST)
         if form.is_valid():
-            guest = form.guest
-            # Update last viewed timestamp
-            guest.last_viewed_at = timezone.now()
-            guest.save(update_fields=['last_viewed_at'])
+            # Buffered; written to last_viewed_at in the background
+            tracking.record_view(form.guest_id)
             # Redirect to the RSVP form with the code
-            return redirect('wedding:rsvp_form', rsvp_code=guest.rsvp_code)
+            return redirect('wedding:rsvp_form', rsvp_code=form.cleaned_data['rsvp_code'])
     else:
         form = RSVPCodeForm()
     
@@ -84,9 +66,7 @@ def rsvp_lookup(request):
 
 
 def forgot_code(request):
-    """Handle forgot RSVP code - send code to guest's email"""
-    email_sent = False
-    
+    """Handle forgot RSVP code - queue an email with the guest's code"""
     if request.method == 'POST':
         form = ForgotCodeForm(request.POST)
         if form.is_valid():
@@ -98,89 +78,13 @@ def forgot_code(request):
             if wedding_info:
                 couple_names = f"{wedding_info.partner1_name} & {wedding_info.partner2_name}"
             
-            # Build the RSVP link
-            rsvp_link = request.build_absolute_uri(f'/rsvp/{guest.rsvp_code}/')
-            
-            # Send email
-            subject = f"Your RSVP Code for {couple_names}'s Wedding"
-            
-            message = f"""
-Dear {guest.name},
-
-You requested your RSVP code for {couple_names}'s wedding celebration.
-
-Your RSVP Code: {guest.rsvp_code}
-
-You can use this code to RSVP at: {rsvp_link}
-
-Or simply click the link above to go directly to your invitation.
-
-We look forward to celebrating with you!
-
-With love,
-{couple_names}
-            """
-            
-            html_message = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: 'Georgia', serif; background-color: #faf8f5; padding: 20px; }}
-        .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 10px; padding: 40px; box-shadow: 0 4px 20px rgba(0,0,0,0.1); }}
-        .header {{ text-align: center; margin-bottom: 30px; }}
-        .header h1 {{ color: #b8860b; font-size: 28px; margin: 0; }}
-        .content {{ color: #333; line-height: 1.8; }}
-        .code-box {{ background: #f5e6d3; padding: 20px; text-align: center; border-radius: 10px; margin: 25px 0; }}
-        .code {{ font-size: 32px; font-weight: bold; color: #b8860b; letter-spacing: 5px; }}
-        .btn {{ display: inline-block; background: #b8860b; color: white; padding: 15px 40px; text-decoration: none; border-radius: 8px; margin-top: 20px; }}
-        .footer {{ text-align: center; margin-top: 30px; color: #666; font-style: italic; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>💌 Your RSVP Code</h1>
-        </div>
-        <div class="content">
-            <p>Dear <strong>{guest.name}</strong>,</p>
-            <p>You requested your RSVP code for <strong>{couple_names}'s</strong> wedding celebration.</p>
-            
-            <div class="code-box">
-                <p style="margin: 0 0 10px 0; color: #666;">Your RSVP Code:</p>
-                <div class="code">{guest.rsvp_code}</div>
-            </div>
-            
-            <p style="text-align: center;">
-                <a href="{rsvp_link}" class="btn">RSVP Now</a>
-            </p>
-            
-            <p>Or copy and paste this link in your browser:<br>
-            <a href="{rsvp_link}">{rsvp_link}</a></p>
-        </div>
-        <div class="footer">
-            <p>With love,<br><strong>{couple_names}</strong></p>
-        </div>
-    </div>
-</body>
-</html>
-            """
-            
-            try:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[guest.email],
-                    html_message=html_message,
-                    fail_silently=False,
-                )
-                email_sent = True
-            except Exception as e:
-                # If email fails, still show the success page but log the error
-                print(f"Email sending failed: {e}")
-                # For development, we'll still show success and display the code
-                email_sent = True
+            # Queued for the mail worker; the request doesn't wait on SMTP
+            outbox.enqueue('forgot_code', guest.email, {
+                'guest_name': guest.name,
+                'couple_names': couple_names,
+                'rsvp_code': guest.rsvp_code,
+                'rsvp_link': request.build_absolute_uri(f'/rsvp/{guest.rsvp_code}/'),
+            }, guest=guest)
             
             # Store guest info for success message
             request.session['forgot_code_guest'] = {
@@ -211,78 +115,83 @@ def forgot_code_sent(request):
     return render(request, 'wedding/forgot_code_sent.html', context)
 
 
+def save_family_rsvp(family_pk, post):
+    """
+    Apply a submitted family RSVP form as one atomic write.
+
+    Only changed member fields are written, with a single bulk_update;
+    dietary notes are left alone unless the form posted them. Raises
+    ValueError, before writing anything, if a status isn't a valid choice.
+    Returns the saved family and its members.
+    """
+    with transaction.atomic():
+        # Row lock: concurrent submissions for one family apply in turn,
+        # so each counter delta is computed from the committed state
+        family = Guest.objects.select_for_update().get(pk=family_pk)
+        members = list(family.members.order_by('order', 'name'))
+
+        delta = CounterDelta()
+        delta.add_family(family, sign=-1)
+        changed_members = []
+        changed_fields = set()
+        for member in members:
+            updates = {}
+            for slug in EVENT_SLUGS:
+                if getattr(member, f'invited_{slug}'):
+                    value = post.get(f'rsvp_{slug}_{member.id}', 'pending')
+                    if value not in RSVP_STATUSES:
+                        raise ValueError(f'Invalid response for {member.name}. Please choose again.')
+                    updates[f'rsvp_{slug}'] = value
+            if f'dietary_{member.id}' in post:
+                updates['dietary_requirements'] = post[f'dietary_{member.id}']
+
+            updates = {field: value for field, value in updates.items() if getattr(member, field) != value}
+            if updates:
+                delta.add_member(member, sign=-1)
+                for field, value in updates.items():
+                    setattr(member, field, value)
+                delta.add_member(member)
+                changed_members.append(member)
+                changed_fields.update(updates)
+
+        if changed_members:
+            FamilyMember.objects.bulk_update(changed_members, sorted(changed_fields))
+            Invitation.objects.sync(changed_members)
+            cohorts.members_changed(changed_members, responded=True)
+
+        family.message = post.get('message', '')
+        family.has_responded = True
+        family.rsvp_submitted_at = timezone.now()
+        family.save(update_fields=['message', 'has_responded', 'rsvp_submitted_at', 'updated_at'])
+        delta.add_family(family)
+        delta.apply()
+        transaction.on_commit(lambda: live.feed.publish_rsvp(family))
+    return family, members
+
+
 def rsvp_form(request, rsvp_code):
     """Private RSVP form for a family with individual members"""
     # Get the family by RSVP code
-    family = get_object_or_404(Guest, rsvp_code=rsvp_code.upper())
+    family = lookup.get_guest_or_404(rsvp_code)
     
     # Get family members
     members = family.members.all().order_by('order', 'name')
     
-    # Get events for display
-    events = Event.objects.all()
-    
-    # Build event details dict
-    event_details = {}
-    for event in events:
-        event_details[event.slug] = {
-            'name': event.name,
-            'icon': event.icon,
-            'date': event.date,
-            'time': event.time,
-            'venue_name': event.venue_name,
-            'venue_address': event.venue_address,
-            'description': event.description,
-            'dress_code': event.dress_code,
-        }
-    
-    # Default event details if no events in database
-    if not event_details:
-        event_details = {
-            'mendhi': {'name': 'Mendhi', 'icon': '✿', 'date': 'December 25, 2025', 'time': '4:00 PM onwards', 'venue_name': 'The Garden Pavilion', 'venue_address': '123 Celebration Lane, Mumbai', 'dress_code': 'Colorful Indian Attire'},
-            'vidhi': {'name': 'Vidhi', 'icon': '🪔', 'date': 'December 26, 2025', 'time': '10:00 AM - 2:00 PM', 'venue_name': 'Family Residence', 'venue_address': '456 Heritage Road, Mumbai', 'dress_code': 'Traditional Indian Wear'},
-            'wedding': {'name': 'Wedding', 'icon': '💒', 'date': 'December 27, 2025', 'time': '6:00 PM onwards', 'venue_name': 'The Grand Ballroom', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'dress_code': 'Formal Indian Attire'},
-            'reception': {'name': 'Reception', 'icon': '🎉', 'date': 'December 28, 2025', 'time': '7:00 PM onwards', 'venue_name': 'Starlight Terrace', 'venue_address': '789 Royal Palace Hotel, Mumbai', 'dress_code': 'Semi-formal'},
-        }
+    # Shared, cached event details (fallbacks included)
+    event_details = get_catalog().by_slug
     
     rsvp_success = False
+    rsvp_error = None
     
     if request.method == 'POST':
-        # Process RSVP for each family member
         try:
-            for member in members:
-                member_id = str(member.id)
-                
-                # Update RSVP for each event the member is invited to
-                if member.invited_mendhi:
-                    rsvp_value = request.POST.get(f'rsvp_mendhi_{member_id}', 'pending')
-                    member.rsvp_mendhi = rsvp_value
-                
-                if member.invited_vidhi:
-                    rsvp_value = request.POST.get(f'rsvp_vidhi_{member_id}', 'pending')
-                    member.rsvp_vidhi = rsvp_value
-                
-                if member.invited_wedding:
-                    rsvp_value = request.POST.get(f'rsvp_wedding_{member_id}', 'pending')
-                    member.rsvp_wedding = rsvp_value
-                
-                if member.invited_reception:
-                    rsvp_value = request.POST.get(f'rsvp_reception_{member_id}', 'pending')
-                    member.rsvp_reception = rsvp_value
-                
-                # Update dietary requirements
-                member.dietary_requirements = request.POST.get(f'dietary_{member_id}', '')
-                member.save()
-            
-            # Update family message
-            family.message = request.POST.get('message', '')
-            family.has_responded = True
-            family.rsvp_submitted_at = timezone.now()
-            family.save()
-            
+            family, members = save_family_rsvp(family.pk, request.POST)
             rsvp_success = True
-        except Exception as e:
-            print(f"Error saving RSVP: {e}")
+        except ValueError as e:
+            rsvp_error = str(e)
+        except DatabaseError:
+            logger.exception('Error saving RSVP for family %s', family.pk)
+            rsvp_error = "We couldn't save your RSVP just now. Please try again in a moment."
     
     # Get wedding info
     wedding_info = WeddingInfo.objects.first()
@@ -307,6 +216,7 @@ def rsvp_form(request, rsvp_code):
         'events_with_members': events_with_members,
         'event_details': event_details,
         'rsvp_success': rsvp_success,
+        'rsvp_error': rsvp_error,
         'wedding_info': wedding_info,
     }
     return render(request, 'wedding/rsvp_form.html', context)
@@ -315,65 +225,20 @@ def rsvp_form(request, rsvp_code):
 @staff_member_required
 def admin_dashboard(request):
     """Admin dashboard with real-time RSVP tracking"""
-    # Get all families (Guest objects)
-    families = Guest.objects.all()
-    total_families = families.count()
-    
-    # Get all family members
-    members = FamilyMember.objects.all()
-    total_members = members.count()
-    
-    # Response statistics (family level)
-    responded = families.filter(has_responded=True).count()
-    pending_families = families.filter(has_responded=False).count()
-    
-    # Per-event statistics from FamilyMember model
-    events_stats = {
-        'mendhi': {
-            'invited': members.filter(invited_mendhi=True).count(),
-            'attending': members.filter(invited_mendhi=True, rsvp_mendhi='attending').count(),
-            'not_attending': members.filter(invited_mendhi=True, rsvp_mendhi='not_attending').count(),
-            'pending': members.filter(invited_mendhi=True, rsvp_mendhi='pending').count(),
-            'total_guests': members.filter(invited_mendhi=True, rsvp_mendhi='attending').count(),
-        },
-        'vidhi': {
-            'invited': members.filter(invited_vidhi=True).count(),
-            'attending': members.filter(invited_vidhi=True, rsvp_vidhi='attending').count(),
-            'not_attending': members.filter(invited_vidhi=True, rsvp_vidhi='not_attending').count(),
-            'pending': members.filter(invited_vidhi=True, rsvp_vidhi='pending').count(),
-            'total_guests': members.filter(invited_vidhi=True, rsvp_vidhi='attending').count(),
-        },
-        'wedding': {
-            'invited': members.filter(invited_wedding=True).count(),
-            'attending': members.filter(invited_wedding=True, rsvp_wedding='attending').count(),
-            'not_attending': members.filter(invited_wedding=True, rsvp_wedding='not_attending').count(),
-            'pending': members.filter(invited_wedding=True, rsvp_wedding='pending').count(),
-            'total_guests': members.filter(invited_wedding=True, rsvp_wedding='attending').count(),
-        },
-        'reception': {
-            'invited': members.filter(invited_reception=True).count(),
-            'attending': members.filter(invited_reception=True, rsvp_reception='attending').count(),
-            'not_attending': members.filter(invited_reception=True, rsvp_reception='not_attending').count(),
-            'pending': members.filter(invited_reception=True, rsvp_reception='pending').count(),
-            'total_guests': members.filter(invited_reception=True, rsvp_reception='attending').count(),
-        },
-    }
-    
-    # Recent RSVPs (last 20 families)
-    recent_rsvps = families.filter(has_responded=True).order_by('-rsvp_submitted_at')[:20]
-    
-    # Families who haven't responded
-    pending_guests = families.filter(has_responded=False).order_by('name')
+    # Every family/member/per-event number comes from the counters table
+    stats = read_stats()
     
     context = {
-        'total_guests': total_families,
-        'total_members': total_members,
-        'responded': responded,
-        'pending': pending_families,
-        'response_rate': round((responded / total_families * 100) if total_families > 0 else 0, 1),
-        'events_stats': events_stats,
-        'recent_rsvps': recent_rsvps,
-        'pending_guests': pending_guests,
+        'total_guests': stats['total_families'],
+        'total_members': stats['total_members'],
+        'responded': stats['responded'],
+        'pending': stats['pending'],
+        'response_rate': response_rate(stats['responded'], stats['total_families']),
+        'events_stats': stats['events'],
+        # Bounded lists; the full pending count is stats['pending']
+        'recent_rsvps': recent_rsvps(),
+        'pending_guests': pending_families(),
+        'list_limit': DASHBOARD_LIST_LIMIT,
     }
     return render(request, 'wedding/admin_dashboard.html', context)
 
@@ -381,7 +246,7 @@ def admin_dashboard(request):
 @staff_member_required
 def family_detail(request, rsvp_code):
     """View detailed RSVP status for a specific family"""
-    guest = get_object_or_404(Guest, rsvp_code=rsvp_code.upper())
+    guest = lookup.get_guest_or_404(rsvp_code)
     family_members = guest.members.all()  # Using 'members' as defined in FamilyMember model
     
     # Organize members by their RSVP status for each event
@@ -415,112 +280,164 @@ def admin_guest_list(request):
     """Admin view for full guest list with filtering"""
     guests = Guest.objects.all()
     
-    # Filter by event
+    # Response filters read members' invitations: index range scans on
+    # (event, status) instead of ORs across the per-event columns. "Invited"
+    # follows the same rule as invitation emails (Guest.objects.invited_to)
     event_filter = request.GET.get('event', '')
-    if event_filter:
-        if event_filter == 'mendhi':
-            guests = guests.filter(invited_mendhi=True)
-        elif event_filter == 'vidhi':
-            guests = guests.filter(invited_vidhi=True)
-        elif event_filter == 'wedding':
-            guests = guests.filter(invited_wedding=True)
-        elif event_filter == 'reception':
-            guests = guests.filter(invited_reception=True)
-    
-    # Filter by RSVP status
+    if event_filter not in EVENT_SLUGS:
+        event_filter = ''
     status_filter = request.GET.get('status', '')
     if status_filter == 'responded':
         guests = guests.filter(has_responded=True)
     elif status_filter == 'pending':
         guests = guests.filter(has_responded=False)
-    elif status_filter == 'attending':
-        guests = guests.filter(
-            Q(rsvp_mendhi='attending') |
-            Q(rsvp_vidhi='attending') |
-            Q(rsvp_wedding='attending') |
-            Q(rsvp_reception='attending')
-        )
-    elif status_filter == 'not_attending':
-        guests = guests.filter(
-            Q(rsvp_mendhi='not_attending') |
-            Q(rsvp_vidhi='not_attending') |
-            Q(rsvp_wedding='not_attending') |
-            Q(rsvp_reception='not_attending')
-        )
     
-    # Search
-    search = request.GET.get('search', '')
+    responded_to_event = status_filter in ('attending', 'not_attending')
+    if event_filter and not responded_to_event:
+        guests = guests.invited_to(event_filter)
+    elif responded_to_event:
+        invitations = Invitation.objects.with_status(status_filter)
+        if event_filter:
+            invitations = invitations.for_event(event_filter)
+        guests = guests.filter(pk__in=invitations.family_ids())
+    
+    # Cohort expression, answered by the in-memory bitmap index
+    cohort = request.GET.get('cohort', '').strip()
+    cohort_error = None
+    if cohort:
+        try:
+            guests = cohorts.guests_in(cohorts.query(cohort), guests)
+        except cohorts.CohortError as e:
+            cohort_error = str(e)
+    
+    # Search: best matches first, one page, from the search indexes; the
+    # template says so when more guests match (the admin lists them all)
+    search = request.GET.get('search', '').strip()
+    search_truncated = False
     if search:
-        guests = guests.filter(
-            Q(name__icontains=search) |
-            Q(email__icontains=search) |
-            Q(rsvp_code__icontains=search)
+        results = search_index.search_families(
+            guests.only(*GUEST_LIST_COLUMNS), search, limit=GUEST_LIST_PAGE_SIZE
+        )
+        search_truncated = results.truncated
+        page = KeysetPage(results, GUEST_LIST_ORDER, has_next=False, has_previous=False)
+        total_count = ApproximateCount(len(results), at_least=search_truncated)
+    else:
+        total_count = approximate_count(guests)
+        # Only the columns the table shows, one keyset page at a time
+        page = keyset_page(
+            guests.only(*GUEST_LIST_COLUMNS),
+            GUEST_LIST_ORDER,
+            per_page=GUEST_LIST_PAGE_SIZE,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
         )
     
     context = {
-        'guests': guests,
+        'guests': page,
+        'page': page,
         'event_filter': event_filter,
         'status_filter': status_filter,
         'search': search,
-        'total_count': guests.count(),
+        'search_truncated': search_truncated,
+        'cohort': cohort,
+        'cohort_error': cohort_error,
+        'total_count': total_count,
     }
     return render(request, 'wedding/admin_guest_list.html', context)
 
 
 @staff_member_required
 def export_guests_csv(request):
-    """Export guest list as CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="wedding_guests.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Name', 'Email', 'Phone', 'Party Name', 'Max Guests', 'RSVP Code',
-        'Invited Mendhi', 'Invited Vidhi', 'Invited Wedding', 'Invited Reception',
-        'RSVP Mendhi', 'RSVP Vidhi', 'RSVP Wedding', 'RSVP Reception',
-        'Guests Mendhi', 'Guests Vidhi', 'Guests Wedding', 'Guests Reception',
-        'Dietary Requirements', 'Message', 'Has Responded', 'RSVP Submitted At'
-    ])
-    
-    for guest in Guest.objects.all():
-        writer.writerow([
-            guest.name, guest.email, guest.phone, guest.party_name, guest.max_guests, guest.rsvp_code,
-            guest.invited_mendhi, guest.invited_vidhi, guest.invited_wedding, guest.invited_reception,
-            guest.rsvp_mendhi, guest.rsvp_vidhi, guest.rsvp_wedding, guest.rsvp_reception,
-            guest.guests_mendhi, guest.guests_vidhi, guest.guests_wedding, guest.guests_reception,
-            guest.dietary_requirements, guest.message, guest.has_responded, guest.rsvp_submitted_at
-        ])
-    
-    return response
+    """Export guest list as CSV (?mode=members for one row per family member)"""
+    if request.GET.get('mode') == 'members':
+        return exports.csv_response(exports.member_rows(), 'wedding_members.csv')
+    return exports.csv_response(exports.guest_rows(), 'wedding_guests.csv')
 
 
 @staff_member_required  
 @require_http_methods(["GET"])
 def api_dashboard_stats(request):
     """API endpoint for real-time dashboard stats"""
-    guests = Guest.objects.all()
+    counts = read_stats()
     
     stats = {
-        'total': guests.count(),
-        'responded': guests.filter(has_responded=True).count(),
-        'pending': guests.filter(has_responded=False).count(),
+        'total': counts['total_families'],
+        'responded': counts['responded'],
+        'pending': counts['pending'],
         'events': {
-            'mendhi': {
-                'attending': guests.filter(rsvp_mendhi='attending').aggregate(Sum('guests_mendhi'))['guests_mendhi__sum'] or 0,
-            },
-            'vidhi': {
-                'attending': guests.filter(rsvp_vidhi='attending').aggregate(Sum('guests_vidhi'))['guests_vidhi__sum'] or 0,
-            },
-            'wedding': {
-                'attending': guests.filter(rsvp_wedding='attending').aggregate(Sum('guests_wedding'))['guests_wedding__sum'] or 0,
-            },
-            'reception': {
-                'attending': guests.filter(rsvp_reception='attending').aggregate(Sum('guests_reception'))['guests_reception__sum'] or 0,
-            },
+            slug: {
+                'invited': event['invited'],
+                'attending': event['attending'],
+                'not_attending': event['not_attending'],
+                'pending': event['pending'],
+            }
+            for slug, event in counts['events'].items()
         },
-        'recent': list(guests.filter(has_responded=True).order_by('-rsvp_submitted_at')[:5].values(
+        'recent': list(Guest.objects.filter(has_responded=True).order_by('-rsvp_submitted_at')[:5].values(
             'name', 'rsvp_submitted_at'
         ))
     }
     
     return JsonResponse(stats)
+
+
+@staff_member_required
+def api_search_autocomplete(request):
+    """Ranked family/member suggestions for the staff search box"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': search_index.autocomplete(query, limit=limit)})
+
+
+@staff_member_required
+def api_cohort(request):
+    """Members matching a cohort expression (?q=mendhi & !vidhi), from the bitmap index"""
+    expression = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 0), 500)
+    except ValueError:
+        limit = 50
+    
+    index = cohorts.get_index()
+    started = time.perf_counter()
+    try:
+        cohort = index.query(expression)
+    except cohorts.CohortError as e:
+        return JsonResponse({'error': str(e), 'terms': cohorts.TERMS}, status=400)
+    elapsed = time.perf_counter() - started
+    
+    member_ids = cohort.member_ids(limit)
+    members = FamilyMember.objects.filter(pk__in=member_ids).select_related('family').only(
+        'name', 'relation', 'family__name', 'family__party_name', 'family__rsvp_code',
+    ).order_by('family__name', 'order', 'name')
+    return JsonResponse({
+        'query': expression,
+        'members': cohort.member_count,
+        'families': len(cohort.family_ids()),
+        'elapsed_us': round(elapsed * 1e6),
+        'results': [
+            {
+                'id': member.pk,
+                'name': member.name,
+                'relation': member.relation,
+                'family': member.family.party_name or member.family.name,
+                'rsvp_code': member.family.rsvp_code,
+            }
+            for member in members
+        ],
+    })
+
+
+@staff_member_required
+async def api_dashboard_stream(request):
+    """Server-Sent Events stream of RSVP submissions and counter changes"""
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not isinstance(request, ASGIRequest):
+        # WSGI workers can't hold the connection open: send one snapshot
+        # and let EventSource reconnect after the suggested retry delay
+        body = await sync_to_async(live.feed.snapshot)()
+        return HttpResponse(body, content_type='text/event-stream', headers=headers)
+    return StreamingHttpResponse(live.feed.stream(), content_type='text/event-stream', headers=headers)
@@ -3,6 +3,15 @@ ASGI config for wedding_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live dashboard stream (``/api/dashboard/stream/``) holds connections
+open with Server-Sent Events, so the site is served from this ASGI entry
+point rather than ``wsgi.py`` (see the Procfile)::
+
+    gunicorn wedding_project.asgi:application -k uvicorn_worker.UvicornWorker
+
+Under WSGI the endpoint still answers, but with a single snapshot and a
+retry hint, which amounts to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -61,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it sees the final response, including WhiteNoise's files
+    'wedding.middleware.AsyncStreamingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Whitenoise for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,9 +102,11 @@ WSGI_APPLICATION = 'wedding_project.wsgi.application'
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
 if DATABASE_URL:
-    # Production: Use DATABASE_URL (Railway, Render, etc.)
+    # Production: Use DATABASE_URL (Railway, Render, etc.). No persistent
+    # connections: under ASGI each request runs in its own thread, so a kept
+    # connection would never be reused and they would pile up instead
     DATABASES = {
-        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=0)
     }
 elif os.getenv('USE_POSTGRES', 'False').lower() == 'true':
     # Local PostgreSQL
@@ -200,6 +204,21 @@ else:
 
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Wedding RSVP <noreply@wedding.com>')
 
+# Outbox: views queue emails, `manage.py run_mail_worker` sends them
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+MAIL_MAX_ATTEMPTS = 8
+MAIL_RETRY_BASE_DELAY = 30
+MAIL_RETRY_MAX_DELAY = 60 * 60
+MAIL_BREAKER_THRESHOLD = 3
+MAIL_BREAKER_COOLDOWN = 60
+
+# Public address of the site, used for links in emails and exports
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+
+# `manage.py send_invitations`: sending threads and messages per second overall
+INVITATION_CONCURRENCY = int(os.getenv('INVITATION_CONCURRENCY', 4))
+INVITATION_RATE_LIMIT = float(os.getenv('INVITATION_RATE_LIMIT', 10))
+
 
 # =====================================================
 # SECURITY SETTINGS FOR PRODUCTION
@@ -213,3 +232,82 @@ if not DEBUG:
     # SECURE_SSL_REDIRECT = True
     # SESSION_COOKIE_SECURE = True
     # CSRF_COOKIE_SECURE = True
+
+
+# =====================================================
+# LIVE DASHBOARD FEED
+# =====================================================
+# Server-Sent Events stream for the staff dashboard (served via ASGI).
+# The default broker is in-process, so no external service is required.
+
+LIVE_FEED_BROKER = 'wedding.live.LocalBroker'
+LIVE_FEED_POLL_INTERVAL = int(os.getenv('LIVE_FEED_POLL_INTERVAL', 5))
+
+
+# =====================================================
+# EVENT CATALOG
+# =====================================================
+# Events are cached per process. Edits bump a version in EVENT_CATALOG_CACHE
+# that other workers check every EVENT_CATALOG_TTL seconds; the default
+# cache is per-process LocMem, so without a shared backend other workers
+# only pick up edits when their snapshot reaches EVENT_CATALOG_MAX_AGE.
+
+EVENT_CATALOG_TTL = 300
+EVENT_CATALOG_MAX_AGE = 600
+EVENT_CATALOG_CACHE = 'default'
+
+
+# =====================================================
+# RSVP CODE LOOKUP CACHE
+# =====================================================
+# Code -> guest resolution is cached per process, including short-lived
+# entries for unknown codes. Set RSVP_LOOKUP_SHARED_CACHE to a CACHES alias
+# (e.g. a Redis or Memcached backend) to share entries between workers.
+
+RSVP_LOOKUP_CACHE_SIZE = 10000
+RSVP_LOOKUP_NEGATIVE_TTL = 30
+RSVP_LOOKUP_SHARED_CACHE = os.getenv('RSVP_LOOKUP_SHARED_CACHE') or None
+
+
+# =====================================================
+# PRE-RENDERED HOME PAGE
+# =====================================================
+# The public home page is rendered to disk and served by WhiteNoise. Off by
+# default in DEBUG so template edits show up immediately.
+
+PRERENDER_HOME = os.getenv('PRERENDER_HOME', str(not DEBUG)).lower() == 'true'
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+PRERENDER_HOME_MAX_AGE = int(os.getenv('PRERENDER_HOME_MAX_AGE', 600))
+
+
+# =====================================================
+# VIEW TRACKING
+# =====================================================
+# Guest.last_viewed_at is buffered per process and written in one batched
+# UPDATE every VIEW_TRACKING_FLUSH_INTERVAL seconds (0 writes immediately).
+
+VIEW_TRACKING_FLUSH_INTERVAL = int(os.getenv('VIEW_TRACKING_FLUSH_INTERVAL', 10))
+VIEW_TRACKING_BUFFER_SIZE = 10000
+
+
+# =====================================================
+# COHORT INDEX
+# =====================================================
+# Cohort queries (/api/cohorts/, the guest list's cohort filter) run on a
+# per-process bitmap index. Changes made in other processes are noticed via
+# a version in COHORT_INDEX_CACHE every COHORT_INDEX_TTL seconds; the index
+# is rebuilt at least every COHORT_INDEX_MAX_AGE seconds regardless. The
+# default cache is per-process LocMem, so without a shared backend other
+# workers only see changes when their index reaches COHORT_INDEX_MAX_AGE.
+
+COHORT_INDEX_TTL = 30
+COHORT_INDEX_MAX_AGE = 600
+COHORT_INDEX_CACHE = 'default'
+
+# =====================================================
+# FAMILY MEMBER GRID
+# =====================================================
+# In the admin, families with more than MEMBER_GRID_THRESHOLD members are
+# edited in a compact grid saved as one payload, instead of the member
+# inline on the family's change form.
+MEMBER_GRID_THRESHOLD = 12